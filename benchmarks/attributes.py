@@ -0,0 +1,77 @@
+"""
+Measures memory and attribute access cost of model instances.
+
+Usage:
+    python -m benchmarks.attributes [-n NUMBER]
+
+Reports bytes allocated per instance, and time to read and write an
+    attribute, with the default store and with Meta.slotted_store enabled.
+"""
+import argparse
+import timeit
+import tracemalloc
+
+from onto.context import Context as CTX
+from onto.database.mock import MockDatabase
+
+_FIELD_NAMES = [f'field_{c}' for c in 'abcdefghij']
+
+
+def _make_model(name, slotted_store):
+    from onto.attrs import attrs
+    from onto.domain_model import DomainModel
+
+    class Meta:
+        collection_name = 'bench_attributes'
+
+    Meta.slotted_store = slotted_store
+
+    return type(name, (DomainModel,), dict(
+        Meta=Meta,
+        **{field_name: attrs.string for field_name in _FIELD_NAMES},
+    ))
+
+
+def _measure(model_cls, number):
+    kwargs = {field_name: field_name for field_name in _FIELD_NAMES}
+    count = 1000
+    tracemalloc.start()
+    objs = [model_cls.new(doc_id=str(idx), **kwargs) for idx in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    yield 'bytes/object', size / count
+
+    obj = objs[0]
+
+    def write():
+        obj.field_a = 'a'
+
+    cases = {
+        'read (ns)': lambda: obj.field_a,
+        'write (ns)': write,
+    }
+    for name, f in cases.items():
+        seconds = timeit.timeit(f, number=number)
+        yield name, seconds / number * 1e9
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    CTX.db = MockDatabase
+    default = dict(_measure(
+        _make_model('BenchAttributesModel', slotted_store=False),
+        args.number))
+    slotted = dict(_measure(
+        _make_model('BenchAttributesSlottedModel', slotted_store=True),
+        args.number))
+
+    print(f'{"case":<16}{"default":>12}{"slotted":>12}')
+    for name in default:
+        print(f'{name:<16}{default[name]:>12.1f}{slotted[name]:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures DomainModel queries against MockDatabase and SqliteDatabase.
+
+Usage:
+    python -m benchmarks.mock_query [-n NUMBER] [-d DOCUMENTS]
+
+Reports an equality and a range query over one collection, with the
+    documents scanned one by one (previous behavior), looked up with
+    the indexes of the collection, and in an in-memory SQLite database.
+"""
+import argparse
+import timeit
+
+from onto.context import Context as CTX
+from onto.database import Snapshot
+from onto.database.mock import MockDatabase, MockReference
+from onto.database.sqlite import SqliteDatabase
+
+
+class ScanningMockDatabase(MockDatabase):
+    """ Does not use indexes; every query scans the whole collection
+    """
+
+    @classmethod
+    def _candidates(cls, partition, arguments):
+        return None
+
+
+def _make_model():
+    from onto.attrs import attrs
+    from onto.domain_model import DomainModel
+
+    class BenchQueryModel(DomainModel):
+        name = attrs.string
+        rank = attrs.integer
+
+    return BenchQueryModel
+
+
+def _measure(model_cls, number):
+    Comparators = MockDatabase.Comparators
+    cases = {
+        'eq': lambda: list(model_cls.where('name', Comparators.eq, 'n7')),
+        'range': lambda: list(model_cls.where('rank', Comparators.lt, 10)),
+    }
+    for name, f in cases.items():
+        f()  # warm up, and builds the index
+        seconds = timeit.timeit(f, number=number)
+        yield name, seconds / number * 1e3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=20)
+    parser.add_argument('-d', '--documents', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    CTX.db = MockDatabase
+    model_cls = _make_model()
+    for i in range(args.documents):
+        model_cls.new(doc_id=f'd{i}', name=f'n{i % 1000}', rank=i).save()
+
+    model_cls._datastore = classmethod(lambda cls: ScanningMockDatabase)
+    scanned = dict(_measure(model_cls, args.number))
+    model_cls._datastore = classmethod(lambda cls: MockDatabase)
+    indexed = dict(_measure(model_cls, args.number))
+
+    sqlite_db = SqliteDatabase.of()
+    with sqlite_db.batch() as batch:
+        for key, d in MockDatabase.d.items():
+            batch.set(ref=MockReference.from_str(key),
+                      snapshot=Snapshot.view(d))
+    model_cls._datastore = classmethod(lambda cls: sqlite_db)
+    sqlite = dict(_measure(model_cls, args.number))
+
+    print(f'{"case":<12}{"scanned (ms)":>16}{"indexed (ms)":>16}'
+          f'{"sqlite (ms)":>16}')
+    for name in indexed:
+        print(f'{name:<12}{scanned[name]:>16.2f}{indexed[name]:>16.2f}'
+              f'{sqlite[name]:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
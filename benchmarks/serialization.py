@@ -0,0 +1,97 @@
+"""
+Measures per-object serialization cost of a DomainModel.
+
+Usage:
+    python -m benchmarks.serialization [-n NUMBER]
+
+Reports to_dict, from_dict and a full round trip with a schema
+    instance created on every lookup (previous behavior), with the
+    schema cached per class, and with Meta.compiled_codec enabled.
+"""
+import argparse
+import contextlib
+import timeit
+
+from onto.context import Context as CTX
+from onto.database.mock import MockDatabase
+
+
+def _make_model(name, compiled_codec):
+    from onto.attrs import attrs
+    from onto.domain_model import DomainModel
+
+    class Meta:
+        collection_name = 'bench_serialization'
+
+    Meta.compiled_codec = compiled_codec
+
+    return type(name, (DomainModel,), dict(
+        Meta=Meta,
+        name=attrs.string,
+        count=attrs.integer,
+        ratio=attrs.float,
+        flag=attrs.bool,
+        note=attrs.string.optional,
+    ))
+
+
+@contextlib.contextmanager
+def _uncached_schema():
+    """ Instantiates a new schema on every lookup, as before schema
+            instances were cached
+    """
+    from onto.models.base import Schemed
+
+    original = Schemed.__dict__['_get_schema_cache']
+
+    def _get_schema_cache(cls):
+        schema_cls, _, codec = original.__func__(cls)
+        schema_obj = schema_cls() if schema_cls is not None else None
+        return schema_cls, schema_obj, codec
+
+    Schemed._get_schema_cache = classmethod(_get_schema_cache)
+    try:
+        yield
+    finally:
+        Schemed._get_schema_cache = original
+
+
+def _measure(model_cls, number):
+    obj = model_cls.new(
+        doc_id='bench', name='a', count=1, ratio=0.5, flag=True)
+    d = obj.to_dict()
+    cases = {
+        'to_dict': lambda: obj.to_dict(),
+        'from_dict': lambda: model_cls.from_dict(d),
+        'round trip': lambda: model_cls.from_dict(obj.to_dict()),
+    }
+    for name, f in cases.items():
+        f()  # warm up
+        seconds = timeit.timeit(f, number=number)
+        yield name, seconds / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    CTX.db = MockDatabase
+    model_cls = _make_model('BenchSerializationModel', compiled_codec=False)
+    codec_model_cls = _make_model(
+        'BenchSerializationCodecModel', compiled_codec=True)
+
+    with _uncached_schema():
+        uncached = dict(_measure(model_cls, args.number))
+    cached = dict(_measure(model_cls, args.number))
+    codec = dict(_measure(codec_model_cls, args.number))
+
+    print(f'{"case":<12}{"uncached (us)":>16}{"cached (us)":>16}'
+          f'{"codec (us)":>16}')
+    for name in cached:
+        print(f'{name:<12}{uncached[name]:>16.1f}{cached[name]:>16.1f}'
+              f'{codec[name]:>16.1f}')
+
+
+if __name__ == '__main__':
+    main()
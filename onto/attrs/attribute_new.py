@@ -332,7 +332,12 @@ class AttributeBase(PropertyMixin, AttributeMixin):
         if hasattr(self, 'parent'):
             owner = self.parent
             name = self.name
-            annotations = typing.get_type_hints(owner)
+            if registry_cached := getattr(owner, '_registry_cached', None):
+                # Forward references may resolve once more classes register
+                annotations = registry_cached(
+                    '_type_hints_cache', lambda: typing.get_type_hints(owner))
+            else:
+                annotations = typing.get_type_hints(owner)
             # annotations = getattr(owner, '__annotations__', None)
             if annotations is not None:
                 if name in annotations:
@@ -1,4 +1,6 @@
 import contextlib
+import operator
+import types
 
 # Attribute
 # - Serialization/Deserialization instructions
@@ -248,6 +250,23 @@ def whichever_order(li: list, operation):
         raise Exception(f'All possible combinations failed {str(errors)}')
 
 
+def compose_graphql_type(typ: list):
+    """ Applies wrappers such as GraphQLNonNull to the one GraphQL type in
+            typ, in the order collected (outermost decorator first). This
+            gives the first order that whichever_order would accept,
+            without trying the others.
+    """
+    import graphql
+    bases = [elem for elem in typ if isinstance(elem, graphql.GraphQLType)]
+    wrappers = [elem for elem in typ if not isinstance(elem, graphql.GraphQLType)]
+    if len(bases) != 1:
+        raise TypeError(f'Expected exactly one GraphQL type in {typ}')
+    base = bases[0]
+    for wrapper in wrappers:
+        base = wrapper(base)
+    return base
+
+
 class DecoratorBase(metaclass=_ModelRegistry):
     """
     Can only create new state in self.
@@ -298,11 +317,64 @@ class DecoratorBase(metaclass=_ModelRegistry):
             decorated = decorated.get()
         return decorated
 
+    @property
+    def _root(self):
+        # Bottom of the chain, as recorded by freeze
+        root = self.__dict__['_frozen_root']
+        if isinstance(root, contextvars.ContextVar):
+            root = root.get()
+        return root
+
     def __getattr__(self, item):
+        owners = self.__dict__.get('_owners', None)
+        if owners is not None:
+            # Frozen: jump to the decorator that defines item
+            owner = owners.get(item, None)
+            if owner is not None:
+                return getattr(owner, item)
+            return getattr(self._root, item)
         return getattr(self.decorated, item)
 
         # yield from self.decorated._marshmallow_field_kwargs
 
+    @staticmethod
+    def _defined_names(decor):
+        return {
+            name
+            for klass in type(decor).__mro__
+            for name in vars(klass)
+            if not (name.startswith('__') and name.endswith('__'))
+        } | set(vars(decor))
+
+    def freeze(self):
+        """ Records, for each decorator in the chain, which decorator
+                below it defines each name. __getattr__ then looks up a
+                name in one step instead of walking the chain. Names that
+                no decorator in the chain defines are read from the root
+                (usually root_decor), so results still depend on the
+                current MonadContext as before.
+
+        Decorators must not be changed after they are frozen.
+        """
+        chain = list()
+        decor = self
+        while isinstance(decor, DecoratorBase) and '_owners' not in vars(decor):
+            chain.append(decor)
+            decor = decor._decorated
+
+        if isinstance(decor, DecoratorBase):
+            # Rest of the chain is frozen already
+            owners, root = dict(decor._owners), decor._frozen_root
+            owners.update(dict.fromkeys(self._defined_names(decor), decor))
+        else:
+            owners, root = dict(), decor
+
+        for decor in reversed(chain):
+            decor._owners = types.MappingProxyType(owners)
+            decor._frozen_root = root
+            owners = {**owners, **dict.fromkeys(self._defined_names(decor), decor)}
+        return self
+
     def descendant_of(self, ancestors: typing.Set['DecoratorBase']):
 
         if self.__class__ in ancestors:
@@ -325,14 +397,7 @@ class DecoratorBase(metaclass=_ModelRegistry):
     def graphql_object_type(self):
         typ = list(self._graphql_object_type)
         assert len(typ) != 0
-
-        def op(typ):
-            base = typ[0]
-            for elem in typ[1:]:
-                base = elem(base)
-            return base
-
-        return whichever_order(typ, op)
+        return compose_graphql_type(typ)
 
 
 # _vals_
@@ -703,11 +768,8 @@ _ATTRIBUTE_STORE_NAME = '_attrs'
 class Getter(DecoratorBase):
 
     def _get_default_fget(self, *, name):
-        def fget(_self_obj):
-            inner = getattr(_self_obj, _ATTRIBUTE_STORE_NAME)
-            return getattr(inner, name)
-
-        return fget
+        # Same as getattr(getattr(_self_obj, '_attrs'), name)
+        return operator.attrgetter(f'{_ATTRIBUTE_STORE_NAME}.{name}')
 
     def __init__(self, fget=_NA, *args, **kwargs):
         self._fget = fget
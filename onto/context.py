@@ -26,6 +26,9 @@ from onto.database import Database, Listener
 _transaction_var: ContextVar['firestore.Transaction'] = \
     ContextVar('_transaction_var', default=None)
 
+_identity_map_var: ContextVar['onto.database.identity_map.IdentityMap'] = \
+    ContextVar('_identity_map_var', default=None)
+
 
 class Context:
     """ Context Singleton for Firestore, Firebase and Celery app.
@@ -53,6 +56,8 @@ class Context:
 
     transaction_var = _transaction_var
 
+    identity_map_var = _identity_map_var
+
     # Deleted on purpose to ensure that .<flag> is not evaluated as False
     #   when .<flag> is neither set to True, nor set to False.
     # debug = None
@@ -203,6 +208,12 @@ class Context:
         cls.dbs = Dbs()
         for db_name, db_config in database.items():
             db = cls.create_db(db_config)
+            if db_config.get('single_flight', False):
+                from onto.database.single_flight import SingleFlightDatabase
+                db = SingleFlightDatabase.of(db)
+            if 'cache' in db_config:
+                from onto.database.cached import CachedDatabase
+                db = CachedDatabase.of(db, **db_config['cache'])
             setattr(cls.dbs, db_name, db)
 
     @classmethod
@@ -236,7 +247,8 @@ class Context:
                 )
             ))
             bucket = cluster.bucket(db_config['bucket'])
-            return bucket
+            from onto.database.couchbase import CouchbaseDatabase
+            return CouchbaseDatabase.of(bucket=bucket, cluster=cluster)
         elif db_config['type'] == 'firestore':
             caller_module_path = os.path.curdir
             cert_path = os.path.join(
@@ -319,6 +331,15 @@ class Context:
         elif db_config['type'] == 'mock':
             from onto.database.mock import MockDatabase
             return MockDatabase
+        elif db_config['type'] == 'sqlite':
+            from onto.database.sqlite import SqliteDatabase
+            return SqliteDatabase.of(db_config.get('path', ':memory:'))
+        elif db_config['type'] == 'log':
+            from onto.database.log import LogDatabase
+            return LogDatabase.of(
+                db_config['directory'],
+                **{k: db_config[k] for k in ('compact_every', 'fsync')
+                   if k in db_config})
         else:
             raise ValueError
 
@@ -1,5 +1,11 @@
+import asyncio
 import collections
 import abc
+import contextvars
+import functools
+import itertools
+import sys
+import types
 
 from onto.common import _NA
 
@@ -17,13 +23,17 @@ class ConditionArg(Enum):
 class Reference(collections.UserString):
     """
     example: '/myusername/'
+
+    The path is interned, and split into segments once. Do not
+        modify .data after initialization.
     """
 
-    def __init__(self, _s='', *, _is_empty=True):
+    def __init__(self, _s='', *, _is_empty=True, _segments=None):
         """
         TODO: make compatible with sequence input
         :param _s:
         :param _is_empty:
+        :param _segments: segments of _s if already known
         """
         if not isinstance(_is_empty, bool):
             import logging
@@ -34,12 +44,33 @@ class Reference(collections.UserString):
             )
         self._is_empty = _is_empty
         super().__init__(_s)
+        self.data = sys.intern(self.data)
+        self._hash = hash(self.data)
+        if _segments is None:
+            _segments = tuple(self.data.split('/'))
+        self._segments = _segments
+
+    def __hash__(self):
+        return self._hash
+
+    def __getstate__(self):
+        # String hashes differ across processes
+        state = self.__dict__.copy()
+        del state['_hash']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._hash = hash(self.data)
 
     def child(self, s):
+        s = str(s)
+        segments = tuple(s.split('/'))
         if self._is_empty:
-            return self.__class__(_s=s, _is_empty=False)
+            return self.__class__(_s=s, _is_empty=False, _segments=segments)
         else:
-            return self.__class__(_s=f'{self}/{s}', _is_empty=False)
+            return self.__class__(_s=f'{self.data}/{s}', _is_empty=False,
+                                  _segments=self._segments + segments)
 
     @classmethod
     def from_str(cls, s: str):
@@ -50,19 +81,19 @@ class Reference(collections.UserString):
 
     @property
     def first(self):
-        return self.data.split('/')[0]  # example: '/myusername/'
+        return self._segments[0]  # example: '/myusername/'
 
     @property
     def last(self):
-        return self.data.split('/')[-1]
+        return self._segments[-1]
 
     @property
     def id(self):
-        return self.last
+        return self._segments[-1]
 
     @property
     def params(self):
-        return self.data.split('/')
+        return list(self._segments)
 
     @property
     def to_str(self):
@@ -70,7 +101,7 @@ class Reference(collections.UserString):
 
     @property
     def path(self) -> tuple:
-        return tuple(self.params)
+        return self._segments
 
     @property
     def collection(self):
@@ -93,6 +124,21 @@ reference = Reference()
 
 
 class Snapshot(collections.UserDict):
+    """
+    A document stored in a database.
+
+    A snapshot created with Snapshot.view shares the dict that it wraps,
+        and copies it on its first change (copy-on-write). Databases use
+        this to hand out stored documents without copying them; a dict
+        passed to Snapshot.view, or returned by share, must therefore not
+        be changed in place afterwards.
+    """
+
+    _shared = False
+
+    # False for the snapshot of a document that does not exist, which
+    #   databases such as Firestore return instead of raising
+    exists = True
 
     next = property()
     prev = property()
@@ -128,10 +174,129 @@ class Snapshot(collections.UserDict):
     def prev(self, _onto_prev):
         self._onto_prev = _onto_prev
 
+    @classmethod
+    def view(cls, data, __onto_meta__=None):
+        """ Returns a snapshot of data without copying it.
+
+        :param data: dict that is not changed in place afterwards
+        :param __onto_meta__:
+        """
+        snapshot = cls(__onto_meta__=__onto_meta__)
+        snapshot.data = data
+        snapshot._shared = True
+        return snapshot
+
+    def _own(self):
+        if self._shared:
+            self.data = self.data.copy()
+            self._shared = False
+
+    def __setitem__(self, key, item):
+        self._own()
+        super().__setitem__(key, item)
+
+    def __delitem__(self, key):
+        self._own()
+        super().__delitem__(key)
+
+    def __ior__(self, other):
+        self._own()
+        return super().__ior__(other)
+
+    def share(self):
+        """ Returns the underlying dict without copying it. The snapshot
+                copies it before its next change.
+        """
+        self._shared = True
+        return self.data
+
+    def __copy__(self):
+        """ Returns a snapshot of the same class and attributes that
+                shares the data of this one until either is changed.
+        """
+        snapshot = self.__class__.__new__(self.__class__)
+        snapshot.__dict__.update(self.__dict__)
+        snapshot.data = self.share()
+        snapshot._shared = True
+        return snapshot
+
+    def as_mapping(self):
+        """ Returns a read-only view of the data without copying it.
+        """
+        return types.MappingProxyType(self.data)
+
     def to_dict(self):
         return self.data.copy()
 
 
+_batch_var: contextvars.ContextVar['Batch'] = \
+    contextvars.ContextVar('_batch_var', default=None)
+
+
+class Batch:
+    """
+    Collects set, update and delete calls to a Database, and writes them
+        with Database._commit_batch in chunks of database.batch_max_size
+        when the context exits without an error. Use with:
+
+        with CTX.db.batch():
+            obj.save()  # writes that have no transaction are collected
+
+    A batch entered while another batch of the same database is active
+        joins the outer one.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.ops = list()
+        self._callbacks = list()
+        self._outer = None
+        self._token = None
+
+    @staticmethod
+    def current() -> 'Batch':
+        return _batch_var.get()
+
+    def set(self, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        self.ops.append(('set', ref, snapshot))
+
+    def update(self, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        self.ops.append(('update', ref, snapshot))
+
+    def delete(self, ref: Reference, transaction=_NA):
+        self.ops.append(('delete', ref, None))
+
+    def after_commit(self, callback):
+        """ Calls callback() once all ops of the batch are written. It is
+                not called when the batch fails or is not committed.
+        """
+        self._callbacks.append(callback)
+
+    def commit(self):
+        ops, self.ops = self.ops, list()
+        callbacks, self._callbacks = self._callbacks, list()
+        size = self.database.batch_max_size
+        for start in range(0, len(ops), size):
+            self.database._commit_batch(ops[start:start+size])
+        for callback in callbacks:
+            callback()
+
+    def __enter__(self):
+        outer = self.current()
+        if outer is not None and outer.database is self.database:
+            self._outer = outer
+            return outer
+        self._token = _batch_var.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._outer is not None:
+            return
+        _batch_var.reset(self._token)
+        if exc_type is None:
+            self.commit()
+
+
 class Database:
 
     class Comparators(ConditionArg):
@@ -149,6 +314,15 @@ class Database:
     def get(cls, ref: Reference, transaction=_NA):
         raise NotImplementedError
 
+    @classmethod
+    def get_fields(cls, ref: Reference, fields, transaction=_NA):
+        """ Returns a snapshot with only the top-level fields in fields
+                of the document at ref. Databases that can read part of
+                a document override this; the default projects get.
+        """
+        d = cls.get(ref=ref, transaction=transaction).as_mapping()
+        return Snapshot.view({key: d[key] for key in fields if key in d})
+
     @classmethod
     @abc.abstractmethod
     def get_many(cls, refs: [Reference], transaction=_NA):
@@ -157,6 +331,9 @@ class Database:
     @classmethod
     @abc.abstractmethod
     def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        """ Writes only the top-level fields in snapshot to an existing
+                document. Other fields of the document are kept.
+        """
         raise NotImplementedError
 
     @classmethod
@@ -174,6 +351,127 @@ class Database:
     def query(cls, q):
         raise NotImplementedError
 
+    @classmethod
+    def query_pages(cls, q, page_size):
+        """ Yields the results of q as lists of at most page_size
+                (ref, snapshot). Databases that can read a page per
+                request override this; the default splits query.
+        """
+        results = iter(cls.query(q))
+        while page := list(itertools.islice(results, page_size)):
+            yield page
+
+    @staticmethod
+    async def _run_in_thread(f, *args, **kwargs):
+        """ Runs a blocking call in the default executor of the running
+                event loop, with a copy of the current context so that
+                context variables like CTX.transaction_var are kept.
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            None, functools.partial(ctx.run, f, *args, **kwargs))
+
+    # Maximum number of operations passed to one _commit_batch call
+    batch_max_size = 500
+
+    @classmethod
+    def batch(cls) -> Batch:
+        """ Returns a context manager that collects writes to this
+                database and commits them together; see Batch.
+        """
+        return Batch(database=cls)
+
+    @classmethod
+    def writer(cls, transaction=None):
+        """ Returns the batch of this database that is active in the
+                current context when transaction is None, or else the
+                database itself.
+        """
+        batch = Batch.current()
+        if transaction is None and batch is not None \
+                and batch.database is cls:
+            return batch
+        return cls
+
+    @staticmethod
+    def _is_missing_error(error):
+        """ Returns True when error is raised by update because the
+                document does not exist
+        """
+        return isinstance(error, KeyError)
+
+    @classmethod
+    def _commit_batch(cls, ops):
+        """ Writes ops collected by Batch. Databases with a batch write
+                API override this; the default makes one call per
+                operation.
+
+        :param ops: a list of (method_name, ref, snapshot) where
+            method_name is 'set', 'update' or 'delete' (snapshot None)
+        """
+        for method_name, ref, snapshot in ops:
+            if method_name == 'delete':
+                cls.delete(ref=ref, transaction=None)
+            else:
+                getattr(cls, method_name)(
+                    ref=ref, snapshot=snapshot, transaction=None)
+
+    @staticmethod
+    def _group_batch_ops(ops):
+        """ Yields (method_name, collection, ops) for runs of consecutive
+                ops with the same method and collection, so that
+                databases can write each run with one bulk call while
+                keeping the order of writes to the same document.
+        """
+        key = lambda op: (op[0], op[1].first)
+        for (method_name, collection), run in itertools.groupby(ops, key=key):
+            yield method_name, collection, list(run)
+
+    # Async counterparts of the methods above. These defaults run the
+    #   synchronous method in a worker thread; databases with an async
+    #   client override them.
+
+    @classmethod
+    async def aset(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        return await cls._run_in_thread(
+            cls.set, ref=ref, snapshot=snapshot, transaction=transaction)
+
+    @classmethod
+    async def aget(cls, ref: Reference, transaction=_NA):
+        return await cls._run_in_thread(
+            cls.get, ref=ref, transaction=transaction)
+
+    @classmethod
+    async def aget_many(cls, refs: [Reference], transaction=_NA):
+        """ Returns a list of (ref, snapshot)
+        """
+        def _get_many():
+            return list(cls.get_many(refs=refs, transaction=transaction))
+        return await cls._run_in_thread(_get_many)
+
+    @classmethod
+    async def aupdate(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        return await cls._run_in_thread(
+            cls.update, ref=ref, snapshot=snapshot, transaction=transaction)
+
+    @classmethod
+    async def acreate(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        return await cls._run_in_thread(
+            cls.create, ref=ref, snapshot=snapshot, transaction=transaction)
+
+    @classmethod
+    async def adelete(cls, ref: Reference, transaction=_NA):
+        return await cls._run_in_thread(
+            cls.delete, ref=ref, transaction=transaction)
+
+    @classmethod
+    async def aquery(cls, q):
+        """ Yields (ref, snapshot); results are read in a worker thread
+        """
+        for item in await cls._run_in_thread(lambda: list(cls.query(q))):
+            yield item
+
     ref = reference
 
     # TODO: NOTE: Should be classmethod
@@ -186,6 +484,19 @@ class Listener:
     from ..coordinator import Coordinator
     _coordinator = Coordinator()
 
+    # Called with (reference, snapshot) for every document change that a
+    #   listener receives; snapshot is None when the document is deleted.
+    _change_callbacks = list()
+
+    @classmethod
+    def add_change_callback(cls, f):
+        Listener._change_callbacks.append(f)
+
+    @classmethod
+    def _notify_change(cls, reference, snapshot):
+        for f in Listener._change_callbacks:
+            f(reference=reference, snapshot=snapshot)
+
     @classmethod
     def for_query(cls):
         pass
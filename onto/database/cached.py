@@ -0,0 +1,287 @@
+import collections
+import copy
+import functools
+import threading
+import time
+import weakref
+
+from onto.common import _NA
+from onto.context import Context as CTX
+from onto.database import Database, Listener, Reference, Snapshot
+
+# Cached classes of each wrapped database; one Listener callback per
+#   wrapped database notifies them
+_cached_classes = dict()
+
+
+def _notify_cached(classes, reference, snapshot):
+    for cached in list(classes):
+        cached._on_change(reference=reference, snapshot=snapshot)
+
+
+class CachedDatabase(Database):
+    """
+    Read-through cache of documents in front of another database.
+
+    Create with CachedDatabase.of(FirestoreDatabase, max_size=1024, ttl=60),
+        or with a "cache" mapping in the database config. Documents read
+        without a transaction are kept in a LRU of max_size entries for
+        ttl seconds (None for no expiry). Writes through this database
+        drop the entry of the document (writes in a transaction when
+        transactional commits it), and changes received by any Listener
+        refresh it.
+    """
+
+    max_size = 1024
+
+    ttl = None
+
+    # Set for each class created by CachedDatabase.of
+    _cache = None
+    _cache_lock = None
+    _cache_stats = None
+    # key -> [generation, number of reads in flight], for keys that are
+    #   being read; a read only caches its result when the generation of
+    #   the key did not change while it was in flight
+    _generations = None
+    # Keys written in each transaction, dropped when it commits
+    _transaction_keys = None
+
+    @classmethod
+    def of(cls, database, max_size=1024, ttl=None):
+        """ Returns a subclass of database with documents cached.
+
+        :param database: a Database subclass
+        :param max_size: maximum number of documents kept
+        :param ttl: seconds that a document is kept, or None
+        """
+        cached = type(f'Cached{database.__name__}', (cls, database), dict(
+            max_size=max_size,
+            ttl=ttl,
+            _cache=collections.OrderedDict(),
+            _cache_lock=threading.Lock(),
+            _cache_stats=dict(hits=0, misses=0),
+            _generations=dict(),
+            _transaction_keys=weakref.WeakKeyDictionary(),
+        ))
+        if database not in _cached_classes:
+            _cached_classes[database] = weakref.WeakSet()
+            Listener.add_change_callback(functools.partial(
+                _notify_cached, _cached_classes[database]))
+        _cached_classes[database].add(cached)
+        return cached
+
+    @classmethod
+    def stats(cls):
+        with cls._cache_lock:
+            return dict(cls._cache_stats, size=len(cls._cache))
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    @classmethod
+    def _cache_lookup(cls, key):
+        with cls._cache_lock:
+            entry = cls._cache.get(key, None)
+            if entry is not None:
+                snapshot, expires_at = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    cls._cache.move_to_end(key)
+                    cls._cache_stats['hits'] += 1
+                    return copy.copy(snapshot)
+                del cls._cache[key]
+            cls._cache_stats['misses'] += 1
+            return None
+
+    @classmethod
+    def _cache_put(cls, key, snapshot, generation=None):
+        """ Caches snapshot of key. With the generation of _read_begin,
+                the snapshot is dropped when key was invalidated since.
+        """
+        expires_at = None if cls.ttl is None else time.monotonic() + cls.ttl
+        with cls._cache_lock:
+            if generation is not None and \
+                    cls._generations[key][0] != generation:
+                return
+            cls._cache[key] = (copy.copy(snapshot), expires_at)
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > cls.max_size:
+                cls._cache.popitem(last=False)
+
+    @classmethod
+    def _read_begin(cls, key):
+        """ Returns the generation of key for a read of the underlying
+                database; call _read_end after the read.
+        """
+        with cls._cache_lock:
+            entry = cls._generations.setdefault(key, [0, 0])
+            entry[1] += 1
+            return entry[0]
+
+    @classmethod
+    def _read_end(cls, key):
+        with cls._cache_lock:
+            entry = cls._generations[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del cls._generations[key]
+
+    @classmethod
+    def _read_through(cls, key, read):
+        """ Returns read(), and caches it unless key is invalidated while
+                read is in flight
+        """
+        generation = cls._read_begin(key)
+        try:
+            snapshot = read()
+            cls._cache_put(key, snapshot, generation=generation)
+            return snapshot
+        finally:
+            cls._read_end(key)
+
+    @classmethod
+    def _cache_invalidate(cls, key):
+        with cls._cache_lock:
+            cls._cache.pop(key, None)
+            entry = cls._generations.get(key, None)
+            if entry is not None:
+                entry[0] += 1
+
+    @classmethod
+    def _on_change(cls, reference, snapshot):
+        """ Refreshes or drops the entry of a document that is cached
+        """
+        key = str(reference)
+        cached = key in cls._cache
+        cls._cache_invalidate(key)
+        if snapshot is not None and cached:
+            cls._cache_put(key, snapshot)
+
+    @staticmethod
+    def _is_cacheable(transaction):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+        return transaction is None
+
+    @classmethod
+    def get(cls, ref: Reference, transaction=_NA):
+        if not cls._is_cacheable(transaction):
+            return super().get(ref=ref, transaction=transaction)
+        key = str(ref)
+        snapshot = cls._cache_lookup(key)
+        if snapshot is None:
+            snapshot = cls._read_through(key, lambda: super(
+                CachedDatabase, cls).get(ref=ref, transaction=transaction))
+        return snapshot
+
+    @classmethod
+    def get_many(cls, refs: [Reference], transaction=_NA):
+        """ Yields cached documents first, then reads the others with one
+                get_many of the underlying database.
+        """
+        if not cls._is_cacheable(transaction):
+            yield from super().get_many(refs=refs, transaction=transaction)
+            return
+        missed = list()
+        for ref in refs:
+            snapshot = cls._cache_lookup(str(ref))
+            if snapshot is None:
+                missed.append(ref)
+            else:
+                yield ref, snapshot
+        if missed:
+            keys = [str(ref) for ref in missed]
+            generations = dict()
+            for key in keys:
+                generations.setdefault(key, cls._read_begin(key))
+            try:
+                for ref, snapshot in super().get_many(
+                        refs=missed, transaction=transaction):
+                    cls._cache_put(
+                        str(ref), snapshot, generation=generations[str(ref)])
+                    yield ref, snapshot
+            finally:
+                for key in keys:
+                    cls._read_end(key)
+
+    @classmethod
+    def _invalidate_written(cls, ref, transaction):
+        """ Drops the entry of ref after a write. A write in a transaction
+                is only applied on commit, so the entry is dropped when
+                transactional commits it.
+        """
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+        if transaction is None:
+            cls._cache_invalidate(str(ref))
+        else:
+            with cls._cache_lock:
+                cls._transaction_keys.setdefault(
+                    transaction, set()).add(str(ref))
+
+    @classmethod
+    def transactional(cls, func):
+        """ Decorates func like the transactional of the underlying
+                database, and drops the entries of documents that the
+                transaction wrote once it is committed (or has failed).
+        """
+        run = super().transactional(func)
+
+        @functools.wraps(func)
+        def wrapper(transaction, *args, **kwargs):
+            try:
+                return run(transaction, *args, **kwargs)
+            finally:
+                with cls._cache_lock:
+                    keys = cls._transaction_keys.pop(transaction, set())
+                for key in keys:
+                    cls._cache_invalidate(key)
+        return wrapper
+
+    @classmethod
+    def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        super().set(ref=ref, snapshot=snapshot, transaction=transaction)
+        cls._invalidate_written(ref, transaction)
+
+    @classmethod
+    def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        super().update(ref=ref, snapshot=snapshot, transaction=transaction)
+        cls._invalidate_written(ref, transaction)
+
+    @classmethod
+    def create(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        super().create(ref=ref, snapshot=snapshot, transaction=transaction)
+        cls._invalidate_written(ref, transaction)
+
+    @classmethod
+    def delete(cls, ref: Reference, transaction=_NA):
+        super().delete(ref=ref, transaction=transaction)
+        cls._invalidate_written(ref, transaction)
+
+    @classmethod
+    async def aset(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        await super().aset(ref=ref, snapshot=snapshot, transaction=transaction)
+        cls._invalidate_written(ref, transaction)
+
+    @classmethod
+    async def aupdate(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        await super().aupdate(ref=ref, snapshot=snapshot, transaction=transaction)
+        cls._invalidate_written(ref, transaction)
+
+    @classmethod
+    async def acreate(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        await super().acreate(ref=ref, snapshot=snapshot, transaction=transaction)
+        cls._invalidate_written(ref, transaction)
+
+    @classmethod
+    async def adelete(cls, ref: Reference, transaction=_NA):
+        await super().adelete(ref=ref, transaction=transaction)
+        cls._invalidate_written(ref, transaction)
+
+    @classmethod
+    def _commit_batch(cls, ops):
+        super()._commit_batch(ops)
+        for _, ref, _ in ops:
+            cls._cache_invalidate(str(ref))
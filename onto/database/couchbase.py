@@ -1,14 +1,62 @@
 from onto.common import _NA
 from onto.database import Database, Reference, Snapshot
 from onto.context import Context as CTX
-from couchbase import bucket
+from couchbase import bucket, subdocument
+from couchbase.cluster import QueryOptions
+
+
+def _escape(name):
+    return '`' + name.replace('`', '``') + '`'
 
 
 class CouchbaseDatabase(Database):
+    """
+    Documents of a collection are in the collection of the same name in
+        the default scope of the bucket. Create with
+        CouchbaseDatabase.of(bucket, cluster), or with "type: couchbase"
+        in the database config.
+    """
+
+    class Comparators(Database.Comparators):
+
+        eq = '='
+        gt = '>'
+        ge = '>='
+        lt = '<'
+        le = '<='
+        contains = 'ARRAY_CONTAINS'
+
+        _in = 'IN'
+
+    # N1QL operators of Comparators, and of the comparator strings of
+    #   Firestore
+    _n1ql_ops = {
+        '=': '=', '==': '=', '>': '>', '>=': '>=', '<': '<', '<=': '<=',
+        'IN': 'IN', 'in': 'IN',
+        'ARRAY_CONTAINS': 'ARRAY_CONTAINS',
+        'array_contains': 'ARRAY_CONTAINS',
+    }
+
+    ref = Reference()
+
+    # Set for each class created by CouchbaseDatabase.of
+    _bucket = None
+    _cluster = None
+
+    @classmethod
+    def of(cls, bucket, cluster):
+        """ Returns a subclass of CouchbaseDatabase on bucket; cluster
+                runs N1QL queries.
+        """
+        return type(cls.__name__, (cls,), dict(
+            _bucket=bucket, _cluster=cluster))
 
     @classmethod
     def bucket(cls) -> bucket.Bucket:
-        return CTX.dbs.couchbase
+        if cls._bucket is not None:
+            return cls._bucket
+        # The database configured as "couchbase"
+        return CTX.dbs.couchbase.bucket()
 
     @classmethod
     def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
@@ -16,6 +64,28 @@ class CouchbaseDatabase(Database):
             key=ref.last, value=snapshot.to_dict()
         )
 
+    @classmethod
+    def get(cls, ref: Reference, transaction=_NA):
+        res = cls.bucket().collection(collection_name=ref.first).get(
+            key=ref.last)
+        return Snapshot.view(res.content_as[dict])
+
+    @classmethod
+    def get_many(cls, refs: [Reference], transaction=_NA):
+        """ Reads refs with one multi-get per collection, and yields
+                (ref, snapshot) in the order of refs.
+        """
+        refs = list(refs)
+        found = dict()
+        for collection in {ref.first for ref in refs}:
+            coll = cls.bucket().collection(collection_name=collection)
+            results = coll.get_multi(
+                list({ref.last for ref in refs if ref.first == collection}))
+            for key, res in results.items():
+                found[(collection, key)] = res.content_as[dict]
+        for ref in refs:
+            yield ref, Snapshot.view(found[(ref.first, ref.last)])
+
     @classmethod
     def create(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
         cls.bucket().collection(collection_name=ref.first).insert(
@@ -25,9 +95,149 @@ class CouchbaseDatabase(Database):
     @classmethod
     def delete(cls, ref: Reference, transaction=_NA):
         cls.bucket().collection(collection_name=ref.first).remove(
-            key='ref.last'
+            key=ref.last
         )
 
+    @staticmethod
+    def _is_missing_error(error):
+        from couchbase.exceptions import DocumentNotFoundException
+        return isinstance(error, DocumentNotFoundException)
+
     @classmethod
     def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
-        cls.set(ref, snapshot, transaction)
+        cls.bucket().collection(collection_name=ref.first).mutate_in(
+            ref.last,
+            [subdocument.upsert(key, val)
+             for key, val in snapshot.items()]
+        )
+
+    @classmethod
+    def _commit_batch(cls, ops):
+        """ Writes each run of sets or deletes to a collection with one
+                multi-document call; updates are sub-document mutations
+                of one document each.
+        """
+        for method_name, collection, run in cls._group_batch_ops(ops):
+            coll = cls.bucket().collection(collection_name=collection)
+            if method_name == 'set':
+                coll.upsert_multi({
+                    ref.last: snapshot.to_dict() for _, ref, snapshot in run
+                })
+            elif method_name == 'delete':
+                coll.remove_multi([ref.last for _, ref, _ in run])
+            else:
+                for _, ref, snapshot in run:
+                    cls.update(ref=ref, snapshot=snapshot, transaction=None)
+
+    @classmethod
+    def _keyspace(cls, collection):
+        return '.'.join(_escape(name) for name in (
+            cls.bucket().name, '_default', collection))
+
+    @staticmethod
+    def index_name(collection, key):
+        """ Returns the name of the index on field key of collection that
+                queries hint at; see create_index.
+        """
+        return f'onto_{collection}_{key}'
+
+    @classmethod
+    def create_index(cls, collection, key):
+        """ Creates the secondary index on field key of collection that
+                queries filtering on key hint at.
+        """
+        statement = (
+            f'CREATE INDEX IF NOT EXISTS '
+            f'{_escape(cls.index_name(collection, key))} '
+            f'ON {cls._keyspace(collection)}({_escape(key)})')
+        list(cls._cluster.query(statement).rows())
+
+    @classmethod
+    def _to_n1ql(cls, q):
+        """ Returns (statement, positional parameters) of a N1QL query of
+                the documents that match q, with USE INDEX hints for the
+                indexes of create_index on the fields of q. order_by,
+                cursors, offset and limit are part of the statement.
+        """
+        collection = q.ref.last
+        clauses, params, index_keys = list(), list(), list()
+        for key, comparator, val, _ in q._data_arguments():
+            op = cls._n1ql_ops[
+                comparator if isinstance(comparator, str)
+                else comparator.condition]
+            params.append(val)
+            path = f'd.{_escape(key)}'
+            if op == 'ARRAY_CONTAINS':
+                clauses.append(f'ARRAY_CONTAINS({path}, ${len(params)})')
+            else:
+                clauses.append(f'{path} {op} ${len(params)}')
+            if key not in index_keys:
+                index_keys.append(key)
+        statement = f'SELECT META(d).id AS id, d AS doc ' \
+                    f'FROM {cls._keyspace(collection)} AS d'
+        if index_keys:
+            hints = ', '.join(
+                f'{_escape(cls.index_name(collection, key))} USING GSI'
+                for key in index_keys)
+            statement += f' USE INDEX ({hints})'
+        orders = [(f'd.{_escape(q._data_key(key))}',
+                   direction == q.DESCENDING)
+                  for key, direction in q._orders]
+        # Like Firestore, documents without a key of order_by are left out
+        clauses.extend(f'{path} IS NOT MISSING' for path, _ in orders)
+        # Documents with equal values are ordered by id, as by __name__
+        #   on Firestore
+        orders.append(('META(d).id', orders[-1][1] if orders else False))
+        for cursor, after in ((q._start_after, True),
+                              (q._end_before, False)):
+            if cursor is not None:
+                clauses.append(cls._keyset(orders, cursor, after, params))
+        if clauses:
+            statement += ' WHERE ' + ' AND '.join(clauses)
+        if q._orders or cls._has_cursor(q):
+            statement += ' ORDER BY ' + ', '.join(
+                f'{path} {"DESC" if descending else "ASC"}'
+                for path, descending in orders)
+        if q._limit is not None:
+            params.append(q._limit)
+            statement += f' LIMIT ${len(params)}'
+        if q._offset is not None:
+            params.append(q._offset)
+            statement += f' OFFSET ${len(params)}'
+        return statement, params
+
+    @staticmethod
+    def _has_cursor(q):
+        return q._start_after is not None or q._end_before is not None
+
+    @staticmethod
+    def _keyset(orders, cursor, after, params):
+        """ Returns a condition for the documents after (or before)
+                cursor in the order of orders, a list of (path,
+                descending) that ends with the id; adds its values to
+                params. The path of a document in the cursor is compared
+                with the id.
+        """
+        values = list(cursor[:len(orders) - 1])
+        if len(cursor) == len(orders):
+            values.append(Reference.from_str(cursor[-1]).last)
+        branches = list()
+        for i, (path, descending) in enumerate(orders[:len(values)]):
+            terms = list()
+            for (equal_path, _), value in zip(orders[:i], values):
+                params.append(value)
+                terms.append(f'{equal_path} = ${len(params)}')
+            params.append(values[i])
+            op = '>' if after != descending else '<'
+            terms.append(f'{path} {op} ${len(params)}')
+            branches.append('(' + ' AND '.join(terms) + ')')
+        return '(' + ' OR '.join(branches) + ')'
+
+    @classmethod
+    def query(cls, q):
+        statement, params = cls._to_n1ql(q)
+        res = cls._cluster.query(
+            statement, QueryOptions(positional_parameters=params))
+        for row in res.rows():
+            yield Reference.from_str(str(q.ref/row['id'])), \
+                Snapshot.view(q._project(row['doc']))
@@ -7,6 +7,7 @@ from onto.context import Context as CTX
 from google.cloud import firestore
 from google.cloud.firestore_v1.document import _get_document_path, \
     DocumentReference, DocumentSnapshot
+from google.cloud.firestore_v1.field_path import FieldPath
 
 # TODO: NOTE maximum of 1 firestore client allowed since we used a global var.
 from typing import List
@@ -20,17 +21,17 @@ FirestoreListener = None
 class FirestoreReference(Reference):
 
     def is_collection(self):
-        return len(self.params) % 2 == 1
+        return len(self._segments) % 2 == 1
 
     @property
     def collection(self):
         return self.first
 
     def is_document(self):
-        return len(self.params) % 2 == 0
+        return len(self._segments) % 2 == 0
 
     def is_collection_group(self):
-        return self.first == "**" and len(self.params) == 2
+        return self.first == "**" and len(self._segments) == 2
 
     @classmethod
     def from__document_name(cls, document_name: str):
@@ -49,6 +50,8 @@ class FirestoreDatabase(Database):
 
     firestore_client = None
 
+    async_firestore_client = None
+
     @classmethod
     def listener(cls):
         return FirestoreListener
@@ -93,16 +96,40 @@ class FirestoreDatabase(Database):
         return cls.firestore_client.transaction()
 
     @classmethod
-    def _doc_ref_from_ref(cls, ref):
+    def transactional(cls, func):
+        """ Decorates func(transaction) to retry on contention; see
+                firestore.transactional
+        """
+        return firestore.transactional(func)
+
+    @classmethod
+    def async_client(cls) -> firestore.AsyncClient:
+        """ Returns an async client with the project and credentials of
+                firestore_client, created on first use unless
+                async_firestore_client is set.
+        """
+        if cls.async_firestore_client is None:
+            client = cls.firestore_client
+            cls.async_firestore_client = firestore.AsyncClient(
+                project=client.project,
+                credentials=client._credentials,
+                client_info=client._client_info,
+            )
+        return cls.async_firestore_client
+
+    @classmethod
+    def _doc_ref_from_ref(cls, ref, client=None):
+        if client is None:
+            client = cls.firestore_client
         if ref._is_empty:
             # TODO: change this behavior
-            return cls.firestore_client
+            return client
         elif ref.is_collection_group():
-            return cls.firestore_client.collection_group(ref.last)
+            return client.collection_group(ref.last)
         elif ref.is_collection():
-            return cls.firestore_client.collection(str(ref))
+            return client.collection(str(ref))
         elif ref.is_document():
-            return cls.firestore_client.document(str(ref))
+            return client.document(str(ref))
         else:
             raise ValueError
 
@@ -138,6 +165,18 @@ class FirestoreDatabase(Database):
         return FirestoreSnapshot.from_document_snapshot(
             document_snapshot=document_snapshot)
 
+    @classmethod
+    def get_fields(cls, ref: Reference, fields, transaction=_NA):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+
+        doc_ref = cls._doc_ref_from_ref(ref)
+        document_snapshot = doc_ref.get(
+            field_paths=list(fields), transaction=transaction)
+
+        return FirestoreSnapshot.from_document_snapshot(
+            document_snapshot=document_snapshot)
+
     @classmethod
     def get_many(cls, refs: [Reference], transaction=_NA):
         if transaction is _NA:
@@ -156,9 +195,30 @@ class FirestoreDatabase(Database):
                   FirestoreSnapshot.from_document_snapshot(
                 document_snapshot=document_snapshot)
 
-    update = set
+    @classmethod
+    def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+
+        doc_ref = cls._doc_ref_from_ref(ref)
+        # Quote keys so that they are not read as dotted field paths
+        field_updates = {
+            FieldPath(key).to_api_repr(): val
+            for key, val in snapshot.items()
+        }
+
+        if transaction is None:
+            doc_ref.update(field_updates)
+        else:
+            transaction.update(doc_ref, field_updates)
+
     create = set
 
+    @staticmethod
+    def _is_missing_error(error):
+        from google.api_core.exceptions import NotFound
+        return isinstance(error, NotFound)
+
     @classmethod
     def delete(cls, ref: Reference, transaction=_NA):
         doc_ref = cls._doc_ref_from_ref(ref)
@@ -170,6 +230,25 @@ class FirestoreDatabase(Database):
         else:
             transaction.delete(reference=doc_ref)
 
+    @classmethod
+    def _commit_batch(cls, ops):
+        """ Writes ops with one WriteBatch (batch_max_size is the
+                operation limit of a Firestore batch write)
+        """
+        batch = cls.firestore_client.batch()
+        for method_name, ref, snapshot in ops:
+            doc_ref = cls._doc_ref_from_ref(ref)
+            if method_name == 'set':
+                batch.set(doc_ref, snapshot.to_dict())
+            elif method_name == 'update':
+                batch.update(doc_ref, {
+                    FieldPath(key).to_api_repr(): val
+                    for key, val in snapshot.items()
+                })
+            else:
+                batch.delete(doc_ref)
+        batch.commit()
+
     @classmethod
     def query(cls, q: Query):
         for document in q._to_firestore_query().stream():
@@ -178,6 +257,125 @@ class FirestoreDatabase(Database):
             snapshot = FirestoreSnapshot.from_document_snapshot(document)
             yield (ref, snapshot)
 
+    @classmethod
+    def query_pages(cls, q: Query, page_size):
+        """ Reads the results of q with one request per page_size
+                documents, each starting after the last document of the
+                previous page. The offset of q applies to the first page.
+        """
+        first = q._to_firestore_query()
+        rest = q._replace(_offset=None)._to_firestore_query()
+        remaining = q._limit
+        last = None
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None \
+                else min(page_size, remaining)
+            if last is None:
+                page_query = first.limit(size)
+            else:
+                page_query = rest.limit(size).start_after(last)
+            documents = list(page_query.stream())
+            if documents:
+                yield [
+                    (FirestoreReference.from_document_reference(
+                        document.reference),
+                     FirestoreSnapshot.from_document_snapshot(document))
+                    for document in documents
+                ]
+            if len(documents) < size:
+                return
+            last = documents[-1]
+            if remaining is not None:
+                remaining -= len(documents)
+
+    # Async counterparts on the async client. transaction should be
+    #   an AsyncTransaction when given.
+
+    @classmethod
+    async def aset(cls, ref: Reference, snapshot: Snapshot, transaction=_NA, **kwargs):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+
+        doc_ref = cls._doc_ref_from_ref(ref, client=cls.async_client())
+        if transaction is None:
+            await doc_ref.set(document_data=snapshot.to_dict(), **kwargs)
+        else:
+            transaction.set(reference=doc_ref,
+                            document_data=snapshot.to_dict(), **kwargs)
+
+    @classmethod
+    async def aget(cls, ref: Reference, transaction=_NA):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+
+        doc_ref = cls._doc_ref_from_ref(ref, client=cls.async_client())
+
+        if transaction is None:
+            document_snapshot = await doc_ref.get()
+        else:
+            document_snapshot = await doc_ref.get(transaction=transaction)
+
+        return FirestoreSnapshot.from_document_snapshot(
+            document_snapshot=document_snapshot)
+
+    @classmethod
+    async def aget_many(cls, refs: [Reference], transaction=_NA):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+
+        client = cls.async_client()
+        doc_refs = [cls._doc_ref_from_ref(ref, client=client) for ref in refs]
+
+        if transaction is None:
+            document_snapshots = client.get_all(doc_refs)
+        else:
+            document_snapshots = client.get_all(
+                doc_refs, transaction=transaction)
+
+        return [
+            (FirestoreReference.from_document_reference(document_snapshot.reference),
+             FirestoreSnapshot.from_document_snapshot(
+                 document_snapshot=document_snapshot))
+            async for document_snapshot in document_snapshots
+        ]
+
+    @classmethod
+    async def aupdate(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+
+        doc_ref = cls._doc_ref_from_ref(ref, client=cls.async_client())
+        field_updates = {
+            FieldPath(key).to_api_repr(): val
+            for key, val in snapshot.items()
+        }
+
+        if transaction is None:
+            await doc_ref.update(field_updates)
+        else:
+            transaction.update(doc_ref, field_updates)
+
+    acreate = aset
+
+    @classmethod
+    async def adelete(cls, ref: Reference, transaction=_NA):
+        doc_ref = cls._doc_ref_from_ref(ref, client=cls.async_client())
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+
+        if transaction is None:
+            await doc_ref.delete()
+        else:
+            transaction.delete(reference=doc_ref)
+
+    @classmethod
+    async def aquery(cls, q: Query):
+        query = q._to_firestore_query(client=cls.async_client())
+        async for document in query.stream():
+            ref = FirestoreReference.from_document_reference(document.reference)
+            snapshot = FirestoreSnapshot.from_document_snapshot(document)
+            yield (ref, snapshot)
+
     ref = FirestoreReference()
 
 
@@ -186,9 +384,10 @@ class FirestoreSnapshot(Snapshot):
     @classmethod
     def from_document_snapshot(
             cls, document_snapshot: firestore.DocumentSnapshot):
-        return cls(
-            document_snapshot.to_dict()
-        )
+        data = document_snapshot.to_dict()
+        # to_dict returns None when the document does not exist
+        return cls.view(data if data is not None else dict(),
+                        __onto_meta__=dict(exists=document_snapshot.exists))
 
     @classmethod
     def from_data_and_meta(
@@ -215,7 +414,7 @@ class FirestoreSnapshot(Snapshot):
                 for key, val in kwargs.items()
                 if key != DATA_KEYWORD
             }
-            return cls(**data, __onto_meta__=__onto_meta__)
+            return cls.view(data, __onto_meta__=__onto_meta__)
 
     @classmethod
     def empty(cls, **kwargs):
@@ -446,6 +645,7 @@ class FirestoreListener(Listener):
                     val=snapshot,
                     timestamp=timestamp_key(document.update_time)
                 )
+                cls._notify_change(reference=ref, snapshot=snapshot)
 
             elif removed:
                 raise NotImplementedError
@@ -472,6 +672,7 @@ class FirestoreListener(Listener):
                 val=snapshot,
                 timestamp=timestamp_key(document_delete.read_time)
             )
+            cls._notify_change(reference=ref, snapshot=None)
         else:
             raise ValueError  # TODO: implement
 
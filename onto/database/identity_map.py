@@ -0,0 +1,145 @@
+import asyncio
+import contextlib
+import copy
+
+from onto.common import _NA
+from onto.context import Context as CTX
+
+
+class IdentityMap:
+    """
+    Snapshots and objects read within one scope, such as a request, a
+        GraphQL resolution or one attempt of a run_transaction body.
+
+    Use IdentityMap.scope() to start a scope. Inside it, FirestoreObject.get
+        returns the object that was already loaded for the same class and
+        reference, Gallery.refresh reads each document once, and
+        FirestoreObject.aget calls that are pending at the same time are
+        read with one Database.aget_many. Reads with different transactions
+        (or none) do not share entries.
+    """
+
+    def __init__(self):
+        self.snapshots = dict()
+        self.objects = dict()
+        self._futures = dict()
+        self._pending = dict()
+
+    @staticmethod
+    def current() -> 'IdentityMap':
+        return CTX.identity_map_var.get()
+
+    @classmethod
+    @contextlib.contextmanager
+    def scope(cls):
+        """ Binds a new identity map to the current context.
+        """
+        identity_map = cls()
+        token = CTX.identity_map_var.set(identity_map)
+        try:
+            yield identity_map
+        finally:
+            CTX.identity_map_var.reset(token)
+
+    @staticmethod
+    def _resolve(transaction):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+        return transaction
+
+    def get(self, database, ref, transaction=_NA):
+        """ Returns the snapshot of ref, read with database.get once
+                in this scope.
+        """
+        transaction = self._resolve(transaction)
+        key = (database, transaction, str(ref))
+        if key not in self.snapshots:
+            self.snapshots[key] = database.get(
+                ref=ref, transaction=transaction)
+        return copy.copy(self.snapshots[key])
+
+    def get_many(self, database, refs, transaction=_NA):
+        """ Returns a list of (ref, snapshot); refs that are not read in
+                this scope yet are read with one database.get_many.
+        """
+        transaction = self._resolve(transaction)
+        res, missed = list(), list()
+        for ref in refs:
+            key = (database, transaction, str(ref))
+            if key in self.snapshots:
+                res.append((ref, copy.copy(self.snapshots[key])))
+            else:
+                missed.append(ref)
+        if missed:
+            for ref, snapshot in database.get_many(
+                    refs=missed, transaction=transaction):
+                self.snapshots[(database, transaction, str(ref))] = snapshot
+                res.append((ref, copy.copy(snapshot)))
+        return res
+
+    async def aget(self, database, ref, transaction=_NA):
+        """ Returns the snapshot of ref. Refs requested before the event
+                loop gets to read them are read with one
+                database.aget_many.
+        """
+        transaction = self._resolve(transaction)
+        key = (database, transaction, str(ref))
+        if key in self.snapshots:
+            return copy.copy(self.snapshots[key])
+        future = self._futures.get(key, None)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._futures[key] = future
+            group = (database, transaction)
+            if group not in self._pending:
+                self._pending[group] = dict()
+                asyncio.ensure_future(self._flush(group))
+            self._pending[group][key] = ref
+        # A caller that is cancelled does not cancel the shared read
+        snapshot = await asyncio.shield(future)
+        return copy.copy(snapshot)
+
+    async def _flush(self, group):
+        # Lets the other tasks that are ready request their refs first
+        await asyncio.sleep(0)
+        database, transaction = group
+        pending = self._pending.pop(group)
+        futures = [self._futures.pop(key) for key in pending]
+        try:
+            items = await database.aget_many(
+                refs=list(pending.values()), transaction=transaction)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+                # Marks the error as retrieved when no caller waits
+                future.exception()
+            return
+        for ref, snapshot in items:
+            self.snapshots[(database, transaction, str(ref))] = snapshot
+        for key, future in zip(pending, futures):
+            if key in self.snapshots:
+                future.set_result(self.snapshots[key])
+            else:
+                future.set_exception(KeyError(key[2]))
+
+    def get_object(self, obj_cls, ref, transaction=_NA):
+        """ Returns the object of obj_cls loaded for ref in this scope,
+                or None.
+        """
+        key = (obj_cls, self._resolve(transaction), str(ref))
+        return self.objects.get(key, None)
+
+    def add_object(self, obj_cls, ref, obj, transaction=_NA):
+        key = (obj_cls, self._resolve(transaction), str(ref))
+        self.objects[key] = obj
+
+    def discard(self, ref, objects=False):
+        """ Drops the snapshots of ref, for example after it is written,
+                and with objects=True, the objects of ref.
+        """
+        ref_str = str(ref)
+        for key in [key for key in self.snapshots if key[2] == ref_str]:
+            del self.snapshots[key]
+        if objects:
+            for key in [key for key in self.objects if key[2] == ref_str]:
+                del self.objects[key]
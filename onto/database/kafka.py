@@ -18,14 +18,14 @@ FirestoreListener = None
 class KafkaReference(Reference):
 
     def is_collection(self):
-        return len(self.params) % 2 == 1
+        return len(self._segments) % 2 == 1
 
     @property
     def collection(self):
         return self.first
 
     def is_document(self):
-        return len(self.params) % 2 == 0
+        return len(self._segments) % 2 == 0
 
     @classmethod
     def from__document_name(cls, document_name: str):
@@ -49,12 +49,12 @@ class KafkaReadDatabase(Database):
 
     @classmethod
     def _onto_set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
-        cls.d[str(ref)] = snapshot.to_dict()
+        cls.d[str(ref)] = snapshot.share()
         cls.listener()._pub(reference=ref, snapshot=snapshot)
 
     @classmethod
     def get(cls, ref: Reference, transaction=_NA):
-        return Snapshot(cls.d[str(ref)])
+        return Snapshot.view(cls.d[str(ref)])
 
     update = set
     create = set
@@ -5,6 +5,9 @@ from ..query.query import Query
 
 LEANCLOUD_DOC_ID_DATA_KEY = '_doc_id'
 
+# Keys that Leancloud adds to every object, which are not part of documents
+LEANCLOUD_METADATA_KEYS = ('objectId', 'createdAt', 'updatedAt', 'ACL')
+
 class LeancloudDatabase(Database):
 
     class Comparators(Database.Comparators):
@@ -17,37 +20,188 @@ class LeancloudDatabase(Database):
 
         _in = 'contained_in'
 
+    # leancloud.Object subclasses by class name; Object.extend creates a
+    #   new class on every call
+    _cla_cache = dict()
+
     @classmethod
     def _get_cla(cls, cla_str):
-        return leancloud.Object.extend(name=cla_str)
+        if cla_str not in cls._cla_cache:
+            cls._cla_cache[cla_str] = leancloud.Object.extend(name=cla_str)
+        return cls._cla_cache[cla_str]
 
     ref = Reference()
 
     @classmethod
     def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
-        object_id = ref.last
+        """ Replaces the object with _doc_id == ref.last, or creates it
+        """
         cla = cls._get_cla(ref.first)
-        obj = cla(_doc_id=object_id, **snapshot.to_dict())
-        obj.save()
+        existing = cls._find_by_doc_ids(cla, [ref.last])
+        cls._set_cla_obj(cla, existing, ref.last, snapshot).save()
+
+    @staticmethod
+    def _set_cla_obj(cla, existing, doc_id, snapshot):
+        """ Returns the object of doc_id with the fields of snapshot, to
+                be saved. Fields of an object in existing (a dict from
+                _doc_id, see _find_by_doc_ids) that are not in snapshot
+                are unset.
+        """
+        d = snapshot.to_dict()
+        cla_obj = existing.get(doc_id, None)
+        if cla_obj is None:
+            return cla(_doc_id=doc_id, **d)
+        for key in cla_obj.dump():
+            if key not in d and key not in LEANCLOUD_METADATA_KEYS \
+                    and key != LEANCLOUD_DOC_ID_DATA_KEY:
+                cla_obj.unset(key)
+        for key, val in d.items():
+            cla_obj.set(key, val)
+        return cla_obj
 
     @classmethod
     def get(cls, ref: Reference, transaction=_NA):
         _doc_id = ref.last
         cla = cls._get_cla(ref.first)
         cla_obj = cla.query.equal_to(LEANCLOUD_DOC_ID_DATA_KEY, _doc_id).first()
-        d = LeancloudSnapshot.from_cla_obj(cla_obj).to_dict()
-        d['doc_id'] = d.pop(LEANCLOUD_DOC_ID_DATA_KEY)
-        snapshot = LeancloudSnapshot(d)
-        return snapshot
+        return cls._snapshot_of(cla_obj)
+
+    @classmethod
+    def get_fields(cls, ref: Reference, fields, transaction=_NA):
+        cla = cls._get_cla(ref.first)
+        cla_obj = cla.query.equal_to(LEANCLOUD_DOC_ID_DATA_KEY, ref.last) \
+            .select(*fields, LEANCLOUD_DOC_ID_DATA_KEY).first()
+        return cls._snapshot_of(cla_obj)
+
+    @staticmethod
+    def _snapshot_of(cla_obj):
+        """ Returns the document of cla_obj, without the keys that
+                Leancloud adds, so that it compares equal to the dict of
+                the object that was saved
+        """
+        d = {key: val for key, val in cla_obj.dump().items()
+             if key not in LEANCLOUD_METADATA_KEYS}
+        d['doc_id'] = d.pop(LEANCLOUD_DOC_ID_DATA_KEY, cla_obj.id)
+        return LeancloudSnapshot.view(d)
+
+    @classmethod
+    def get_many(cls, refs: [Reference], transaction=_NA):
+        """ Reads refs with one contained_in query per class and chunk of
+                query_max_size, and yields (ref, snapshot) in the order
+                of refs.
+        """
+        refs = list(refs)
+        found = dict()
+        for collection in {ref.first for ref in refs}:
+            cla = cls._get_cla(collection)
+            cla_objs = cls._find_by_doc_ids(
+                cla, {ref.last for ref in refs if ref.first == collection})
+            for doc_id, cla_obj in cla_objs.items():
+                found[(collection, doc_id)] = cla_obj
+        for ref in refs:
+            cla_obj = found.get((ref.first, ref.last), None)
+            if cla_obj is None:
+                raise leancloud.LeanCloudError(101, 'Object not found.')
+            yield ref, cls._snapshot_of(cla_obj)
 
     @classmethod
     def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
-        cls.set(ref, snapshot, transaction)
+        _doc_id = ref.last
+        cla = cls._get_cla(ref.first)
+        cla_obj = cla.query.equal_to(LEANCLOUD_DOC_ID_DATA_KEY, _doc_id).first()
+        for key, val in snapshot.items():
+            cla_obj.set(key, val)
+        # Only fields that are set are sent
+        cla_obj.save()
 
     @classmethod
     def create(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
         cls.set(ref, snapshot, transaction)
 
+    @staticmethod
+    def _is_missing_error(error):
+        return isinstance(error, leancloud.LeanCloudError) \
+            and error.code == 101
+
+    # Number of objects sent in one save_all or destroy_all request
+    batch_max_size = 50
+
+    # Maximum limit of one query
+    query_max_size = 1000
+
+    @classmethod
+    def _find_by_doc_ids(cls, cla, doc_ids):
+        """ Returns a dict from _doc_id to the objects of cla with one of
+                doc_ids, read with one query per query_max_size doc_ids
+        """
+        doc_ids = list(doc_ids)
+        res = dict()
+        for start in range(0, len(doc_ids), cls.query_max_size):
+            chunk = doc_ids[start:start+cls.query_max_size]
+            cla_objs = cla.query.contained_in(
+                LEANCLOUD_DOC_ID_DATA_KEY, chunk
+            ).limit(len(chunk)).find()
+            for cla_obj in cla_objs:
+                res[cla_obj.get(LEANCLOUD_DOC_ID_DATA_KEY)] = cla_obj
+        return res
+
+    @classmethod
+    def _commit_batch(cls, ops):
+        """ Writes each run of sets, updates or deletes to a class with
+                one save_all or destroy_all request
+        """
+        runs = list(cls._group_batch_ops(ops))
+        cls._check_updates(runs)
+        for method_name, collection, run in runs:
+            cla = cls._get_cla(collection)
+            cla_objs = cls._find_by_doc_ids(
+                cla, {ref.last for _, ref, _ in run})
+            if method_name == 'set':
+                # A later set of the same _doc_id replaces an earlier one
+                sets = {ref.last: snapshot for _, ref, snapshot in run}
+                leancloud.Object.save_all([
+                    cls._set_cla_obj(cla, cla_objs, doc_id, snapshot)
+                    for doc_id, snapshot in sets.items()
+                ])
+                continue
+            if method_name == 'update':
+                for _, ref, snapshot in run:
+                    cla_obj = cla_objs[ref.last]
+                    for key, val in snapshot.items():
+                        cla_obj.set(key, val)
+                leancloud.Object.save_all(list(cla_objs.values()))
+            else:
+                leancloud.Object.destroy_all(list(cla_objs.values()))
+
+    @classmethod
+    def _check_updates(cls, runs):
+        """ Raises LeanCloudError(101), as get does, if an update of runs
+                (see _group_batch_ops) is of a document that does not
+                exist when the update is applied, so that no run of the
+                batch is written
+        """
+        updated = dict()
+        for method_name, collection, run in runs:
+            if method_name == 'update':
+                updated.setdefault(collection, set()).update(
+                    ref.last for _, ref, _ in run)
+        existing = {
+            collection: set(cls._find_by_doc_ids(
+                cls._get_cla(collection), doc_ids))
+            for collection, doc_ids in updated.items()
+        }
+        for method_name, collection, run in runs:
+            doc_ids = existing.get(collection, None)
+            if doc_ids is None:
+                continue
+            for _, ref, _ in run:
+                if method_name == 'set':
+                    doc_ids.add(ref.last)
+                elif method_name == 'delete':
+                    doc_ids.discard(ref.last)
+                elif ref.last not in doc_ids:
+                    raise leancloud.LeanCloudError(101, 'Object not found.')
+
     @classmethod
     def delete(cls, ref: Reference, transaction=_NA):
         """ Note: this only deletes one instance that has _doc_id == ref.last
@@ -65,7 +219,7 @@ class LeancloudDatabase(Database):
     def query(cls, q: Query):
         for cla_obj in q._to_leancloud_query().find():
             ref = LeancloudReference.from_cla_obj(cla_obj)
-            snapshot = LeancloudSnapshot.from_cla_obj(cla_obj)
+            snapshot = cls._snapshot_of(cla_obj)
             yield (ref, snapshot)
 
 
@@ -76,7 +230,7 @@ class LeancloudSnapshot(Snapshot):
 
     @classmethod
     def from_cla_obj(self, cla_obj):
-        snapshot = Snapshot(cla_obj.dump())
+        snapshot = Snapshot.view(cla_obj.dump())
         return snapshot
 
 
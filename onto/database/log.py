@@ -0,0 +1,380 @@
+"""
+Durable local database: documents are appended to a log file, and a
+    sorted index of document paths to log offsets is written at each
+    compaction and memory-mapped, so that only the paths written since
+    the last compaction are held in memory.
+
+Files in the directory of a store:
+    CURRENT      name of the generation in use, replaced atomically
+    <gen>.log    records: 4-byte length, then pickle of (path, data),
+                 where data is None for a delete
+    <gen>.idx    header (entry count, log size covered), fixed-size
+                 entries (log offset, key offset, key length) sorted
+                 by path, then the utf-8 paths
+
+On open, records after the log size covered by the index are replayed,
+    and a record cut short by a crash is dropped.
+"""
+import mmap
+import os
+import pickle
+import struct
+import threading
+
+from onto.common import _NA
+from onto.database import Database, Reference, Snapshot
+from onto.database.mock import MockDatabase, MockReference
+from onto.database.utils import GenericListener
+
+_RECORD_HEADER = struct.Struct('<I')
+_INDEX_HEADER = struct.Struct('<QQ')
+_INDEX_ENTRY = struct.Struct('<QQI')
+
+
+class _Index:
+    """
+    Read-only view of an index file; paths are compared as utf-8 bytes,
+        which orders them as str does.
+    """
+
+    def __init__(self, path=None):
+        self._file = None
+        self._mm = None
+        self.count = 0
+        self.log_size = 0
+        if path is not None and os.path.getsize(path) > 0:
+            self._file = open(path, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.count, self.log_size = _INDEX_HEADER.unpack_from(self._mm, 0)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+
+    def _entry(self, i):
+        offset, key_offset, key_len = _INDEX_ENTRY.unpack_from(
+            self._mm, _INDEX_HEADER.size + i * _INDEX_ENTRY.size)
+        return bytes(self._mm[key_offset:key_offset + key_len]), offset
+
+    def _bisect(self, key: bytes):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, key: str):
+        """ Returns the log offset of key, or None """
+        key = key.encode()
+        i = self._bisect(key)
+        if i < self.count:
+            found, offset = self._entry(i)
+            if found == key:
+                return offset
+        return None
+
+    def items(self, prefix: str = ''):
+        """ Yields (key, offset) of the keys that start with prefix, in order
+        """
+        prefix = prefix.encode()
+        for i in range(self._bisect(prefix), self.count):
+            key, offset = self._entry(i)
+            if not key.startswith(prefix):
+                break
+            yield key.decode(), offset
+
+    @staticmethod
+    def write(path, items, log_size):
+        """ Writes an index file of items, a sorted list of (key, offset)
+        """
+        encoded = [(key.encode(), offset) for key, offset in items]
+        keys_start = _INDEX_HEADER.size + len(encoded) * _INDEX_ENTRY.size
+        with open(path, 'wb') as f:
+            f.write(_INDEX_HEADER.pack(len(encoded), log_size))
+            key_offset = keys_start
+            for key, offset in encoded:
+                f.write(_INDEX_ENTRY.pack(offset, key_offset, len(key)))
+                key_offset += len(key)
+            for key, _ in encoded:
+                f.write(key)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class LogStore:
+    """
+    Log and index files in one directory. Thread-safe.
+
+    :param directory: created if it does not exist
+    :param compact_every: compacts after this many writes since the last
+        compaction
+    :param fsync: if True, every write is synced to disk before it returns
+    """
+
+    def __init__(self, directory, compact_every=100000, fsync=False):
+        self.directory = directory
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        # Offsets (None for deleted) of paths written since the index
+        self._recent = dict()
+        # Number of records written since the index
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _file_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        current = self._file_path('CURRENT')
+        if os.path.exists(current):
+            with open(current) as f:
+                self._gen = int(f.read().strip())
+            self._index = _Index(self._file_path(f'{self._gen}.idx'))
+        else:
+            self._gen = 0
+            self._index = _Index()
+        self._log = open(self._file_path(f'{self._gen}.log'), 'a+b')
+        self._replay(self._index.log_size)
+
+    def _replay(self, start):
+        self._log.seek(start)
+        offset = start
+        while True:
+            header = self._log.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                break
+            length, = _RECORD_HEADER.unpack(header)
+            body = self._log.read(length)
+            if len(body) < length:
+                break
+            key, data = pickle.loads(body)
+            self._recent[key] = offset if data is not None else None
+            self._writes += 1
+            offset += _RECORD_HEADER.size + length
+        # Drops a record that was cut short
+        self._log.truncate(offset)
+        self._log.seek(0, os.SEEK_END)
+
+    def close(self):
+        with self._lock:
+            self._log.close()
+            self._index.close()
+
+    def _read_at(self, offset):
+        header = os.pread(self._log.fileno(), _RECORD_HEADER.size, offset)
+        length, = _RECORD_HEADER.unpack(header)
+        body = os.pread(
+            self._log.fileno(), length, offset + _RECORD_HEADER.size)
+        return pickle.loads(body)[1]
+
+    def _offset(self, key):
+        if key in self._recent:
+            return self._recent[key]
+        return self._index.get(key)
+
+    def get(self, key):
+        """ Returns the document at key; raises KeyError when there is none
+        """
+        with self._lock:
+            offset = self._offset(key)
+            if offset is None:
+                raise KeyError(key)
+            return self._read_at(offset)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._offset(key) is not None
+
+    def write(self, records):
+        """ Appends records, a list of (key, data or None for delete)
+        """
+        with self._lock:
+            for key, data in records:
+                body = pickle.dumps((key, data), protocol=pickle.HIGHEST_PROTOCOL)
+                offset = self._log.tell()
+                self._log.write(_RECORD_HEADER.pack(len(body)) + body)
+                self._recent[key] = offset if data is not None else None
+            self._writes += len(records)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            if self._writes >= self.compact_every:
+                self.compact()
+
+    def keys(self, prefix=''):
+        """ Returns the keys of documents that start with prefix, in order
+        """
+        with self._lock:
+            recent = {key: offset for key, offset in self._recent.items()
+                      if key.startswith(prefix)}
+            indexed = [key for key, _ in self._index.items(prefix)
+                       if key not in recent]
+        keys = indexed + [key for key, offset in recent.items()
+                          if offset is not None]
+        return sorted(keys)
+
+    def compact(self):
+        """ Writes the live documents to a new log with a new index, and
+                switches to them.
+        """
+        with self._lock:
+            gen = self._gen + 1
+            log_path = self._file_path(f'{gen}.log')
+            items = list()
+            with open(log_path, 'wb') as new_log:
+                for key in self.keys():
+                    data = self._read_at(self._offset(key))
+                    body = pickle.dumps(
+                        (key, data), protocol=pickle.HIGHEST_PROTOCOL)
+                    items.append((key, new_log.tell()))
+                    new_log.write(_RECORD_HEADER.pack(len(body)) + body)
+                new_log.flush()
+                os.fsync(new_log.fileno())
+                log_size = new_log.tell()
+            _Index.write(self._file_path(f'{gen}.idx'), items, log_size)
+            tmp = self._file_path('CURRENT.tmp')
+            with open(tmp, 'w') as f:
+                f.write(str(gen))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._file_path('CURRENT'))
+
+            old_gen = self._gen
+            self._log.close()
+            self._index.close()
+            self._recent = dict()
+            self._writes = 0
+            self._open()
+            for name in (f'{old_gen}.log', f'{old_gen}.idx'):
+                if os.path.exists(self._file_path(name)):
+                    os.remove(self._file_path(name))
+
+
+class LogDatabase(Database):
+    """
+    Database on a LogStore, with the interface of MockDatabase.
+
+    Create with LogDatabase.of(directory), or with
+        "type: log" and "directory" in the database config. Queries read
+        the documents of the collection in order of path and filter them
+        with the qualifier of the query. Change events are published
+        through GenericListener.
+    """
+
+    Comparators = MockDatabase.Comparators
+
+    ref = MockReference()
+
+    # Set for each class created by LogDatabase.of
+    _log_store: LogStore = None
+
+    @classmethod
+    def of(cls, directory, **kwargs):
+        """ Returns a subclass of LogDatabase that stores in directory
+
+        :param kwargs: Keyword arguments to be forwarded to LogStore
+        """
+        return type(cls.__name__, (cls,), dict(
+            _log_store=LogStore(directory, **kwargs)))
+
+    @classmethod
+    def listener(cls):
+        return GenericListener
+
+    @classmethod
+    def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        cls._log_store.write([(str(ref), snapshot.to_dict())])
+        cls.listener()._pub(reference=ref, snapshot=snapshot)
+
+    create = set
+
+    @classmethod
+    def get(cls, ref: Reference, transaction=_NA):
+        return Snapshot.view(cls._log_store.get(str(ref)))
+
+    @classmethod
+    def get_many(cls, refs: [Reference], transaction=_NA):
+        for ref in refs:
+            yield ref, cls.get(ref=ref, transaction=transaction)
+
+    @classmethod
+    def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        store = cls._log_store
+        with store._lock:
+            d = {**store.get(str(ref)), **snapshot}
+            store.write([(str(ref), d)])
+        cls.listener()._pub(reference=ref, snapshot=Snapshot.view(d))
+
+    @classmethod
+    def delete(cls, ref: Reference, transaction=_NA):
+        store = cls._log_store
+        with store._lock:
+            if str(ref) not in store:
+                raise KeyError(str(ref))
+            store.write([(str(ref), None)])
+        cls.listener()._pub(reference=ref, snapshot=None)
+
+    @classmethod
+    def _commit_batch(cls, ops):
+        """ Appends all ops with one flush, then publishes them.
+        """
+        store = cls._log_store
+        published = list()
+        with store._lock:
+            pending = dict()
+            records = list()
+            for method_name, ref, snapshot in ops:
+                key = str(ref)
+                if method_name == 'set':
+                    d = snapshot.to_dict()
+                elif method_name == 'update':
+                    old = pending[key] if key in pending else store.get(key)
+                    if old is None:
+                        # Deleted earlier in the batch
+                        raise KeyError(key)
+                    d = {**old, **snapshot}
+                else:
+                    d = None
+                pending[key] = d
+                records.append((key, d))
+                published.append(
+                    (ref, Snapshot.view(d) if d is not None else None))
+            store.write(records)
+        for ref, snapshot in published:
+            cls.listener()._pub(reference=ref, snapshot=snapshot)
+
+    @classmethod
+    def query(cls, q):
+        ref = str(q.ref)
+        store = cls._log_store
+        if ref.startswith('**/'):
+            name = ref[len('**/'):]
+            keys = [key for key in store.keys()
+                    if key.rpartition('/')[0].rpartition('/')[2] == name]
+        else:
+            keys = [key for key in store.keys(prefix=ref + '/')
+                    if key.rpartition('/')[0] == ref]
+        qualifier = q._to_qualifier()
+
+        def matches():
+            for key in keys:
+                try:
+                    d = store.get(key)
+                except KeyError:
+                    # Deleted since the keys were listed
+                    continue
+                if qualifier(d):
+                    yield key, d
+
+        items = matches()
+        if q._is_paged():
+            # Sorting needs every matching document
+            items = q._paginate(list(items))
+        for key, d in items:
+            yield MockReference.from_str(key), Snapshot.view(q._project(d))
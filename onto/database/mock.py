@@ -1,19 +1,322 @@
+import bisect
+import functools
+import threading
+
 from onto.common import _NA
+from onto.context import Context as CTX
 from onto.database import Database, Reference, Snapshot
 from onto.database.utils import GenericListener
+from onto.errors import TransactionConflictError
 
 
 class MockReference(Reference):
 
     def is_collection(self):
-        return len(self.params) % 2 == 1
+        return len(self._segments) % 2 == 1
 
     @property
     def collection(self):
         return self.first
 
     def is_document(self):
-        return len(self.params) % 2 == 0
+        return len(self._segments) % 2 == 0
+
+
+def _is_hashable(val):
+    try:
+        hash(val)
+    except TypeError:
+        return False
+    return True
+
+
+def _sort_kind(val):
+    """ Returns the group of values that val is ordered within, or None
+            when val is not kept in a sorted index.
+    """
+    if isinstance(val, (int, float)):
+        return None if val != val else 'num'  # NaN is not ordered
+    if isinstance(val, str):
+        return 'str'
+    return None
+
+
+class _FieldIndex:
+    """
+    Secondary indexes of one field of the documents in a partition:
+        a hash index (for eq and in), sorted indexes per kind of value
+        (for lt, le, gt and ge) and an inverted index of list elements
+        (for contains). Lookups return a superset of the matching keys;
+        documents whose value can not be indexed are always included,
+        and documents that do not have the field never are.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.unindexed = set()
+        self.hashed = dict()
+        self.sorted = dict()
+        self.inverted = dict()
+
+    def add(self, key, d):
+        if self.field not in d:
+            return
+        val = d[self.field]
+        if _is_hashable(val):
+            self.hashed.setdefault(val, set()).add(key)
+        else:
+            self.unindexed.add(key)
+        kind = _sort_kind(val)
+        if kind is not None:
+            values, keys = self.sorted.setdefault(kind, (list(), list()))
+            i = bisect.bisect_right(values, val)
+            values.insert(i, val)
+            keys.insert(i, key)
+        if isinstance(val, list):
+            for element in val:
+                if _is_hashable(element):
+                    self.inverted.setdefault(element, set()).add(key)
+                else:
+                    self.unindexed.add(key)
+
+    def remove(self, key, d):
+        if self.field not in d:
+            return
+        val = d[self.field]
+        if _is_hashable(val):
+            keys = self.hashed[val]
+            keys.discard(key)
+            if not keys:
+                del self.hashed[val]
+        self.unindexed.discard(key)
+        kind = _sort_kind(val)
+        if kind is not None:
+            values, keys = self.sorted[kind]
+            lo = bisect.bisect_left(values, val)
+            hi = bisect.bisect_right(values, val)
+            i = keys.index(key, lo, hi)
+            del values[i]
+            del keys[i]
+        if isinstance(val, list):
+            for element in val:
+                if _is_hashable(element):
+                    elements = self.inverted.get(element, None)
+                    if elements is not None:
+                        elements.discard(key)
+                        if not elements:
+                            del self.inverted[element]
+
+    def lookup(self, op, val):
+        """ Returns (size, keys) where keys() returns the keys that may
+                match `field op val` and size is their number, or None
+                when the index can not be used for val.
+
+        :param op: one of 'eq', 'in', 'contains', 'lt', 'le', 'gt', 'ge'
+        """
+        always = (self.unindexed,)
+        if op == 'eq' or op == 'contains':
+            if not _is_hashable(val):
+                return None
+            d = self.hashed if op == 'eq' else self.inverted
+            parts = (d.get(val, ()), *always)
+        elif op == 'in':
+            if not all(_is_hashable(v) for v in val):
+                return None
+            parts = (*(self.hashed.get(v, ()) for v in val), *always)
+        else:
+            kind = _sort_kind(val)
+            if kind is None:
+                return None
+            values, keys = self.sorted.get(kind, (list(), list()))
+            if op == 'lt':
+                lo, hi = 0, bisect.bisect_left(values, val)
+            elif op == 'le':
+                lo, hi = 0, bisect.bisect_right(values, val)
+            elif op == 'gt':
+                lo, hi = bisect.bisect_right(values, val), len(values)
+            else:
+                lo, hi = bisect.bisect_left(values, val), len(values)
+            # Values of other kinds are not comparable with val
+            parts = (keys[lo:hi],)
+        return sum(len(part) for part in parts), \
+            lambda: set().union(*parts)
+
+
+class _Partition:
+    """
+    Documents of one collection, with a _FieldIndex for each field that
+        a query has filtered on, built on first use and kept up to date.
+
+    docs and seq are copied on the first write after view, so that
+        queries read them without holding the lock of the database.
+    """
+
+    def __init__(self):
+        self.docs = dict()
+        self.indexes = dict()
+        # Order in which documents were created, for query results
+        self.seq = dict()
+        self._next_seq = 0
+        self._shared = False
+
+    def view(self):
+        """ Returns (docs, seq), which later writes do not change
+        """
+        self._shared = True
+        return self.docs, self.seq
+
+    def _own(self):
+        if self._shared:
+            self.docs = dict(self.docs)
+            self.seq = dict(self.seq)
+            self._shared = False
+
+    def put(self, key, d):
+        self._own()
+        old = self.docs.get(key, None)
+        for index in self.indexes.values():
+            if old is not None:
+                index.remove(key, old)
+            index.add(key, d)
+        if old is None:
+            self.seq[key] = self._next_seq
+            self._next_seq += 1
+        self.docs[key] = d
+
+    def remove(self, key):
+        self._own()
+        old = self.docs.pop(key)
+        del self.seq[key]
+        for index in self.indexes.values():
+            index.remove(key, old)
+
+    def index(self, field):
+        if field not in self.indexes:
+            index = _FieldIndex(field)
+            for key, d in self.docs.items():
+                index.add(key, d)
+            self.indexes[field] = index
+        return self.indexes[field]
+
+
+class _Versions:
+    """
+    Versions of the documents in MockDatabase. Every write gets the next
+        version. While transactions are open, the value that a write
+        replaces is kept in history, so that a transaction reads the
+        documents as they were when it began.
+    """
+
+    def __init__(self):
+        self.version = 0
+        # Version of the last write of each path
+        self.written = dict()
+        # Path to a list of (version, d or None) of replaced values
+        self.history = dict()
+        # Begin version of each open transaction
+        self.active = dict()
+
+    def record(self, key, old):
+        """ Returns the version of a write to key that replaces old
+        """
+        if self.active:
+            self.history.setdefault(key, list()).append(
+                (self.written.get(key, 0), old))
+        self.version += 1
+        self.written[key] = self.version
+        return self.version
+
+    def read(self, key, version, docs):
+        """ Returns d of key at version, or None when it did not exist.
+                Does not lock: a value is used only when the version of
+                key is unchanged after reading it.
+        """
+        written = self.written.get(key, 0)
+        if written <= version:
+            d = docs.get(key, None)
+            if self.written.get(key, 0) == written:
+                return d
+        for at, d in reversed(self.history.get(key, ())):
+            if at <= version:
+                return d
+        return None
+
+    def begin(self, transaction):
+        self.active[id(transaction)] = self.version
+        return self.version
+
+    def end(self, transaction):
+        self.active.pop(id(transaction), None)
+        if not self.active:
+            self.history.clear()
+            return
+        oldest = min(self.active.values())
+        for key, values in list(self.history.items()):
+            # Keeps the value that the oldest transaction reads, and newer
+            keep = [value for value in values if value[0] >= oldest]
+            older = [value for value in values if value[0] < oldest]
+            if older:
+                keep.insert(0, older[-1])
+            self.history[key] = keep
+
+
+class MockTransaction:
+    """
+    Optimistic transaction of MockDatabase with snapshot isolation. Reads
+        see the documents as of the begin of the transaction, and writes
+        are collected and applied on commit. Commit raises
+        TransactionConflictError when a document that was read or written
+        has been written by another commit since the transaction began.
+        Queries read the latest documents.
+
+    A transaction that is not run through MockDatabase.transactional
+        begins at its first read or at commit, and ends at commit or
+        rollback.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.version = None
+        self.reads = set()
+        self.ops = list()
+
+    def _begin(self):
+        self.reads = set()
+        self.ops = list()
+        self.version = None
+        self._start()
+
+    def _start(self):
+        """ Returns the begin version, and begins if not yet begun
+        """
+        if self.version is None:
+            with self.database._lock:
+                self.version = self.database._versions.begin(self)
+        return self.version
+
+    def _end(self):
+        with self.database._lock:
+            self.database._versions.end(self)
+        self.version = None
+
+    def _rollback(self):
+        self.ops = list()
+        self._end()
+
+    def _commit(self):
+        try:
+            self.database._commit_transaction(self)
+        finally:
+            self._end()
+
+    def set(self, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        self.ops.append(('set', ref, snapshot))
+
+    def update(self, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        self.ops.append(('update', ref, snapshot))
+
+    def delete(self, ref: Reference, transaction=_NA):
+        self.ops.append(('delete', ref, None))
 
 
 class MockDatabase(Database):
@@ -25,27 +328,133 @@ class MockDatabase(Database):
         ge = lambda a, b: a >= b
         lt = lambda a, b: a < b
         le = lambda a, b: a <= b
-        contains = lambda a, b: a.has(b)  # TODO; check
+        contains = lambda a, b: b in a
         _in = lambda a, b: a in b
 
     @classmethod
     def listener(cls):
         return GenericListener
 
+    # Every document by path, and the documents of each collection
+    #   (keyed by the path of the collection) with their indexes
     d = dict()
+    _partitions = dict()
+
+    # Held while d, _partitions and _versions are changed. Reads of
+    #   documents do not take it.
+    _lock = threading.RLock()
+    _versions = _Versions()
+
+    # Number of attempts of a function wrapped by transactional
+    max_attempts = 5
 
     ref = MockReference()
 
+    @classmethod
+    def _put(cls, key, d):
+        with cls._lock:
+            cls._versions.record(key, cls.d.get(key, None))
+            cls.d[key] = d
+            collection = key.rpartition('/')[0]
+            if collection not in cls._partitions:
+                cls._partitions[collection] = _Partition()
+            cls._partitions[collection].put(key, d)
+
+    @classmethod
+    def _remove(cls, key):
+        with cls._lock:
+            cls._versions.record(key, cls.d[key])
+            del cls.d[key]
+            cls._partitions[key.rpartition('/')[0]].remove(key)
+
+    @classmethod
+    def transaction(cls) -> MockTransaction:
+        return MockTransaction(database=cls)
+
+    @classmethod
+    def transactional(cls, func):
+        """ Decorates func(transaction, *args, **kwargs) to run in the
+                transaction that it is called with, and to run again in
+                the same transaction when the commit conflicts, up to
+                max_attempts times; like firestore.transactional.
+        """
+        @functools.wraps(func)
+        def wrapper(transaction, *args, **kwargs):
+            for attempt in range(cls.max_attempts):
+                transaction._begin()
+                try:
+                    res = func(transaction, *args, **kwargs)
+                except BaseException:
+                    transaction._rollback()
+                    raise
+                try:
+                    transaction._commit()
+                except TransactionConflictError:
+                    if attempt == cls.max_attempts - 1:
+                        raise
+                    continue
+                return res
+        return wrapper
+
+    @staticmethod
+    def _transaction_of(transaction):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+        return transaction if isinstance(transaction, MockTransaction) \
+            else None
+
+    @classmethod
+    def _commit_transaction(cls, transaction: MockTransaction):
+        """ Applies the writes of transaction, or raises
+                TransactionConflictError when a document that it read or
+                writes has a version newer than its begin.
+        """
+        with cls._lock:
+            keys = transaction.reads.union(
+                str(ref) for _, ref, _ in transaction.ops)
+            for key in keys:
+                if cls._versions.written.get(key, 0) > transaction._start():
+                    raise TransactionConflictError(key)
+            published = cls._apply_ops(transaction.ops)
+        for ref, snapshot in published:
+            cls.listener()._pub(reference=ref, snapshot=snapshot)
+
     @classmethod
     def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
-        cls.d[str(ref)] = snapshot.to_dict()
+        transaction = cls._transaction_of(transaction)
+        if transaction is not None:
+            return transaction.set(ref=ref, snapshot=snapshot)
+        cls._put(str(ref), snapshot.share())
         cls.listener()._pub(reference=ref, snapshot=snapshot)
 
     @classmethod
     def get(cls, ref: Reference, transaction=_NA):
-        return Snapshot(cls.d[str(ref)])
+        transaction = cls._transaction_of(transaction)
+        if transaction is None:
+            return Snapshot.view(cls.d[str(ref)])
+        key = str(ref)
+        version = transaction._start()
+        transaction.reads.add(key)
+        d = cls._versions.read(key, version, cls.d)
+        if d is None:
+            raise KeyError(key)
+        return Snapshot.view(d)
+
+    @classmethod
+    def get_many(cls, refs: [Reference], transaction=_NA):
+        for ref in refs:
+            yield ref, cls.get(ref=ref, transaction=transaction)
+
+    @classmethod
+    def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        transaction = cls._transaction_of(transaction)
+        if transaction is not None:
+            return transaction.update(ref=ref, snapshot=snapshot)
+        with cls._lock:
+            d = {**cls.d[str(ref)], **snapshot}
+            cls._put(str(ref), d)
+        cls.listener()._pub(reference=ref, snapshot=Snapshot.view(d))
 
-    update = set
     create = set
 
     @classmethod
@@ -56,16 +465,151 @@ class MockDatabase(Database):
         :param transaction:
         :return:
         """
-        del cls.d[str(ref)]
+        transaction = cls._transaction_of(transaction)
+        if transaction is not None:
+            return transaction.delete(ref=ref)
+        cls._remove(str(ref))
         cls.listener()._pub(reference=ref, snapshot=None)
 
 
+    @classmethod
+    def _commit_batch(cls, ops):
+        """ Applies all ops to d while holding _lock, then publishes them.
+        """
+        with cls._lock:
+            published = cls._apply_ops(ops)
+        for ref, snapshot in published:
+            cls.listener()._pub(reference=ref, snapshot=snapshot)
+
+    @classmethod
+    def _apply_ops(cls, ops):
+        """ Applies ops, all or none of them; returns the (ref, snapshot)
+                to publish. Raises KeyError before anything is written
+                when an update or delete is of a missing document.
+        """
+        published = list()
+        with cls._lock:
+            # Documents as of the ops before, or None when deleted
+            pending = dict()
+            writes = list()
+            for method_name, ref, snapshot in ops:
+                key = str(ref)
+                old = pending[key] if key in pending else cls.d.get(key, None)
+                if method_name != 'set' and old is None:
+                    raise KeyError(key)
+                if method_name == 'update':
+                    snapshot = Snapshot.view({**old, **snapshot})
+                d = snapshot.share() if method_name != 'delete' else None
+                pending[key] = d
+                writes.append((key, d))
+                published.append((ref, snapshot))
+            for key, d in writes:
+                if d is None:
+                    cls._remove(key)
+                else:
+                    cls._put(key, d)
+        return published
+
+    @classmethod
+    def _query_partitions(cls, q):
+        ref = str(q.ref)
+        if ref.startswith('**/'):
+            name = ref[len('**/'):]
+            return [partition
+                    for collection, partition in cls._partitions.items()
+                    if collection.rpartition('/')[2] == name]
+        partition = cls._partitions.get(ref, None)
+        return [partition] if partition is not None else []
+
+    @classmethod
+    def _candidates(cls, partition, arguments):
+        """ Returns keys of the documents in partition that may match
+                arguments, looked up with the index of the argument that
+                matches the fewest documents, or None when no argument
+                can use an index.
+        """
+        ops = cls._index_ops()
+        best = None
+        for key, comparator, val in arguments:
+            if not isinstance(key, str) or comparator not in ops:
+                continue
+            found = partition.index(key).lookup(ops[comparator], val)
+            if found is not None and (best is None or found[0] < best[0]):
+                best = found
+        return best[1]() if best is not None else None
+
+    @classmethod
+    def _index_ops(cls):
+        """ Returns a dict from comparators (and the comparator strings
+                of Firestore) to index lookups
+        """
+        Comparators = cls.Comparators
+        ops = {
+            '==': 'eq', 'in': 'in', 'array_contains': 'contains',
+            '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge',
+        }
+        for op in ('eq', 'contains', 'lt', 'le', 'gt', 'ge'):
+            ops[getattr(Comparators, op)] = op
+        ops[Comparators._in] = 'in'
+        return ops
+
     @classmethod
     def query(cls, q):
+        """ Yields documents of the collection of q that match q. When
+                q has arguments, the documents are looked up with an index
+                of the partition, in the order that they were created
+                unless q has order_by. Only the index lookup holds the
+                lock; documents are read from a view of the partition.
+        """
         qualifier = q._to_qualifier()
-        for k, v in cls.d.items():
-            if qualifier(v):
-                yield MockReference.from_str(k), Snapshot(v)
-        yield from ()
+        arguments = [(key, comparator, val)
+                     for key, comparator, val, _ in q._data_arguments()]
+        views = list()
+        with cls._lock:
+            for partition in cls._query_partitions(q):
+                views.append(
+                    (*partition.view(), cls._candidates(partition, arguments)))
+        items = list()
+        for docs, seq, candidates in views:
+            if candidates is None:
+                items.extend(docs.items())
+            else:
+                items.extend((key, docs[key])
+                             for key in sorted(candidates, key=seq.__getitem__))
+        items = q._paginate([(k, v) for k, v in items if qualifier(v)])
+        for k, v in items:
+            yield MockReference.from_str(k), Snapshot.view(q._project(v))
+
+    # The documents are in memory, so the async methods call the
+    #   synchronous ones directly instead of in a worker thread.
+
+    @classmethod
+    async def aset(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        return cls.set(ref=ref, snapshot=snapshot, transaction=transaction)
+
+    @classmethod
+    async def aget(cls, ref: Reference, transaction=_NA):
+        return cls.get(ref=ref, transaction=transaction)
+
+    @classmethod
+    async def aget_many(cls, refs: [Reference], transaction=_NA):
+        return list(cls.get_many(refs=refs, transaction=transaction))
+
+    @classmethod
+    async def aupdate(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        return cls.update(ref=ref, snapshot=snapshot, transaction=transaction)
+
+    @classmethod
+    async def acreate(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        return cls.create(ref=ref, snapshot=snapshot, transaction=transaction)
+
+    @classmethod
+    async def adelete(cls, ref: Reference, transaction=_NA):
+        return cls.delete(ref=ref, transaction=transaction)
+
+    @classmethod
+    async def aquery(cls, q):
+        for item in cls.query(q):
+            yield item
 
 
@@ -0,0 +1,261 @@
+import asyncio
+import copy
+import functools
+import itertools
+import threading
+
+from onto.common import _NA
+from onto.context import Context as CTX
+from onto.database import Database, Reference, Snapshot
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time across threads; callers that
+        ask for a key while its call is in flight wait for it and share
+        its result (or its error).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = dict()
+
+    def do(self, key, f):
+        with self._lock:
+            call = self._calls.get(key, None)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = f()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines of one event loop; f returns an awaitable.
+        The shared call runs in a task of its own, so that it completes
+        for the other callers when the caller that started it is
+        cancelled.
+    """
+
+    def __init__(self):
+        self._tasks = dict()
+
+    async def do(self, key, f):
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        task = self._tasks.get(key, None)
+        if task is None:
+            task = asyncio.ensure_future(f())
+            self._tasks[key] = task
+            task.add_done_callback(
+                functools.partial(self._done, key))
+        # A caller that is cancelled does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._tasks.get(key, None) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Marks the error as retrieved when no caller waits any more
+            task.exception()
+
+
+class SingleFlightDatabase(Database):
+    """
+    Shares one backend call between concurrent identical reads.
+
+    Create with SingleFlightDatabase.of(FirestoreDatabase), or with
+        "single_flight: true" in the database config. get and aget are
+        keyed by reference, and query and aquery by Query._key() (the
+        reference, parent and arguments of the query). Reads with a
+        transaction are not shared.
+
+    Keys also have a generation that writes through this class bump once
+        they return. A read after a write therefore does not join a call
+        that started before it. A shared query holds all of its
+        results in a list; query_pages does not share, so that pages
+        are read one at a time.
+    """
+
+    # Set for each class created by SingleFlightDatabase.of
+    _flight = None
+    _async_flight = None
+    # [number of writes through the class]
+    _generation = None
+
+    @classmethod
+    def of(cls, database):
+        """ Returns a subclass of database with reads shared.
+
+        :param database: a Database subclass
+        """
+        return type(f'SingleFlight{database.__name__}', (cls, database), dict(
+            _flight=SingleFlight(),
+            _async_flight=AsyncSingleFlight(),
+            _generation=[0],
+        ))
+
+    @classmethod
+    def _written(cls):
+        with cls._flight._lock:
+            cls._generation[0] += 1
+
+    @classmethod
+    def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        try:
+            return super().set(
+                ref=ref, snapshot=snapshot, transaction=transaction)
+        finally:
+            cls._written()
+
+    @classmethod
+    def create(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        try:
+            return super().create(
+                ref=ref, snapshot=snapshot, transaction=transaction)
+        finally:
+            cls._written()
+
+    @classmethod
+    def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        try:
+            return super().update(
+                ref=ref, snapshot=snapshot, transaction=transaction)
+        finally:
+            cls._written()
+
+    @classmethod
+    def delete(cls, ref: Reference, transaction=_NA):
+        try:
+            return super().delete(ref=ref, transaction=transaction)
+        finally:
+            cls._written()
+
+    @classmethod
+    def _commit_batch(cls, ops):
+        try:
+            return super()._commit_batch(ops)
+        finally:
+            cls._written()
+
+    @classmethod
+    def transactional(cls, func):
+        """ Decorates func like the transactional of the underlying
+                database. Writes in a transaction are applied on commit,
+                so every read after it starts a call of its own.
+        """
+        run = super().transactional(func)
+
+        @functools.wraps(func)
+        def wrapper(transaction, *args, **kwargs):
+            try:
+                return run(transaction, *args, **kwargs)
+            finally:
+                cls._written()
+        return wrapper
+
+    @classmethod
+    async def aset(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        try:
+            return await super().aset(
+                ref=ref, snapshot=snapshot, transaction=transaction)
+        finally:
+            cls._written()
+
+    @classmethod
+    async def aupdate(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        try:
+            return await super().aupdate(
+                ref=ref, snapshot=snapshot, transaction=transaction)
+        finally:
+            cls._written()
+
+    @classmethod
+    async def adelete(cls, ref: Reference, transaction=_NA):
+        try:
+            return await super().adelete(ref=ref, transaction=transaction)
+        finally:
+            cls._written()
+
+    @staticmethod
+    def _is_shared(transaction):
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+        return transaction is None
+
+    @classmethod
+    def get(cls, ref: Reference, transaction=_NA):
+        f = functools.partial(super().get, ref=ref, transaction=transaction)
+        if not cls._is_shared(transaction):
+            return f()
+        key = ('get', str(ref), cls._generation[0])
+        return copy.copy(cls._flight.do(key, f))
+
+    @classmethod
+    def query(cls, q):
+        key = q._key()
+        if key is None:
+            yield from super().query(q)
+            return
+        query = super().query
+        items = cls._flight.do(
+            ('query', key, cls._generation[0]), lambda: list(query(q)))
+        for ref, snapshot in items:
+            yield ref, copy.copy(snapshot)
+
+    @classmethod
+    def query_pages(cls, q, page_size):
+        if super().query_pages.__func__ is not Database.query_pages.__func__:
+            yield from super().query_pages(q, page_size)
+            return
+        # The default of Database would read all results with query
+        results = iter(super().query(q))
+        while page := list(itertools.islice(results, page_size)):
+            yield page
+
+    @classmethod
+    async def aget(cls, ref: Reference, transaction=_NA):
+        f = functools.partial(super().aget, ref=ref, transaction=transaction)
+        if not cls._is_shared(transaction):
+            return await f()
+        key = ('get', str(ref), cls._generation[0])
+        return copy.copy(await cls._async_flight.do(key, f))
+
+    @classmethod
+    async def aquery(cls, q):
+        key = q._key()
+        aquery = super().aquery
+        if key is None:
+            async for item in aquery(q):
+                yield item
+            return
+
+        async def f():
+            return [item async for item in aquery(q)]
+
+        key = ('query', key, cls._generation[0])
+        for ref, snapshot in await cls._async_flight.do(key, f):
+            yield ref, copy.copy(snapshot)
@@ -0,0 +1,302 @@
+"""
+Database on a single SQLite file. Each collection is a table of
+    (path, data) where data is the document as JSON. Fields that a query
+    of a DomainModel filters on, and that are declared as scalar attrs
+    (string, integer, float, boolean) or are obj_type, are promoted to
+    generated columns with an index, so that the WHERE clause of the
+    query uses the index. Other conditions are evaluated on the JSON.
+"""
+import json
+import sqlite3
+import threading
+
+from marshmallow import fields as ma_fields
+
+from onto.common import _NA
+from onto.database import Database, Reference, Snapshot
+from onto.database.mock import MockDatabase, MockReference
+from onto.database.utils import GenericListener
+from onto.mapper.fields import OBJ_TYPE_ATTR_NAME
+
+_SQL_OPS = {
+    'eq': '=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>=',
+}
+
+_BINDABLE = (str, int, float, type(None))
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _json_path(key):
+    return '$."' + key.replace('"', '\\"') + '"'
+
+
+def _literal(s):
+    return "'" + s.replace("'", "''") + "'"
+
+
+class SqliteDatabase(Database):
+    """
+    Create with SqliteDatabase.of(path), or with "type: sqlite" and
+        "path" in the database config. Queries return documents in the
+        order that they were created. Documents must be serializable as
+        JSON. Change events are published through GenericListener.
+    """
+
+    Comparators = MockDatabase.Comparators
+
+    ref = MockReference()
+
+    # Set for each class created by SqliteDatabase.of
+    _connection: sqlite3.Connection = None
+    _sqlite_lock = None
+    # Promoted fields of each table that exists
+    _tables: dict = None
+
+    @classmethod
+    def of(cls, path=':memory:'):
+        """ Returns a subclass of SqliteDatabase that stores in the
+                SQLite file at path.
+        """
+        connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None)
+        database = type(cls.__name__, (cls,), dict(
+            _connection=connection,
+            _sqlite_lock=threading.RLock(),
+            _tables=dict(),
+        ))
+        database._load_tables()
+        return database
+
+    @classmethod
+    def listener(cls):
+        return GenericListener
+
+    @classmethod
+    def _load_tables(cls):
+        rows = cls._connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%'").fetchall()
+        for name, in rows:
+            columns = cls._connection.execute(
+                f'PRAGMA table_xinfo({_quote(name)})').fetchall()
+            cls._tables[name] = {
+                column[1][len('field:'):] for column in columns
+                if column[1].startswith('field:')
+            }
+
+    @classmethod
+    def _table(cls, collection):
+        """ Returns the name of the table of collection; creates it with
+                an indexed obj_type column if it does not exist.
+        """
+        if collection not in cls._tables:
+            with cls._sqlite_lock:
+                cls._connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {_quote(collection)} '
+                    f'(path TEXT PRIMARY KEY, data TEXT NOT NULL)')
+                cls._tables.setdefault(collection, set())
+                cls._promote(collection, OBJ_TYPE_ATTR_NAME)
+        return collection
+
+    @classmethod
+    def _promote(cls, table, key):
+        """ Adds a generated column with an index for field key of table
+        """
+        with cls._sqlite_lock:
+            if key in cls._tables[table]:
+                return
+            column = 'field:' + key
+            cls._connection.execute(
+                f'ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)} '
+                f'GENERATED ALWAYS AS '
+                f'(json_extract(data, {_literal(_json_path(key))}))'
+                f' VIRTUAL')
+            cls._connection.execute(
+                f'CREATE INDEX {_quote(table + ":" + key)} '
+                f'ON {_quote(table)} ({_quote(column)})')
+            # Statistics let the planner pick the index that matches the
+            #   fewest rows, rather than obj_type which matches most
+            cls._connection.execute(f'ANALYZE {_quote(table)}')
+            cls._tables[table].add(key)
+
+    @staticmethod
+    def _collection_of(key):
+        return key.rpartition('/')[0]
+
+    @classmethod
+    def _read(cls, key):
+        row = cls._connection.execute(
+            f'SELECT data FROM {_quote(cls._collection_of(key))} '
+            f'WHERE path = ?', (key,)).fetchone() \
+            if cls._collection_of(key) in cls._tables else None
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    @classmethod
+    def _write(cls, key, d):
+        table = cls._table(cls._collection_of(key))
+        cls._connection.execute(
+            f'INSERT INTO {_quote(table)} (path, data) VALUES (?, ?) '
+            f'ON CONFLICT (path) DO UPDATE SET data = excluded.data',
+            (key, json.dumps(d)))
+
+    @classmethod
+    def _remove(cls, key):
+        cursor = cls._connection.execute(
+            f'DELETE FROM {_quote(cls._collection_of(key))} WHERE path = ?',
+            (key,)) if cls._collection_of(key) in cls._tables else None
+        if cursor is None or cursor.rowcount == 0:
+            raise KeyError(key)
+
+    @classmethod
+    def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        with cls._sqlite_lock:
+            cls._write(str(ref), snapshot.to_dict())
+        cls.listener()._pub(reference=ref, snapshot=snapshot)
+
+    create = set
+
+    @classmethod
+    def get(cls, ref: Reference, transaction=_NA):
+        with cls._sqlite_lock:
+            return Snapshot.view(cls._read(str(ref)))
+
+    @classmethod
+    def get_many(cls, refs: [Reference], transaction=_NA):
+        for ref in refs:
+            yield ref, cls.get(ref=ref, transaction=transaction)
+
+    @classmethod
+    def update(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
+        with cls._sqlite_lock:
+            d = {**cls._read(str(ref)), **snapshot}
+            cls._write(str(ref), d)
+        cls.listener()._pub(reference=ref, snapshot=Snapshot.view(d))
+
+    @classmethod
+    def delete(cls, ref: Reference, transaction=_NA):
+        with cls._sqlite_lock:
+            cls._remove(str(ref))
+        cls.listener()._pub(reference=ref, snapshot=None)
+
+    @classmethod
+    def _commit_batch(cls, ops):
+        """ Applies all ops in one SQLite transaction, then publishes them.
+        """
+        published = list()
+        with cls._sqlite_lock:
+            cls._connection.execute('BEGIN')
+            try:
+                for method_name, ref, snapshot in ops:
+                    key = str(ref)
+                    if method_name == 'set':
+                        cls._write(key, snapshot.to_dict())
+                    elif method_name == 'update':
+                        d = {**cls._read(key), **snapshot}
+                        cls._write(key, d)
+                        snapshot = Snapshot.view(d)
+                    else:
+                        cls._remove(key)
+                    published.append((ref, snapshot))
+            except BaseException:
+                cls._connection.execute('ROLLBACK')
+                raise
+            cls._connection.execute('COMMIT')
+        for ref, snapshot in published:
+            cls.listener()._pub(reference=ref, snapshot=snapshot)
+
+    @classmethod
+    def _query_tables(cls, q):
+        ref = str(q.ref)
+        if ref.startswith('**/'):
+            name = ref[len('**/'):]
+            return [table for table in cls._tables
+                    if table.rpartition('/')[2] == name]
+        return [ref] if ref in cls._tables else []
+
+    @staticmethod
+    def _arguments_of(q):
+        """ Returns (data_key, comparator, val, is_scalar) of each
+                argument of q, with the obj_type condition of the
+                DomainModel of q if any. is_scalar is True for fields
+                that are declared as scalar attrs.
+        """
+        res = list()
+        for key, comparator, val, field in q._data_arguments():
+            is_scalar = key == OBJ_TYPE_ATTR_NAME or isinstance(
+                field, (ma_fields.String, ma_fields.Number, ma_fields.Boolean))
+            res.append((key, comparator, val, is_scalar))
+        return res
+
+    @classmethod
+    def _to_sql(cls, table, arguments):
+        """ Returns (clauses, params, rest) where rest are the arguments
+                that could not be translated to SQL.
+        """
+        ops = MockDatabase._index_ops()
+        clauses, params, rest = list(), list(), list()
+        for key, comparator, val, is_scalar in arguments:
+            op = ops.get(comparator, None) if isinstance(key, str) else None
+            if op is None:
+                rest.append((key, comparator, val))
+                continue
+            if is_scalar:
+                cls._promote(table, key)
+                expr, expr_params = _quote('field:' + key), []
+            else:
+                # Paths are bound rather than formatted into the statement
+                expr, expr_params = 'json_extract(data, ?)', [_json_path(key)]
+            if op in _SQL_OPS and isinstance(val, _BINDABLE):
+                clauses.append(f'{expr} {_SQL_OPS[op]} ?')
+                params.extend(expr_params + [val])
+            elif op == 'in' and isinstance(val, (list, tuple)) \
+                    and all(isinstance(v, _BINDABLE) for v in val):
+                clauses.append(
+                    f'{expr} IN ({", ".join("?" * len(val))})')
+                params.extend(expr_params + list(val))
+            elif op == 'contains' and isinstance(val, _BINDABLE):
+                clauses.append(
+                    'EXISTS (SELECT 1 FROM json_each(data, ?) WHERE value = ?)')
+                params.extend([_json_path(key), val])
+            else:
+                rest.append((key, comparator, val))
+        return clauses, params, rest
+
+    @classmethod
+    def query(cls, q):
+        """ Yields documents of the collection of q that match q, in the
+                order that they were created unless q has order_by. When
+                q has no order_by or cursor and every argument is in SQL,
+                at most offset + limit rows are read from each table.
+        """
+        arguments = cls._arguments_of(q)
+        in_order = not q._orders and q._start_after is None \
+            and q._end_before is None
+        rows = list()
+        with cls._sqlite_lock:
+            for table in cls._query_tables(q):
+                clauses, params, rest = cls._to_sql(table, arguments)
+                where = ' AND '.join(clauses) if clauses else '1'
+                # +rowid sorts the matching rows, so that the planner
+                #   does not prefer an index that is in rowid order
+                statement = f'SELECT path, data FROM {_quote(table)} ' \
+                            f'WHERE {where} ORDER BY +rowid'
+                if in_order and not rest and q._limit is not None:
+                    statement += ' LIMIT ?'
+                    params.append((q._offset or 0) + q._limit)
+                rows.extend(
+                    (key, json.loads(data), rest)
+                    for key, data in cls._connection.execute(statement, params))
+        items = q._paginate([
+            (key, d) for key, d, rest in rows
+            # A document without the field does not match, as on
+            #   Firestore and in MockDatabase
+            if all(k in d and comparator(d[k], val)
+                   for k, comparator, val in rest)
+        ])
+        for key, d in items:
+            yield MockReference.from_str(key), Snapshot.view(q._project(d))
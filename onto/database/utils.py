@@ -12,6 +12,7 @@ class GenericListener(Listener):
 
     @classmethod
     def _pub(cls, reference: Reference, snapshot: Snapshot):
+        cls._notify_change(reference=reference, snapshot=snapshot)
         col = reference.collection
         cls.qs[col].put_nowait((reference, snapshot))
 
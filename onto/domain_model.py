@@ -84,5 +84,16 @@ class DomainModel(PrimaryObject, RemoteProxyMixin):
         from onto.context import Context as CTX
         return CTX.db
 
+    @classmethod
+    def save_all(cls, objs, **kwargs):
+        """ Saves objs with one Database.batch.
+
+        :param objs: domain model objects
+        :param kwargs: Keyword arguments to be forwarded to save
+        """
+        with cls._datastore().batch():
+            for obj in objs:
+                obj.save(**kwargs)
+
 
 
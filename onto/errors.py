@@ -26,3 +26,17 @@ class PropertyEvalError(BoilerError):
 
 class UnauthorizedError(BoilerError):
     pass
+
+
+class PartialObjectError(BoilerError):
+    """ Raised on save of an object read with a projection, when a
+            field that was not read would be written.
+    """
+    pass
+
+
+class TransactionConflictError(BoilerError):
+    """ Raised on commit of a transaction when a document that it read
+            or writes was changed by another commit since it began.
+    """
+    pass
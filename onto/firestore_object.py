@@ -1,21 +1,44 @@
 # from google.cloud.firestore import DocumentReference
 import abc
+import functools
 
 # from google.cloud.firestore_v1 import WriteOption, LastUpdateOption
 
 from onto.common import _NA
-from onto.database import Snapshot, Reference
+from onto.database import Batch, Snapshot, Reference
 from onto.mapper.helpers import RelationshipReference
 # from onto.view_model import ViewModel
 from onto.models.mixin import resolve_obj_cls
 from onto.registry import ModelRegistry
 from onto.models.base import Serializable
+from onto.database.identity_map import IdentityMap
 from onto.utils import snapshot_to_obj
 from onto.context import Context as CTX
+from onto.errors import PartialObjectError
+from onto.mapper.fields import OBJ_TYPE_ATTR_NAME
+
+
+def _copy_containers(val):
+    """ Copies dicts and lists so that later changes to val in place
+            are not reflected in the copy
+    """
+    if isinstance(val, dict):
+        return {k: _copy_containers(v) for k, v in val.items()}
+    elif isinstance(val, list):
+        return [_copy_containers(v) for v in val]
+    else:
+        return val
 
 
 class FirestoreObjectMixin:
 
+    # When False, objects read as whole documents do not record what
+    #   was read, and save always writes the whole document. The record
+    #   shares field values with the object, and copies dicts and lists
+    #   only; models held in large caches can turn it off to save memory.
+    #   Objects read with a projection always record.
+    _records_clean = True
+
     def __init__(self, *args, doc_ref=None, transaction=_NA, **kwargs):
 
         if transaction is _NA:
@@ -42,43 +65,262 @@ class FirestoreObjectMixin:
         return self._doc_ref
 
     @classmethod
-    def get(cls, *, doc_ref=None, transaction=_NA, **kwargs):
-        """ Retrieves an object from Firestore
+    def get(cls, *, doc_ref=None, transaction=_NA, fields=None, **kwargs):
+        """ Retrieves an object from Firestore. Within an IdentityMap
+                scope, returns the object that was already loaded.
+
+        :param doc_ref:
+        :param transaction:
+        :param fields: names of attributes to read; the object is partial
+            (see _mark_partial) and is not added to the IdentityMap
+        :param kwargs: Keyword arguments to be forwarded to from_dict
+        """
+        identity_map = IdentityMap.current()
+        if fields is not None:
+            obj = None if identity_map is None else \
+                identity_map.get_object(cls, doc_ref, transaction)
+            if obj is None:
+                projection = cls._projection_of(fields)
+                snapshot = cls._datastore().get_fields(
+                    ref=doc_ref, fields=projection, transaction=transaction)
+                obj = cls._obj_of_snapshot(
+                    doc_ref, snapshot, transaction, fields=projection)
+            return obj
+        if identity_map is None:
+            snapshot = cls._datastore().get(ref=doc_ref, transaction=transaction)
+            return cls._obj_of_snapshot(doc_ref, snapshot, transaction)
+
+        obj = identity_map.get_object(cls, doc_ref, transaction)
+        if obj is None:
+            snapshot = identity_map.get(
+                cls._datastore(), ref=doc_ref, transaction=transaction)
+            obj = cls._obj_of_snapshot(doc_ref, snapshot, transaction)
+            identity_map.add_object(cls, doc_ref, obj, transaction)
+        return obj
+
+    @classmethod
+    async def aget(cls, *, doc_ref=None, transaction=_NA, **kwargs):
+        """ Retrieves an object with Database.aget; see get.
 
         :param doc_ref:
         :param transaction:
         :param kwargs: Keyword arguments to be forwarded to from_dict
         """
+        identity_map = IdentityMap.current()
+        if identity_map is None:
+            snapshot = await cls._datastore().aget(
+                ref=doc_ref, transaction=transaction)
+            return cls._obj_of_snapshot(doc_ref, snapshot, transaction)
+
+        obj = identity_map.get_object(cls, doc_ref, transaction)
+        if obj is None:
+            snapshot = await identity_map.aget(
+                cls._datastore(), ref=doc_ref, transaction=transaction)
+            # Another task may have loaded the object in the meantime
+            obj = identity_map.get_object(cls, doc_ref, transaction)
+        if obj is None:
+            obj = cls._obj_of_snapshot(doc_ref, snapshot, transaction)
+            identity_map.add_object(cls, doc_ref, obj, transaction)
+        return obj
 
-        snapshot = cls._datastore().get(ref=doc_ref, transaction=transaction)
-        obj = snapshot_to_obj(
-            snapshot=snapshot,
-            reference=doc_ref,
-            super_cls=cls,
-            transaction=transaction)
+    @classmethod
+    def _obj_of_snapshot(cls, doc_ref, snapshot, transaction, fields=None):
+        if fields is None:
+            obj = snapshot_to_obj(
+                snapshot=snapshot,
+                reference=doc_ref,
+                super_cls=cls,
+                transaction=transaction)
+        else:
+            obj = snapshot_to_obj(
+                snapshot=snapshot,
+                reference=doc_ref,
+                super_cls=cls,
+                transaction=transaction,
+                partial=True)
+            obj._mark_partial(fields)
+        if snapshot.exists:
+            obj._mark_clean(snapshot.as_mapping())
         return obj
 
+    @classmethod
+    def _projection_of(cls, keys):
+        """ Returns the data keys of the attributes keys, with obj_type
+                so that the object is read as one of its class
+        """
+        schema_fields = cls.get_schema_obj().fields
+        res = list()
+        for key in (OBJ_TYPE_ATTR_NAME, *keys):
+            field = schema_fields.get(key, None)
+            if field is None:
+                if key == OBJ_TYPE_ATTR_NAME:
+                    continue
+                raise ValueError(f'{cls.__name__} has no attribute {key}')
+            data_key = field.data_key if field.data_key is not None else key
+            if data_key not in res:
+                res.append(data_key)
+        return res
+
+    def _mark_partial(self, fields):
+        """ Removes the attributes whose data key is not in fields from
+                an object that was read with a projection. Reading such
+                attribute raises AttributeError, and save only writes
+                the fields that were read; see _prepare_save.
+
+        :param fields: the data keys that were read
+        """
+        from onto.models.base import PartialStoreMixin
+        store = self._attrs
+        unloaded = set()
+        for field_name, field in self.get_schema_obj().fields.items():
+            data_key = field.data_key \
+                if field.data_key is not None else field_name
+            if data_key in fields:
+                continue
+            name = field.attribute or field_name
+            try:
+                delattr(store, name)
+            except AttributeError:
+                # Not kept in the store, such as doc_id
+                continue
+            unloaded.add(name)
+        store.__dict__['_unloaded'] = frozenset(unloaded)
+        store.__class__ = PartialStoreMixin.of(store.__class__)
+
+    def _unloaded_attributes(self):
+        """ Returns the names of attributes that were not read, or None
+                when the object is not partial
+        """
+        store = getattr(self, '_attrs', None)
+        return getattr(store, '__dict__', dict()).get('_unloaded', None)
+
     @classmethod
     def from_snapshot(cls, ref, snapshot=None, **kwargs):
         """ Deserializes an object from a Document Snapshot.
 
         :param snapshot: Firestore Snapshot
+        :param kwargs: Keyword arguments to be forwarded to from_dict;
+            pass lazy=True to decode fields on first access
         """
         # if not snapshot.exists:
         #     return None
 
-        obj = cls.from_dict(d=snapshot.to_dict(), doc_ref=ref, **kwargs)
+        d = snapshot.as_mapping()
+        obj = cls.from_dict(d=d, doc_ref=ref, **kwargs)
+        if snapshot.exists:
+            obj._mark_clean(d)
         return obj
 
+    @classmethod
+    def from_snapshots(cls, items, fields=None, **kwargs):
+        """ Deserializes objects from many Document Snapshots at once.
+
+        :param items: an iterable of (ref, snapshot)
+        :param fields: the data keys that snapshots were read with, as
+            returned by Query._projection, or None for whole documents.
+            Objects read with fields are partial; see _mark_partial.
+        :param kwargs: Keyword arguments to be forwarded to from_dicts
+        :return: a list of objects in the order of items
+        """
+        items = list(items)
+        ds = [snapshot.as_mapping() for _, snapshot in items]
+        if fields is not None:
+            kwargs['partial'] = True
+        objs = cls.from_dicts(
+            ds,
+            each_kwargs=[dict(doc_ref=ref) for ref, _ in items],
+            **kwargs
+        )
+        for obj, d, (_, snapshot) in zip(objs, ds, items):
+            if fields is not None:
+                obj._mark_partial(fields)
+            if snapshot.exists:
+                obj._mark_clean(d)
+        return objs
+
     def to_snapshot(self):
         return Snapshot(**self.to_dict())
 
+    def _mark_clean(self, d):
+        """ Records d as the document stored at doc_ref. save then writes
+                only the fields that differ from it.
+
+        :param d: a dictionary representation of this object, as returned
+            by `to_dict` or stored in the datastore
+        """
+        if not self._records_clean and self._unloaded_attributes() is None:
+            return
+        self._clean_d = {
+            key: _copy_containers(val) for key, val in d.items()}
+
+    def _dirty_fields(self, d):
+        """ Returns the fields in d that differ from the document recorded
+                by _mark_clean, or None when the whole document should be
+                written (nothing or an empty document recorded, or a field
+                is removed).
+
+        :param d: a dictionary representation of this object
+        """
+        clean = self.__dict__.get('_clean_d', None)
+        if not clean or clean.keys() - d.keys():
+            return None
+        return {
+            key: val for key, val in d.items()
+            if key not in clean or clean[key] != val
+        }
+
+    def _partial_changes(self, d, to_self):
+        """ Returns the fields in d that differ from the fields that were
+                read, for an object read with a projection. Raises
+                PartialObjectError when a field that was not read would
+                be written.
+
+        :param d: a dictionary representation of this object
+        :param to_self: False when saved to another doc_ref
+        """
+        if not to_self:
+            raise PartialObjectError(
+                'An object read with a projection can only be saved to '
+                'its doc_ref')
+        # An attribute that was not read only has a value when assigned
+        assigned = sorted(name for name in self._unloaded_attributes()
+                          if hasattr(self._attrs, name))
+        if assigned:
+            raise PartialObjectError(
+                f'{", ".join(assigned)} were not read, and can not be saved')
+        if '_clean_d' not in self.__dict__:
+            raise PartialObjectError(
+                'An object read with a projection can not be saved after '
+                'it is deleted')
+        clean = self.__dict__['_clean_d']
+        removed = sorted(key for key in clean if key not in d)
+        if removed:
+            raise PartialObjectError(
+                f'{", ".join(removed)} can not be removed from an object '
+                f'read with a projection')
+        # Fields that were not read, such as doc_id, are left as they are
+        return {key: val for key, val in d.items()
+                if key in clean and clean[key] != val}
+
     def save(self,
              transaction: 'google.cloud.firestore.Transaction'=_NA,
              doc_ref=None,
              _store=_NA,
              ):
-        """ Save an object to Firestore
+        """ Save an object to Firestore. When the object was loaded
+                from or saved to doc_ref before, only the fields that
+                changed since then are written (with Database.update),
+                and nothing is written when no field changed. Without a
+                transaction, the write joins the Database.batch that is
+                active, if any. The object records what is written once
+                the batch commits; writes in a transaction are not
+                recorded, as the transaction may still fail.
+
+            When the document was deleted by another writer since it was
+                loaded, a save without a batch or transaction writes the
+                whole document again. In a batch or a transaction, the
+                update fails as Database.update does for a missing
+                document (KeyError, or NotFound on Firestore).
 
         :param transaction: Firestore Transaction
         :param doc_ref: override save with this doc_ref
@@ -86,11 +328,86 @@ class FirestoreObjectMixin:
             object will be saved to the Firestore.
         """
 
+        method_name, kwargs, clean_d = self._prepare_save(
+            transaction=transaction, doc_ref=doc_ref, _store=_store)
+        writer = self._datastore().writer(kwargs['transaction'])
+        if method_name is not None:
+            try:
+                getattr(writer, method_name)(**kwargs)
+            except Exception as e:
+                if not self._recreates(writer, method_name, kwargs, e):
+                    raise
+                writer.set(**dict(kwargs, snapshot=Snapshot.view(clean_d)))
+            self._discard_snapshots(kwargs['ref'])
+        self._record_save(writer, kwargs, clean_d)
+
+    def _recreates(self, writer, method_name, kwargs, error):
+        """ Returns True when error is from an update, without a batch
+                or transaction, of a document that no longer exists; save
+                then writes the whole document.
+        """
+        return method_name == 'update' \
+            and not isinstance(writer, Batch) \
+            and kwargs['transaction'] is None \
+            and self._unloaded_attributes() is None \
+            and writer._is_missing_error(error)
+
+    def _record_save(self, writer, kwargs, clean_d):
+        if clean_d is None or kwargs['transaction'] is not None:
+            # A transaction may still fail or be retried; the record is
+            #   kept, so that the next save writes the changes again
+            return
+        if isinstance(writer, Batch):
+            writer.after_commit(functools.partial(self._mark_clean, clean_d))
+        else:
+            self._mark_clean(clean_d)
+
+    async def asave(self,
+                    transaction=_NA,
+                    doc_ref=None,
+                    _store=_NA,
+                    ):
+        """ Saves an object with Database.aset or Database.aupdate; see
+                save. Inside a Database.batch, the write joins the batch
+                as with save. Objects nested in this object are still
+                saved with the blocking Database methods.
+
+        :param transaction:
+        :param doc_ref: override save with this doc_ref
+        """
+        method_name, kwargs, clean_d = self._prepare_save(
+            transaction=transaction, doc_ref=doc_ref, _store=_store)
+        writer = self._datastore().writer(kwargs['transaction'])
+        if method_name is not None:
+            if isinstance(writer, Batch):
+                getattr(writer, method_name)(**kwargs)
+            else:
+                try:
+                    await getattr(writer, 'a' + method_name)(**kwargs)
+                except Exception as e:
+                    if not self._recreates(writer, method_name, kwargs, e):
+                        raise
+                    await writer.aset(
+                        **dict(kwargs, snapshot=Snapshot.view(clean_d)))
+            self._discard_snapshots(kwargs['ref'])
+        self._record_save(writer, kwargs, clean_d)
+
+    def _prepare_save(self, transaction, doc_ref, _store):
+        """ Exports this object for save.
+
+        :return: (method_name, kwargs, clean_d) where method_name is
+            'set', 'update' or None when nothing is to be written, kwargs
+            are for the Database method, and clean_d is to be recorded
+            with _mark_clean after the write (or None)
+        """
         if transaction is _NA:
             transaction = CTX.transaction_var.get()
 
-        if doc_ref is None:
+        if doc_ref is None or doc_ref == self.doc_ref:
             doc_ref = self.doc_ref
+            partial = True
+        else:
+            partial = False
 
         if _store is _NA:
             if issubclass(self.__class__, FirestoreObjectValMixin):
@@ -100,8 +417,18 @@ class FirestoreObjectMixin:
 
         d = self._export_as_dict(transaction=transaction, _store=_store)
         _store.save()
-        snapshot = Snapshot(d)
-        self._datastore().set(snapshot=snapshot, ref=doc_ref, transaction=transaction)
+        if self._unloaded_attributes() is not None:
+            changes = self._partial_changes(d, to_self=partial)
+        else:
+            changes = self._dirty_fields(d) if partial else None
+        if changes is None:
+            method_name, snapshot = 'set', Snapshot.view(d)
+        elif changes:
+            method_name, snapshot = 'update', Snapshot.view(changes)
+        else:
+            method_name, snapshot = None, None
+        kwargs = dict(snapshot=snapshot, ref=doc_ref, transaction=transaction)
+        return method_name, kwargs, (d if partial else None)
 
     def delete(self, transaction: 'google.cloud.firestore.Transaction' = _NA) -> None:
         """ Deletes and object from Firestore.
@@ -112,7 +439,24 @@ class FirestoreObjectMixin:
         if transaction is _NA:
             transaction = CTX.transaction_var.get()
 
-        self._datastore().delete(ref=self.doc_ref, transaction=transaction)
+        writer = self._datastore().writer(transaction)
+        writer.delete(ref=self.doc_ref, transaction=transaction)
+        self._discard_snapshots(self.doc_ref, objects=True)
+        # The next save writes the whole document. The record is also
+        #   dropped after the batch commits, in case an earlier save in
+        #   the batch records it then.
+        self._mark_deleted()
+        if isinstance(writer, Batch):
+            writer.after_commit(self._mark_deleted)
+
+    def _mark_deleted(self):
+        self.__dict__.pop('_clean_d', None)
+
+    @staticmethod
+    def _discard_snapshots(ref, objects=False):
+        identity_map = IdentityMap.current()
+        if identity_map is not None:
+            identity_map.discard(ref, objects=objects)
 
 
 def _nest_relationship_import(rr, _store):
@@ -239,17 +583,21 @@ class FirestoreObjectValMixin:
 
     def _export_as_dict(self, transaction=None, _store=_NA, **kwargs):
 
-        d = self.schema_obj.dump(self)
-
-        if _store is _NA:
-            from onto.store import Gallery
+        refresh = _store is _NA
+        if refresh:
             _store = self._store
-            res = self._export_val(d, transaction=transaction, _store=_store,
-                                   **kwargs)
-            _store.refresh(transaction=transaction)
+
+        def export_val(val):
+            return self._export_val(
+                val, transaction=transaction, _store=_store, **kwargs)
+
+        if codec := self.get_codec():
+            res = codec.dump(self, export_val=export_val)
         else:
-            res = self._export_val(d, transaction=transaction, _store=_store,
-                                   **kwargs)
+            res = export_val(self.schema_obj.dump(self))
+
+        if refresh:
+            _store.refresh(transaction=transaction)
 
         return res
 
@@ -305,6 +653,7 @@ class FirestoreObjectValMixin:
             _store=_NA,
             transaction=None,
             partial=False,
+            lazy=False,
             **kwargs):
         """ Deserializes an object from a dictionary.
 
@@ -312,20 +661,86 @@ class FirestoreObjectValMixin:
             by `to_dict` method.
         :param transaction: Firestore transaction for retrieving
             related documents, and for saving this object.
+        :param lazy: If set to True, fields are decoded on first
+            access (see _from_dict_lazy). Documents referenced by a
+            field are retrieved when the field is read.
         :param kwargs: Keyword arguments to be forwarded to new
         """
 
+        if lazy:
+            return cls._from_dict_lazy(
+                d, transaction=transaction, partial=partial,
+                import_kwargs=dict(_store=_store), **kwargs)
+
         obj_cls = resolve_obj_cls(cls=cls, d=d)
 
-        schema_obj = obj_cls.get_schema_obj()
-        d = schema_obj.load(d, partial=partial)
+        if codec := obj_cls.get_codec():
+            done, d = codec.load(d, partial=partial)
+        else:
+            done, d = dict(), obj_cls.get_schema_obj().load(d, partial=partial)
 
         d = cls._import_from_dict(d, _store=_store, partial=partial, transaction=transaction)
+        d.update(done)
 
         instance = obj_cls.new(**d, **kwargs)
         # TODO: fix unexpected arguments
         return instance
 
+    @classmethod
+    def from_dicts(
+            cls,
+            ds,
+            _store=_NA,
+            transaction=None,
+            partial=False,
+            each_kwargs=None,
+            lazy=False,
+            **kwargs):
+        """ Deserializes many objects at once. All objects share one
+                Gallery, so that documents referenced by any of them
+                are retrieved together.
+
+        :param ds: a list of dictionaries generated by `to_dict`
+        :param each_kwargs: a list of keyword arguments for each dict,
+            to be forwarded to new
+        :param lazy: see from_dict
+        :param transaction: Firestore transaction for retrieving
+            related documents, and for saving these objects.
+        :param kwargs: Keyword arguments to be forwarded to new
+        :return: a list of objects in the order of ds
+        """
+        ds = list(ds)
+        if each_kwargs is None:
+            each_kwargs = [dict() for _ in ds]
+
+        if lazy:
+            return [
+                cls.from_dict(d, _store=_store, transaction=transaction,
+                              partial=partial, lazy=True, **obj_kwargs,
+                              **kwargs)
+                for d, obj_kwargs in zip(ds, each_kwargs)
+            ]
+
+        refresh = _store is _NA
+        if refresh:
+            from onto.store import Gallery
+            _store = Gallery()
+
+        loaded = list()
+        for obj_cls, done, d in cls._load_many(ds, partial=partial):
+            d = cls._import_from_dict(
+                d, _store=_store, partial=partial, transaction=transaction)
+            d.update(done)
+            loaded.append((obj_cls, d))
+
+        if refresh:
+            _store.refresh(transaction=transaction)
+
+        return [
+            obj_cls.new(**d, **obj_kwargs, **kwargs)
+            for (obj_cls, d), obj_kwargs in zip(loaded, each_kwargs)
+        ]
+
 
 class FirestoreObject(
     FirestoreObjectValMixin,
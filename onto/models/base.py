@@ -1,9 +1,11 @@
 import functools
+import threading
 
 from .meta import SerializableMeta, AttributedMeta
 from ..registry import ModelRegistry
 from .mixin import Importable, NewMixin, Exportable
 from .utils import _collect_attrs, _schema_cls_from_attributed_class
+from .codec import CompiledCodec
 from onto.mapper.schema import Schema
 
 
@@ -11,7 +13,77 @@ class SimpleStore:
     """
     To store simple business properties
     """
-    pass
+    __slots__ = ('__dict__', '__weakref__')
+
+    @classmethod
+    def slotted(cls, name, attribute_names):
+        """ Returns a store class with a slot for each attribute.
+                Values of other names are kept in __dict__, which is
+                only allocated when such a value is set.
+
+        :param name: name of the model class
+        :param attribute_names: names of the attributes of the model class
+        """
+        return type(f'{name}Store', (cls,), {
+            '__slots__': tuple(attribute_names),
+            '__module__': cls.__module__,
+        })
+
+
+class LazyStoreMixin:
+    """
+    Decodes an attribute when it is first read, and keeps the result.
+        See Importable.from_dict with lazy=True.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        # Only called when name is not set on the store
+        pending = self.__dict__.get('_lazy_pending', None)
+        if pending is None or name not in pending:
+            raise AttributeError(name)
+        value = pending[name]()
+        setattr(self, name, value)
+        pending.pop(name, None)
+        return value
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def of(store_cls):
+        """ Returns a subclass of store_cls with the same layout, so that
+                __class__ of a store instance can be swapped to it.
+        """
+        return type(f'Lazy{store_cls.__name__}', (store_cls, LazyStoreMixin), {
+            '__slots__': (),
+            '__module__': store_cls.__module__,
+        })
+
+
+class PartialStoreMixin:
+    """
+    Raises a clear error when an attribute that was not read is read.
+        See FirestoreObjectMixin._mark_partial.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        # Only called when name is not set on the store
+        if name in self.__dict__.get('_unloaded', ()):
+            raise AttributeError(
+                f'{name} is not loaded; read it with select or fields')
+        raise AttributeError(name)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def of(store_cls):
+        """ Returns a subclass of store_cls with the same layout; see
+                LazyStoreMixin.of
+        """
+        return type(f'Partial{store_cls.__name__}',
+                    (store_cls, PartialStoreMixin), {
+            '__slots__': (),
+            '__module__': store_cls.__module__,
+        })
 
 
 class PonyStore:
@@ -55,18 +127,41 @@ class BaseRegisteredModel(metaclass=ModelRegistry):
                 for c_str in cls._get_children_str(cls.__name__)}
 
     @classmethod
-    def _get_subclasses(cls):
-        res = {cls, }
-        children = cls._get_children()
-        for child in children:
-            res |= child._get_subclasses()
+    def _registry_cached(cls, name, build):
+        """ Returns build(), kept in cls.__dict__[name] until another class
+                is registered.
+
+        :param name: attribute name to store the result under
+        :param build: computes the result from the registry
+        """
+        version = ModelRegistry.get_version()
+        cached = cls.__dict__.get(name, None)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        res = build()
+        setattr(cls, name, (version, res))
         return res
 
+    @classmethod
+    def _get_subclass_closure(cls):
+        def build():
+            res = {cls, }
+            for child in cls._get_children():
+                res |= child._get_subclass_closure()
+            return frozenset(res)
+        return cls._registry_cached('_subclasses_cache', build)
+
+    @classmethod
+    def _get_subclasses(cls):
+        return set(cls._get_subclass_closure())
+
     @classmethod
     def _get_subclasses_str(cls):
-        return list(
-            sorted(_cls.__name__ for _cls in cls._get_subclasses())
-        )
+        return list(cls._registry_cached(
+            '_subclasses_str_cache',
+            lambda: tuple(sorted(
+                _cls.__name__ for _cls in cls._get_subclass_closure()))
+        ))
 
     @classmethod
     def _get_parents(cls):
@@ -92,40 +187,78 @@ class Schemed(SchemedBase):
     """
     A mixin class for object bounded to a schema for serialization
         and deserialization.
-    TODO: maybe add caching
-    Currently schema is reconstructed at every call to
-        refresh value for different contexts.
+
+    The schema class and a schema instance are built once per model
+        class and shared by all callers (including other threads).
+        Both are rebuilt when ModelRegistry changes, since fields may
+        resolve other models by name. Do not mutate the schema
+        returned by get_schema_obj.
     """
 
     _schema_obj = None
     _schema_cls = None
 
+    _schema_lock = threading.RLock()
+
     # def __init__(self, *args, **kwargs):
     #     super().__init__(*args, **kwargs)
     # self._schema_obj = self._schema_cls()
 
     @classmethod
-    @functools.lru_cache(maxsize=None)
+    def _get_schema_cache(cls):
+        """ Returns (schema_cls, schema_obj, codec) compiled for this class.
+
+        Stored in cls.__dict__ to avoid reading the cache of a super class.
+        """
+        version = ModelRegistry.get_version()
+        cached = cls.__dict__.get('_schema_cache', None)
+        if cached is not None and cached[0] == version:
+            return cached[1:]
+        with cls._schema_lock:
+            cached = cls.__dict__.get('_schema_cache', None)
+            if cached is not None and cached[0] == version:
+                return cached[1:]
+            schema_cls = _schema_cls_from_attributed_class(cls=cls)
+            schema_obj = schema_cls() if schema_cls is not None else None
+            codec = None
+            if getattr(cls.Meta, 'compiled_codec', False):
+                codec = CompiledCodec.compile(schema_obj, model_cls=cls)
+            # Assigned as one tuple so that readers never see a
+            #   half-updated cache
+            cls._schema_cache = (version, schema_cls, schema_obj, codec)
+            return schema_cls, schema_obj, codec
+
+    @classmethod
+    def invalidate_schema_cache(cls):
+        """ Drops the compiled schema of this class (not of subclasses).
+        """
+        with cls._schema_lock:
+            if '_schema_cache' in cls.__dict__:
+                del cls._schema_cache
+
+    @classmethod
     def get_schema_cls(cls):
         """ Returns the Schema class associated with the model class.
         """
-        return _schema_cls_from_attributed_class(cls=cls)
+        schema_cls, _, _ = cls._get_schema_cache()
+        return schema_cls
 
     @classmethod
     def get_schema_obj(cls):
-        """ Returns an instantiated object for Schema associated
-                with the model class
+        """ Returns the shared schema instance associated with
+                the model class
         """
-        # Use __dict__ to avoid reading from super class
-        # if "_schema_obj" not in cls.__dict__:
-        #     schema_cls = cls.get_schema_cls()
-        #     if schema_cls is None:
-        #         return None
-        #     cls._schema_obj = schema_cls()
-        # return cls._schema_obj
-        if _schema_cls := cls.get_schema_cls():
-            _schema_obj = _schema_cls()
-            return _schema_obj
+        _, schema_obj, _ = cls._get_schema_cache()
+        return schema_obj
+
+    @classmethod
+    def get_codec(cls):
+        """ Returns the CompiledCodec of the model class, or None when
+                Meta.compiled_codec is not set or the schema is not
+                supported by the codec.
+        """
+        _, _, codec = cls._get_schema_cache()
+        return codec
 
     @property
     def schema_cls(self):
@@ -290,15 +423,14 @@ class Serializable(Mutable, GraphqlMixin, metaclass=SerializableMeta):
 
     _schema_base = Schema
 
+    _store_cls = SimpleStore
+
     def _init__attrs(self):
         if not getattr(self, '_attrs', None):
-            self._attrs = SimpleStore()
-        from onto.attrs.unit import MonadContext
-        with MonadContext.context().init_options(initialize=False, initializer=None):
-            for key, attr in _collect_attrs(cls=self.__class__):
-                if attr.properties.initialize:
-                    initializer = attr.properties.make_init(name=key)
-                    initializer(self)
+            self._attrs = self._store_cls()
+        # Resolved from attributes by SerializableMeta
+        for initializer in self._initializers:
+            initializer(self)
 
     def __init__(self, *args, **kwargs):
         self._init__attrs()
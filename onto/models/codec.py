@@ -0,0 +1,268 @@
+"""
+Compiled codec: specialized dump/load functions generated per model class.
+
+A model opts in with:
+
+    class Meta:
+        compiled_codec = True
+
+The codec is compiled from the fields of the model's compiled schema,
+    which already carry everything resolved from the attrs decorator
+    chain (data_key from DataKey, field class from OfType, load default
+    from DefaultValue, required from Required, ...). For String, Integer,
+    Float and Boolean fields, and lists of them, the generated code
+    copies a value whose type matches exactly without calling into
+    marshmallow and without walking it again with _export_val or
+    _import_val. Any other value or field (Relationship, StructuralRef,
+    Embedded, ...) goes through the marshmallow field and the existing
+    export/import walk, so results are the same as Schema.dump/load.
+
+"""
+from collections.abc import Mapping
+
+import marshmallow
+from marshmallow import EXCLUDE, ValidationError, fields as mfields
+from marshmallow.error_store import ErrorStore
+from marshmallow.utils import is_collection, missing
+
+# Values of these types are never transformed by _export_val/_import_val
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+_SCALAR_FIELD_TYPES = {
+    mfields.String: str,
+    mfields.Integer: int,
+    mfields.Float: float,
+    mfields.Boolean: bool,
+}
+
+
+def _is_unmodified(field_cls, base, names):
+    return all(getattr(field_cls, name, None) is getattr(base, name, None)
+               for name in names)
+
+
+def _scalar_type(field):
+    """ Returns the python type that the field passes through unchanged,
+            or None if values of the field need marshmallow.
+    """
+    if field.validators:
+        return None
+    field_cls = field.__class__
+    for base, py_type in _SCALAR_FIELD_TYPES.items():
+        if not isinstance(field, base):
+            continue
+        if not _is_unmodified(
+                field_cls, base,
+                ('serialize', 'deserialize', '_serialize', '_deserialize',
+                 '_validated', '_format_num', 'num_type')):
+            return None
+        if getattr(field, 'as_string', False):
+            return None
+        if getattr(field, 'allow_nan', None) is False:
+            return None
+        if base is mfields.Boolean and field.truthy and (
+                True not in field.truthy or False not in field.falsy):
+            return None
+        return py_type
+    return None
+
+
+def _list_element_type(field):
+    """ Returns the element type for a list of scalars, or None.
+    """
+    if field.validators or not isinstance(field, mfields.List):
+        return None
+    if not _is_unmodified(
+            field.__class__, mfields.List,
+            ('serialize', 'deserialize', '_serialize', '_deserialize')):
+        return None
+    return _scalar_type(field.inner)
+
+
+def _is_simple_key(key):
+    return isinstance(key, str) and '.' not in key
+
+
+class CompiledCodec:
+    """
+    Generated dump and load functions for one model class.
+    Use CompiledCodec.compile to build; it returns None when the schema
+        uses features that the codec does not reproduce (hooks,
+        unknown != EXCLUDE, custom accessors, ...).
+    """
+
+    def __init__(self, schema_obj, dump_f, load_f):
+        self.schema_obj = schema_obj
+        self._dump_f = dump_f
+        self._load_f = load_f
+
+    @staticmethod
+    def _is_eligible(schema_obj, model_cls):
+        schema_cls = schema_obj.__class__
+        if schema_obj.many or any(schema_obj._hooks.values()):
+            return False
+        if schema_obj.unknown != EXCLUDE:
+            return False
+        if not _is_unmodified(
+                schema_cls, marshmallow.Schema,
+                ('get_attribute', 'handle_error')):
+            return False
+        if hasattr(model_cls, '__getitem__'):
+            """ marshmallow reads attributes with obj[key] first when
+                the object supports __getitem__
+            """
+            return False
+        return True
+
+    @classmethod
+    def compile(cls, schema_obj, model_cls):
+        if schema_obj is None or not cls._is_eligible(schema_obj, model_cls):
+            return None
+        dump_f = cls._compile_dump(schema_obj)
+        load_f = cls._compile_load(schema_obj)
+        return cls(schema_obj=schema_obj, dump_f=dump_f, load_f=load_f)
+
+    @staticmethod
+    def _exec(name, lines, namespace):
+        source = '\n'.join(lines) + '\n'
+        code = compile(source, f'<onto codec {name}>', 'exec')
+        exec(code, namespace)
+        return namespace[name]
+
+    @classmethod
+    def _compile_dump(cls, schema_obj):
+        namespace = {
+            '_missing': missing,
+            '_plain': _PLAIN_TYPES,
+            '_accessor': schema_obj.get_attribute,
+        }
+        lines = ['def dump(obj, export_val):', '    out = {}']
+        for idx, (attr_name, field) in enumerate(schema_obj.dump_fields.items()):
+            data_key = field.data_key if field.data_key is not None else attr_name
+            check_key = field.attribute or attr_name
+            namespace[f'_f{idx}'] = field
+            generic = [
+                f'v = _f{idx}.serialize({attr_name!r}, obj, accessor=_accessor)',
+                'if v is not _missing:',
+                f'    out[{data_key!r}] = v if v.__class__ in _plain else export_val(v)',
+            ]
+            scalar_type = _scalar_type(field)
+            element_type = _list_element_type(field)
+            if _is_simple_key(check_key) and scalar_type is not None:
+                namespace[f'_t{idx}'] = scalar_type
+                lines += [
+                    f'    v = getattr(obj, {check_key!r}, _missing)',
+                    f'    if v.__class__ is _t{idx} or v is None:',
+                    f'        out[{data_key!r}] = v',
+                    '    else:',
+                ] + ['        ' + line for line in generic]
+            elif _is_simple_key(check_key) and element_type is not None:
+                namespace[f'_t{idx}'] = element_type
+                lines += [
+                    f'    v = getattr(obj, {check_key!r}, _missing)',
+                    f'    if v.__class__ is list and all(e.__class__ is _t{idx} for e in v):',
+                    f'        out[{data_key!r}] = list(v)',
+                    '    else:',
+                ] + ['        ' + line for line in generic]
+            else:
+                lines += ['    ' + line for line in generic]
+        lines.append('    return out')
+        return cls._exec('dump', lines, namespace)
+
+    @staticmethod
+    def _load_generic(field, attr_name, data_key, key, raw, d, partial,
+                      partial_is_collection, done, pending, error_store):
+        """ Loads one value the way marshmallow.Schema._deserialize does
+        """
+        if raw is missing:
+            if partial is True or (
+                    partial_is_collection and attr_name in partial):
+                return
+        d_kwargs = dict()
+        if partial_is_collection:
+            prefix = data_key + "."
+            d_kwargs['partial'] = [
+                f[len(prefix):] for f in partial if f.startswith(prefix)]
+        elif partial is not None:
+            d_kwargs['partial'] = partial
+        try:
+            value = field.deserialize(raw, data_key, d, **d_kwargs)
+        except ValidationError as error:
+            error_store.store_error(error.messages, data_key)
+            value = error.valid_data or missing
+        if value is not missing:
+            if value.__class__ in _PLAIN_TYPES:
+                done[key] = value
+            else:
+                pending[key] = value
+
+    @classmethod
+    def _compile_load(cls, schema_obj):
+        namespace = {
+            '_missing': missing,
+            '_generic': cls._load_generic,
+        }
+        lines = [
+            'def load(d, partial, partial_is_collection, error_store):',
+            '    done = {}',
+            '    pending = {}',
+        ]
+        for idx, (attr_name, field) in enumerate(schema_obj.load_fields.items()):
+            data_key = field.data_key if field.data_key is not None else attr_name
+            key = field.attribute or attr_name
+            namespace[f'_f{idx}'] = field
+            generic = (
+                f'_generic(_f{idx}, {attr_name!r}, {data_key!r}, {key!r}, v, d, '
+                f'partial, partial_is_collection, done, pending, error_store)'
+            )
+            scalar_type = _scalar_type(field)
+            element_type = _list_element_type(field)
+            lines.append(f'    v = d.get({data_key!r}, _missing)')
+            if _is_simple_key(key) and scalar_type is not None:
+                namespace[f'_t{idx}'] = scalar_type
+                lines += [
+                    f'    if v.__class__ is _t{idx}:',
+                    f'        done[{key!r}] = v',
+                    '    else:',
+                    f'        {generic}',
+                ]
+            elif _is_simple_key(key) and element_type is not None:
+                namespace[f'_t{idx}'] = element_type
+                lines += [
+                    f'    if v.__class__ is list and all(e.__class__ is _t{idx} for e in v):',
+                    f'        done[{key!r}] = list(v)',
+                    '    else:',
+                    f'        {generic}',
+                ]
+            else:
+                lines.append(f'    {generic}')
+        lines.append('    return done, pending')
+        return cls._exec('load', lines, namespace)
+
+    def dump(self, obj, export_val):
+        """ Returns the same dict as export_val(schema_obj.dump(obj))
+
+        :param obj: instance of the model class
+        :param export_val: called on values that may need exporting
+        """
+        return self._dump_f(obj, export_val)
+
+    def load(self, d, partial=None):
+        """ Loads d as schema_obj.load(d, partial=partial) does, but splits
+                the result into two dicts.
+
+        :return: (done, pending) where values in done are final, and
+            values in pending still need _import_from_dict
+        """
+        if not isinstance(d, Mapping):
+            # Raises the same error as marshmallow
+            return dict(), self.schema_obj.load(d, partial=partial)
+        if partial is None:
+            partial = self.schema_obj.partial
+        error_store = ErrorStore()
+        done, pending = self._load_f(
+            d, partial, is_collection(partial), error_store)
+        if error_store.errors:
+            raise ValidationError(
+                error_store.errors, data=d, valid_data={**done, **pending})
+        return done, pending
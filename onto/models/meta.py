@@ -61,6 +61,7 @@ class SerializableMeta(AttributedMeta, ModelRegistry):
 
         for attr_name, attr in __attributes.items():
             __attributes[attr_name] = attr.attribute_name(attr_name).parent_klass(parent=klass)
+            __attributes[attr_name].properties.freeze()
 
         for attr_name, attr in __attributes.items():
             from onto.attrs.unit import MonadContext
@@ -74,6 +75,18 @@ class SerializableMeta(AttributedMeta, ModelRegistry):
                 )
                 setattr(klass, attr_name, p)
 
+        from onto.attrs.unit import MonadContext
+        with MonadContext.context().init_options(initialize=False, initializer=None):
+            klass._initializers = tuple(
+                attr.properties.make_init(name=attr_name)
+                for attr_name, attr in __attributes.items()
+                if attr.properties.initialize
+            )
+
+        if getattr(getattr(klass, 'Meta', None), 'slotted_store', False):
+            from onto.models.base import SimpleStore
+            klass._store_cls = SimpleStore.slotted(
+                name=name, attribute_names=__attributes.keys())
 
         # if hasattr(klass, "Meta"):
         #     Moves Model.Meta.schema_cls to Model._schema_cls
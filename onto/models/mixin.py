@@ -115,18 +115,165 @@ class Importable:
         return cls._import_val(d, **kwargs)
 
     @classmethod
-    def from_dict(cls, d, transaction=_NA, partial=False, **kwargs):
+    def from_dict(cls, d, transaction=_NA, partial=False, lazy=False, **kwargs):
+
+        if lazy:
+            return cls._from_dict_lazy(
+                d, transaction=transaction, partial=partial, **kwargs)
 
         obj_cls = resolve_obj_cls(cls=cls, d=d)
 
-        schema_obj = obj_cls.get_schema_obj()
-        d = schema_obj.load(d, partial=partial)
+        if codec := obj_cls.get_codec():
+            done, d = codec.load(d, partial=partial)
+        else:
+            done, d = dict(), obj_cls.get_schema_obj().load(d, partial=partial)
 
         d = cls._import_from_dict(d, partial=partial, transaction=transaction)
+        d.update(done)
 
         instance = obj_cls.new(**d, **kwargs)  # TODO: fix unexpected arguments
         return instance
 
+    @classmethod
+    def _from_dict_lazy(cls, d, transaction=_NA, partial=False,
+                        import_kwargs=None, **kwargs):
+        """ Same as from_dict, but a field present in d is only decoded
+                (loaded and imported) when the attribute is first read.
+                to_dict reads every attribute, so it returns the same
+                result as with an eagerly decoded object. Note that
+                validation errors of such field are raised on read.
+
+        :param import_kwargs: keyword arguments for importing fields that
+            are decoded right away (not for deferred fields)
+        :param kwargs: Keyword arguments to be forwarded to new
+        """
+        if import_kwargs is None:
+            import_kwargs = dict()
+
+        obj_cls = resolve_obj_cls(cls=cls, d=d)
+        schema_obj = obj_cls.get_schema_obj()
+        if any(schema_obj._hooks.values()) or is_pony(klass=obj_cls):
+            # Hooks such as Meta.unwrap work on the whole dict
+            return cls.from_dict(d, transaction=transaction, partial=partial,
+                                 **import_kwargs, **kwargs)
+
+        deferred = dict()  # attribute name -> (field name, data key, field)
+        for field_name, field in schema_obj.load_fields.items():
+            data_key = field.data_key if field.data_key is not None else field_name
+            if data_key in d:
+                deferred[field.attribute or field_name] = (field_name, data_key, field)
+        deferred_data_keys = {data_key for _, data_key, _ in deferred.values()}
+
+        rest_partial = partial if partial is True else \
+            [*(partial or ()), *(field_name for field_name, _, _ in deferred.values())]
+        loaded = schema_obj.load(
+            {k: v for k, v in d.items() if k not in deferred_data_keys},
+            partial=rest_partial
+        )
+        loaded = cls._import_from_dict(
+            loaded, partial=partial, transaction=transaction, **import_kwargs)
+
+        from onto.models.codec import CompiledCodec
+        from marshmallow import ValidationError
+        from marshmallow.error_store import ErrorStore
+        from marshmallow.utils import is_collection
+
+        def decoder(key, field_name, data_key, field):
+            def decode():
+                done, pending, error_store = dict(), dict(), ErrorStore()
+                CompiledCodec._load_generic(
+                    field, field_name, data_key, key, d[data_key], d,
+                    partial, is_collection(partial), done, pending,
+                    error_store)
+                if error_store.errors:
+                    raise ValidationError(error_store.errors, data=d)
+                res = cls._import_from_dict(
+                    pending, partial=partial, transaction=transaction)
+                res.update(done)
+                return res[key]
+            return decode
+
+        # Placeholders for required fields; removed from the store below
+        placeholders = {key: None for key in deferred if key not in loaded}
+        instance = obj_cls.new(**loaded, **placeholders, **kwargs)
+
+        from onto.models.base import LazyStoreMixin
+        store = instance._attrs
+        for key in deferred:
+            try:
+                delattr(store, key)
+            except AttributeError:
+                pass
+        store.__dict__['_lazy_pending'] = {
+            key: decoder(key, *args) for key, args in deferred.items()}
+        store.__class__ = LazyStoreMixin.of(store.__class__)
+        return instance
+
+    @classmethod
+    def _load_many(cls, ds, partial=False):
+        """ Loads dicts with one schema call for each resolved class.
+
+        :return: a list of (obj_cls, done, pending) in the order of ds,
+            where pending still needs _import_from_dict (see
+            CompiledCodec.load)
+        """
+        groups = dict()
+        for idx, d in enumerate(ds):
+            obj_cls = resolve_obj_cls(cls=cls, d=d)
+            groups.setdefault(obj_cls, list()).append(idx)
+
+        res = [None] * len(ds)
+        for obj_cls, idxs in groups.items():
+            schema_obj = obj_cls.get_schema_obj()
+            if codec := obj_cls.get_codec():
+                for idx in idxs:
+                    done, pending = codec.load(ds[idx], partial=partial)
+                    res[idx] = (obj_cls, done, pending)
+            elif any(schema_obj._hooks.values()):
+                # Hooks such as Meta.unwrap do not support many=True
+                for idx in idxs:
+                    pending = schema_obj.load(ds[idx], partial=partial)
+                    res[idx] = (obj_cls, dict(), pending)
+            else:
+                loaded = schema_obj.load(
+                    [ds[idx] for idx in idxs], many=True, partial=partial)
+                for idx, pending in zip(idxs, loaded):
+                    res[idx] = (obj_cls, dict(), pending)
+        return res
+
+    @classmethod
+    def from_dicts(cls, ds, transaction=_NA, partial=False,
+                   each_kwargs=None, lazy=False, **kwargs):
+        """ Deserializes many dicts at once. Same as calling from_dict
+                on each, but dicts of the same class are loaded together.
+
+        :param ds: a list of dictionaries generated by `to_dict`
+        :param each_kwargs: a list of keyword arguments for each dict,
+            to be forwarded to new
+        :param lazy: see _from_dict_lazy
+        :param kwargs: Keyword arguments to be forwarded to new
+        :return: a list of instances in the order of ds
+        """
+        ds = list(ds)
+        if each_kwargs is None:
+            each_kwargs = [dict() for _ in ds]
+
+        if lazy:
+            return [
+                cls.from_dict(d, transaction=transaction, partial=partial,
+                              lazy=True, **obj_kwargs, **kwargs)
+                for d, obj_kwargs in zip(ds, each_kwargs)
+            ]
+
+        instances = list()
+        for (obj_cls, done, d), obj_kwargs in zip(
+                cls._load_many(ds, partial=partial), each_kwargs):
+            d = cls._import_from_dict(
+                d, partial=partial, transaction=transaction)
+            d.update(done)
+            instances.append(obj_cls.new(**d, **obj_kwargs, **kwargs))
+        return instances
+
     @classmethod
     def from_dict_special(cls, d, **kwargs):
         from onto.models.utils import _collect_attrs
@@ -198,6 +345,9 @@ class Exportable:
         """ Map/dict is only supported at root level for now
 
         """
+        if codec := self.get_codec():
+            return codec.dump(
+                self, export_val=lambda val: self._export_val(val, **kwargs))
         d = self.schema_obj.dump(self)
         return self._export_val(val=d, **kwargs)
 
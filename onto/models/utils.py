@@ -176,6 +176,48 @@ def _get_graphql_ots():
     return ots
 
 
+def compile_graphql_types(classes=None):
+    """ Builds the GraphQL object and input types of classes, including
+            their fields, so that the cost is paid at startup rather than
+            on the first request. Types are cached by
+            get_graphql_object_type. GraphQLSink.start compiles the view
+            model of the sink; to compile every registered class, call
+            compile_graphql_types() at startup before serving.
+
+    :param classes: model classes; all registered GraphqlMixin classes
+        when not specified
+    :return: dict of class name -> seconds spent. Classes that fail to
+        build are logged and left out.
+    """
+    import logging
+    import time
+    import graphql
+    from onto.models.base import GraphqlMixin
+    from onto.registry import ModelRegistry
+
+    if classes is None:
+        classes = [
+            klass for klass in ModelRegistry.get_registry().values()
+            if issubclass(klass, GraphqlMixin)
+        ]
+
+    timings = dict()
+    for klass in classes:
+        start = time.perf_counter()
+        try:
+            for is_input in (False, True):
+                ot = klass.get_graphql_object_type(is_input=is_input)
+                if isinstance(ot, graphql.GraphQLNamedType) \
+                        and hasattr(ot, 'fields'):
+                    _ = ot.fields  # Resolves the thunk
+        except Exception as e:
+            logging.getLogger(__name__).warning(
+                f'Failed building GraphQL types for {klass.__name__}: {e!r}')
+            continue
+        timings[klass.__name__] = time.perf_counter() - start
+    return timings
+
+
 @lru_cache(maxsize=None)
 def _graphql_object_type_from_attributed_class(cls, input=False, **kwargs):
     """ Make GraphQL schema from a class containing AttributeBase+ objects
@@ -60,7 +60,11 @@ class PrimaryObject(FirestoreObject, QueryMixin, CollectionMixin,
 
     @classmethod
     def _query_schema(cls):
-        return _collect_query_schema(cls)()
+        """ Returns a schema instance with fields of this class and its
+                children. Cached until another class is registered.
+        """
+        return cls._registry_cached(
+            '_query_schema_cache', lambda: _collect_query_schema(cls)())
 
     # @classmethod
     # def get_schema_cls(cls):
@@ -128,13 +132,31 @@ class PrimaryObject(FirestoreObject, QueryMixin, CollectionMixin,
 
     @classmethod
     def get(cls, *, doc_ref_str=None, doc_ref=None, doc_id=None,
-            transaction: 'google.cloud.firestore_v1.Transaction'=None):
+            transaction: 'google.cloud.firestore_v1.Transaction'=None,
+            fields=None):
         """ Returns the instance from doc_id.
 
         :param doc_ref_str: DocumentReference path string
         :param doc_ref: DocumentReference
         :param doc_id: gets the instance from self.collection.document(doc_id)
         :param transaction: firestore transaction
+        :param fields: names of attributes to read; see
+            FirestoreObjectMixin.get
+        """
+
+        if doc_ref_str is not None:
+            doc_ref = doc_ref_from_str(doc_ref_str)
+
+        if doc_ref is None:
+            doc_ref = cls.ref_from_id(doc_id=doc_id)
+
+        return super().get(
+            doc_ref=doc_ref, transaction=transaction, fields=fields)
+
+    @classmethod
+    async def aget(cls, *, doc_ref_str=None, doc_ref=None, doc_id=None,
+                   transaction=None):
+        """ Returns the instance from doc_id with Database.aget; see get.
         """
 
         if doc_ref_str is not None:
@@ -143,4 +165,4 @@ class PrimaryObject(FirestoreObject, QueryMixin, CollectionMixin,
         if doc_ref is None:
             doc_ref = cls.ref_from_id(doc_id=doc_id)
 
-        return super().get(doc_ref=doc_ref, transaction=transaction)
+        return await super().aget(doc_ref=doc_ref, transaction=transaction)
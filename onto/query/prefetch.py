@@ -0,0 +1,105 @@
+import collections
+import contextvars
+import threading
+
+
+class PrefetchIterator:
+    """
+    Iterates the items of pages that a background thread reads and
+        converts ahead of the consumer, so that reading the next page
+        overlaps with the work on the current one. Use with:
+
+        for obj in PrefetchIterator(
+                db.query_pages(q, page_size=100),
+                convert=cls.from_snapshots, max_buffered=1000):
+            ...
+
+    The thread runs in a copy of the context of the constructor, so that
+        context variables like CTX.transaction_var are kept. An error of
+        the thread is raised by the iterator. Call close to stop the
+        thread before the pages are exhausted.
+
+    :param pages: an iterable of lists
+    :param convert: a function of a page to a list of items; defaults
+        to the page itself
+    :param max_buffered: the thread waits while this many items are read
+        and not yet consumed, counting the page that the consumer
+        iterates and the page that the thread has converted and waits
+        to buffer; it holds at least one page, so that at most
+        max(max_buffered, the largest page) items are held
+    """
+
+    def __init__(self, pages, convert=None, max_buffered=1000):
+        self.max_buffered = max_buffered
+        self._pages = pages
+        self._convert = convert if convert is not None else list
+        self._buffer = collections.deque()
+        # Items of the pages in _buffer and of the page that the consumer
+        #   iterates, which holds _current_size of them
+        self._size = 0
+        self._current_size = 0
+        self._done = False
+        self._error = None
+        self._closed = False
+        self._current = iter(())
+        self._cond = threading.Condition()
+        ctx = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=ctx.run, args=(self._run,), daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for page in self._pages:
+                items = self._convert(page)
+                with self._cond:
+                    while not self._closed and self._size > 0 and \
+                            self._size + len(items) > self.max_buffered:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    self._buffer.append(items)
+                    self._size += len(items)
+                    self._cond.notify_all()
+        except BaseException as e:
+            with self._cond:
+                self._error = e
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def _next_page(self):
+        with self._cond:
+            # The page that the consumer iterated is released
+            self._size -= self._current_size
+            self._current_size = 0
+            self._cond.notify_all()
+            while not self._buffer and not self._done:
+                self._cond.wait()
+            if self._buffer:
+                items = self._buffer.popleft()
+                self._current_size = len(items)
+                return items
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            for item in self._current:
+                return item
+            items = self._next_page()
+            if items is None:
+                raise StopIteration
+            self._current = iter(items)
+
+    def close(self):
+        """ Stops the thread after the page that it is reading """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
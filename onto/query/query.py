@@ -1,4 +1,8 @@
 import abc
+import base64
+import datetime
+import json
+import math
 
 from onto.context import Context as CTX
 from collections import namedtuple
@@ -10,6 +14,75 @@ from . import cmp
 import weakref
 
 
+def _encode_value(value):
+    """ Returns value as JSON, with the types that JSON does not have
+            tagged; see _decode_value
+    """
+    from onto.database import Reference
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return ['datetime', value.isoformat()]
+    if isinstance(value, bytes):
+        return ['bytes', base64.b64encode(value).decode()]
+    if isinstance(value, Reference):
+        return ['reference', str(value)]
+    if isinstance(value, (list, tuple)):
+        return ['array', [_encode_value(v) for v in value]]
+    if isinstance(value, dict):
+        return ['map', {k: _encode_value(v) for k, v in value.items()}]
+    raise TypeError(f'{value!r} can not be a value of a page token')
+
+
+def _decode_value(value):
+    if not isinstance(value, list):
+        return value
+    tag, value = value
+    if tag == 'datetime':
+        return datetime.datetime.fromisoformat(value)
+    if tag == 'bytes':
+        return base64.b64decode(value)
+    if tag == 'reference':
+        from onto.database import Reference
+        return Reference.from_str(value)
+    if tag == 'array':
+        return [_decode_value(v) for v in value]
+    return {k: _decode_value(v) for k, v in value.items()}
+
+
+def _order_key(value):
+    """ Returns a sort key of value that orders values of different types
+            as Firestore does: null, booleans, numbers, timestamps,
+            strings, bytes, references, arrays, then maps
+    """
+    from onto.database import Reference
+    if value is None:
+        return 0,
+    if isinstance(value, bool):
+        return 1, value
+    if isinstance(value, (int, float)):
+        # NaN comes before other numbers
+        if math.isnan(value):
+            return 2, False, 0
+        return 2, True, value
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return 3, value
+    if isinstance(value, str):
+        return 4, value
+    if isinstance(value, bytes):
+        return 5, value
+    if isinstance(value, Reference):
+        return 6, str(value).split('/')
+    if isinstance(value, (list, tuple)):
+        return 8, [_order_key(v) for v in value]
+    if isinstance(value, dict):
+        return 9, [(k, _order_key(value[k])) for k in sorted(value)]
+    # Other values, such as geo points, by their representation
+    return 7, repr(value)
+
+
 class QueryBase:
     """
     Query depends on Database
@@ -20,6 +93,16 @@ class QueryBase:
     must override
     """
 
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    # Attributes of the order, cursors and page of a query, kept by
+    #   where, order_by, limit, offset, start_after and end_before
+    _paging_attrs = ('_orders', '_limit', '_offset',
+                     '_start_after', '_end_before')
+    # Attributes that copies of a query keep, with the keys of select
+    _copied_attrs = (*_paging_attrs, '_select')
+
     def __init__(self, ref=None, path=None, arguments=None):
         if path is not None:
             from onto.database import Reference
@@ -28,6 +111,17 @@ class QueryBase:
         if arguments is None:
             arguments = list()
         self.arguments = arguments
+        # (key, direction) to sort results by, in order
+        self._orders = list()
+        self._limit = None
+        self._offset = None
+        # Values of the order keys, and optionally the path of the
+        #   document last, that results start after or end before
+        self._start_after = None
+        self._end_before = None
+        # Keys of the attributes that results are read with, or None
+        #   for whole documents
+        self._select = None
 
     @staticmethod
     def _append_original(*args, cur_arguments=None):
@@ -83,6 +177,54 @@ class QueryBase:
     def make_copy(self, arguments):
         return self.__class__(ref=self.ref, arguments=arguments)
 
+    def _key(self):
+        """ Returns a hashable key of the documents that the query reads,
+                or None when an argument is not hashable.
+        """
+        key = (
+            self.__class__,
+            str(self.ref),
+            getattr(self, 'parent', None),
+            tuple(
+                (key, comparator,
+                 tuple(val) if isinstance(val, list) else val)
+                for key, comparator, val in self.arguments
+            ),
+            tuple(self._orders),
+            self._limit,
+            self._offset,
+            self._start_after,
+            self._end_before,
+            self._select,
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _data_arguments(self):
+        """ Returns (data_key, comparator, val, field) of each argument
+                to filter documents with, where field is the field of
+                data_key if known, or else None.
+        """
+        return [(key, comparator, val, None)
+                for key, comparator, val in self.arguments]
+
+    def _data_key(self, key):
+        """ Returns the key in documents of attribute key """
+        return key
+
+    def _replace(self, **kwargs):
+        """ Returns a copy of the query with arguments and the
+                attributes in _copied_attrs replaced by kwargs
+        """
+        q = self.make_copy(
+            arguments=kwargs.pop('arguments', self.arguments))
+        for name in self._copied_attrs:
+            setattr(q, name, kwargs.get(name, getattr(self, name)))
+        return q
+
     def where(self, *args, **kwargs):
         cmp_args = [arg for arg in args if isinstance(arg, cmp.Condition)]
         remaining_args = [arg for arg in args
@@ -92,7 +234,140 @@ class QueryBase:
             *cmp_args, cur_arguments=arguments)
         arguments = self._append_original(
             *remaining_args, cur_arguments=arguments)
-        return self.make_copy(arguments=arguments)
+        return self._replace(arguments=arguments)
+
+    def order_by(self, key, direction=ASCENDING):
+        """ Returns a copy of the query that also sorts results by key.
+                Documents that do not have key are left out.
+
+        :param direction: QueryBase.ASCENDING or QueryBase.DESCENDING
+        """
+        if direction not in (self.ASCENDING, self.DESCENDING):
+            raise ValueError(direction)
+        return self._replace(_orders=[*self._orders, (key, direction)])
+
+    def limit(self, count):
+        """ Returns a copy of the query that yields at most count results
+        """
+        return self._replace(_limit=count)
+
+    def offset(self, count):
+        """ Returns a copy of the query that skips the first count results
+        """
+        return self._replace(_offset=count)
+
+    def select(self, *keys):
+        """ Returns a copy of the query whose results only have the
+                fields of keys, so that other fields are not read or
+                decoded. Objects of the results are partial; see
+                FirestoreObjectMixin.from_snapshots.
+        """
+        return self._replace(_select=tuple(keys))
+
+    def _projection(self):
+        """ Returns the data keys that results are read with, or None to
+                read whole documents
+        """
+        if self._select is None:
+            return None
+        return [self._data_key(key) for key in self._select]
+
+    def _project(self, d):
+        """ Returns the fields of d in the projection of the query, for
+                databases that read whole documents
+        """
+        projection = self._projection()
+        if projection is None:
+            return d
+        return {key: d[key] for key in projection if key in d}
+
+    def _cursor(self, values):
+        if len(values) not in (len(self._orders), len(self._orders) + 1):
+            raise ValueError(
+                'A cursor has a value for each key of order_by, and '
+                'optionally the path of a document last')
+        return tuple(values)
+
+    def start_after(self, *values):
+        """ Returns a copy of the query whose results come after values
+                in the order of order_by. The path of a document may
+                follow the values to order documents with equal values.
+        """
+        return self._replace(_start_after=self._cursor(values))
+
+    def end_before(self, *values):
+        """ Returns a copy of the query whose results come before values
+                in the order of order_by; see start_after.
+        """
+        return self._replace(_end_before=self._cursor(values))
+
+    def page_token(self, ref, snapshot) -> str:
+        """ Returns an opaque token for the page of results after the
+                result (ref, snapshot); see start_after_token.
+        """
+        values = [_encode_value(snapshot[self._data_key(key)])
+                  for key, _ in self._orders]
+        data = json.dumps([*values, str(ref)]).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def start_after_token(self, token: str):
+        """ Returns a copy of the query whose results start after the
+                result that token was made of with page_token
+        """
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return self.start_after(
+            *(_decode_value(value) for value in values[:-1]), values[-1])
+
+    def _is_paged(self):
+        return bool(self._orders) or any(
+            getattr(self, name) is not None
+            for name in self._paging_attrs if name != '_orders')
+
+    def _paginate(self, items):
+        """ Applies order_by, cursors, offset and limit to items, a list
+                of (path, d) in the order of the database, for databases
+                that filter in Python. Documents with equal values of the
+                order keys are ordered by path when a cursor has a path.
+        """
+        if not self._is_paged():
+            return items
+        orders = [(self._data_key(key), direction == self.DESCENDING)
+                  for key, direction in self._orders]
+        items = [(path, d) for path, d in items
+                 if all(key in d for key, _ in orders)]
+        with_path = any(
+            cursor is not None and len(cursor) > len(orders)
+            for cursor in (self._start_after, self._end_before))
+        if with_path:
+            last_descending = orders[-1][1] if orders else False
+            orders = [*orders, (None, last_descending)]
+
+        def values_of(item):
+            path, d = item
+            return [_order_key(path if key is None else d[key])
+                    for key, _ in orders]
+
+        # Stable sorts from the last key to the first
+        for i in reversed(range(len(orders))):
+            items.sort(key=lambda item: values_of(item)[i],
+                       reverse=orders[i][1])
+
+        def compare(values, cursor):
+            cursor = [_order_key(c) for c in cursor]
+            for value, c, (_, descending) in zip(values, cursor, orders):
+                if value != c:
+                    return 1 if (value > c) != descending else -1
+            return 0
+
+        if self._start_after is not None:
+            items = [item for item in items
+                     if compare(values_of(item), self._start_after) > 0]
+        if self._end_before is not None:
+            items = [item for item in items
+                     if compare(values_of(item), self._end_before) < 0]
+        start = self._offset or 0
+        end = start + self._limit if self._limit is not None else None
+        return items[start:end]
 
 
 class Query(QueryBase):
@@ -115,19 +390,23 @@ class ViewModelQuery(QueryBase):
         self.parent = parent
         super().__init__(**kwargs)
 
-    def _to_firestore_query(self):
+    def _to_firestore_query(self, client=None):
         """ Returns a query with parent=cls._get_collection(), and
                 limits to obj_type of subclass of cls.
+
+        :param client: firestore client to query with; defaults to
+            CTX.db.firestore_client
         """
         from onto.database.firestore import FirestoreDatabase
 
         db: FirestoreDatabase = CTX.db
+        if client is None:
+            client = db.firestore_client
         if self.ref.first == '**':
-            cur_where = db.firestore_client.collection_group(self.ref.last)
+            cur_where = client.collection_group(self.ref.last)
         else:
-            q = db._doc_ref_from_ref(self.ref)
-            from google.cloud import firestore
-            cur_where = firestore.Query(parent=q)
+            q = db._doc_ref_from_ref(self.ref, client=client)
+            cur_where = q._query()
         if len(self.arguments) != 0:
             raise ValueError
         return cur_where
@@ -160,15 +439,62 @@ class DomainModelQuery(QueryBase):
         return self.__class__(
             ref=self.ref, parent=self.parent, arguments=arguments)
 
+    def _qualifier_arguments(self):
+        """ Returns the arguments of the query, with the obj_type
+                condition of parent first if any.
+        """
+        condition = self.parent.get_obj_type_condition()
+        if condition is None:
+            return list(self.arguments)
+        return [condition, *self.arguments]
+
+    def _data_key(self, key):
+        field = self.parent._query_schema().fields.get(key, None)
+        if field is not None and field.data_key is not None:
+            return field.data_key
+        return key
+
+    def _projection(self):
+        """ Returns the data keys of select, with obj_type so that
+                results are read as objects of their class
+        """
+        projection = super()._projection()
+        if projection is None or \
+                OBJ_TYPE_ATTR_NAME not in self.parent._query_schema().fields:
+            return projection
+        obj_type_key = self._data_key(OBJ_TYPE_ATTR_NAME)
+        return [obj_type_key,
+                *(key for key in projection if key != obj_type_key)]
+
+    def page_token_of(self, obj) -> str:
+        """ Returns page_token of a result of the query as an object
+        """
+        return self.page_token(obj.doc_ref, obj._export_as_dict())
+
+    def _data_arguments(self):
+        """ Returns the arguments of _qualifier_arguments with the
+                data_key of each attribute, and its field.
+        """
+        fields = self.parent._query_schema().fields
+        res = list()
+        for key, comparator, val in self._qualifier_arguments():
+            field = fields.get(key, None)
+            if field is not None and field.data_key is not None:
+                key = field.data_key
+            res.append((key, comparator, val, field))
+        return res
+
     def _to_qualifier(self):
         """ Returns a greedy qualifier. Performance aside, it should work.
+                As on Firestore, a document without the field of an
+                argument does not match it.
         """
-        condition = self.parent.get_obj_type_condition()
-        arguments = [ condition, *self.arguments ]
+        arguments = [(key, comparator, val)
+                     for key, comparator, val, _ in self._data_arguments()]
         def qualifier(snapshot):
             for (key, comparator, val) in arguments:
                 if key not in snapshot:
-                    continue
+                    return False
                 a = snapshot[key]
                 if not comparator(a, val):
                     return False
@@ -176,19 +502,24 @@ class DomainModelQuery(QueryBase):
         return qualifier
 
 
-    def _to_firestore_query(self):
+    def _to_firestore_query(self, client=None):
         """ Returns a query with parent=cls._get_collection(), and
                 limits to obj_type of subclass of cls.
+
+        :param client: firestore client to query with; defaults to
+            CTX.db.firestore_client
         """
         from onto.database.firestore import FirestoreDatabase
 
         # TODO: move
 
         db: FirestoreDatabase = CTX.db
+        if client is None:
+            client = db.firestore_client
         if self.ref.first == '**':
-            cur_where = db.firestore_client.collection_group(self.ref.last)
+            cur_where = client.collection_group(self.ref.last)
         else:
-            cur_where = db._doc_ref_from_ref(self.ref)
+            cur_where = db._doc_ref_from_ref(self.ref, client=client)
         # cur_where = firestore.Query(parent=q)
         condition = self.parent.get_obj_type_condition()
         if condition is not None:
@@ -201,10 +532,52 @@ class DomainModelQuery(QueryBase):
             condition = comparator if isinstance(comparator, str) else comparator.condition
             # TODO: translate val
             cur_where = cur_where.where(data_key, condition, val)
+        projection = self._projection()
+        if projection is not None:
+            # With the keys of order_by, that the cursor of the next page
+            #   of query_pages is made of
+            orders = [self._data_key(key) for key, _ in self._orders]
+            cur_where = cur_where.select(
+                [*projection, *(key for key in orders
+                                if key not in projection)])
+        return self._firestore_paged(cur_where, db=db, client=client)
+
+    def _firestore_paged(self, cur_where, db, client):
+        """ Applies order_by, cursors, offset and limit to a Firestore
+                query. A cursor with a path orders by __name__ last.
+        """
+        from onto.database import Reference
+        orders = [(self._data_key(key), direction)
+                  for key, direction in self._orders]
+        for data_key, direction in orders:
+            cur_where = cur_where.order_by(data_key, direction=direction)
+        cursors = [c for c in (self._start_after, self._end_before)
+                   if c is not None]
+        if any(len(cursor) > len(orders) for cursor in cursors):
+            direction = orders[-1][1] if orders else self.ASCENDING
+            cur_where = cur_where.order_by('__name__', direction=direction)
+
+        def fields_of(cursor):
+            fields = {data_key: value
+                      for (data_key, _), value in zip(orders, cursor)}
+            if len(cursor) > len(orders):
+                fields['__name__'] = db._doc_ref_from_ref(
+                    Reference.from_str(cursor[-1]), client=client)
+            return fields
+
+        if self._start_after is not None:
+            cur_where = cur_where.start_after(fields_of(self._start_after))
+        if self._end_before is not None:
+            cur_where = cur_where.end_before(fields_of(self._end_before))
+        if self._offset is not None:
+            cur_where = cur_where.offset(self._offset)
+        if self._limit is not None:
+            cur_where = cur_where.limit(self._limit)
         return cur_where
 
     def _to_leancloud_query(self):
-        from onto.database.leancloud import LeancloudDatabase
+        from onto.database.leancloud import LeancloudDatabase, \
+            LEANCLOUD_DOC_ID_DATA_KEY
 
         # db: LeancloudDatabase = CTX.dbs.leancloud  # TODO: read db elsewhere
 
@@ -216,8 +589,7 @@ class DomainModelQuery(QueryBase):
             arguments = self.arguments.copy()
 
         cla_str = self.ref.last
-        import leancloud
-        cla = leancloud.Object.extend(name=cla_str)
+        cla = LeancloudDatabase._get_cla(cla_str)
         q = cla.query
 
         for key, comparator, val in arguments:
@@ -226,4 +598,71 @@ class DomainModelQuery(QueryBase):
             f = getattr(q, func_name)
             f(data_key, val)
 
+        q = self._leancloud_paged(q, cla)
+
+        projection = self._projection()
+        if projection is not None:
+            # _doc_id is the key of the reference of results
+            q.select(*projection, LEANCLOUD_DOC_ID_DATA_KEY)
+
+        return q
+
+    def _leancloud_orders(self):
+        """ Returns (data_key, descending) of order_by, then _doc_id in
+                the direction of the last key, which orders documents
+                with equal values as __name__ does on Firestore
+        """
+        from onto.database.leancloud import LEANCLOUD_DOC_ID_DATA_KEY
+        orders = [(self._data_key(key), direction == self.DESCENDING)
+                  for key, direction in self._orders]
+        last_descending = orders[-1][1] if orders else False
+        return [*orders, (LEANCLOUD_DOC_ID_DATA_KEY, last_descending)]
+
+    def _leancloud_cursor(self, cla, cursor, after):
+        """ Returns a query of cla for the documents after (or before)
+                cursor. Leancloud has no cursors, so this is an or of
+                (k1 == v1, ..., ki > vi) for each key ki of order_by,
+                and of _doc_id after the path of a document if any.
+        """
+        import leancloud
+        from onto.database import Reference
+        values = list(cursor[:len(self._orders)])
+        if len(cursor) > len(self._orders):
+            values.append(Reference.from_str(cursor[-1]).last)
+        orders = self._leancloud_orders()[:len(values)]
+        branches = list()
+        for i, (key, descending) in enumerate(orders):
+            branch = cla.query
+            for (equal_key, _), value in zip(orders[:i], values):
+                branch.equal_to(equal_key, value)
+            if after != descending:
+                branch.greater_than(key, values[i])
+            else:
+                branch.less_than(key, values[i])
+            branches.append(branch)
+        if len(branches) == 1:
+            return branches[0]
+        return leancloud.Query.or_(*branches)
+
+    def _leancloud_paged(self, q, cla):
+        """ Applies order_by, cursors, offset and limit to a Leancloud
+                query; see _leancloud_cursor.
+        """
+        import leancloud
+        cursors = [self._leancloud_cursor(cla, cursor, after)
+                   for cursor, after in ((self._start_after, True),
+                                         (self._end_before, False))
+                   if cursor is not None]
+        if cursors:
+            q = leancloud.Query.and_(q, *cursors)
+        if self._orders or cursors:
+            for key, descending in self._leancloud_orders():
+                if descending:
+                    q.add_descending(key)
+                else:
+                    q.add_ascending(key)
+        if self._offset is not None:
+            q.skip(self._offset)
+        if self._limit is not None:
+            q.limit(self._limit)
         return q
@@ -1,3 +1,5 @@
+import itertools
+
 from onto.mapper.fields import OBJ_TYPE_ATTR_NAME
 from onto.utils import snapshot_to_obj
 from onto.context import Context as CTX
@@ -37,14 +39,56 @@ def convert_query_ref(func):
     return call
 
 
+_CONVERT_BATCH_SIZE = 100
+
+
+class QueryResults:
+    """
+    Objects of the results of a query, read when first iterated. Before
+        then, select narrows the fields that are read:
+
+        for city in City.where(country='USA').select('name'):
+            ...
+    """
+
+    def __init__(self, cls, q, db):
+        self._cls = cls
+        self._q = q
+        self._db = db
+        self._objs = None
+
+    def select(self, *keys):
+        """ Returns the results of the query with select(*keys); see
+                QueryBase.select
+        """
+        if self._objs is not None:
+            raise ValueError('Results are already being read')
+        return QueryResults(self._cls, self._q.select(*keys), self._db)
+
+    def _read(self):
+        cls, q = self._cls, self._q
+        fields = q._projection()
+        results = iter(self._db.query(q))
+        while batch := list(itertools.islice(results, _CONVERT_BATCH_SIZE)):
+            yield from cls.from_snapshots(batch, fields=fields)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._objs is None:
+            self._objs = self._read()
+        return next(self._objs)
+
+
 def convert_query(func):
+    """
+    Converts (ref, snapshot) results of a query to objects. Results are
+        deserialized in batches of _CONVERT_BATCH_SIZE.
+    """
     def call(cls, *args, **kwargs):
         q, db = func(cls, *args, **kwargs)
-        for ref, snapshot in db.query(q):
-            yield snapshot_to_obj(
-                reference=ref,
-                snapshot=snapshot,
-                super_cls=cls)
+        return QueryResults(cls, q, db)
     return call
 
 
@@ -64,6 +108,36 @@ class QueryMixin:
     def where(cls, *args, **kwargs):
         return cls.get_query().where(*args, **kwargs), cls._datastore()
 
+    @classmethod
+    def stream(cls, q=None, page_size=100, max_buffered=1000):
+        """ Yields objects of the results of q (defaults to all objects
+                of cls). A background thread reads pages of page_size
+                results and deserializes them while the caller works on
+                the previous page, holding at most max_buffered objects
+                that are not yet consumed.
+        """
+        from onto.query.prefetch import PrefetchIterator
+        if q is None:
+            q = cls.get_query()
+        pages = cls._datastore().query_pages(q, page_size=page_size)
+        fields = q._projection()
+        objs = PrefetchIterator(
+            pages,
+            convert=lambda page: cls.from_snapshots(page, fields=fields),
+            max_buffered=max_buffered)
+        try:
+            yield from objs
+        finally:
+            objs.close()
+
+    @classmethod
+    @convert_query
+    def from_query(cls, q):
+        """ Gets objects of the results of q, a query from get_query
+                that may have order_by, limit, offset and cursors.
+        """
+        return q, cls._datastore()
+
     @classmethod
     def get_obj_type_condition(cls):
         schema_obj = cls.get_schema_obj()
@@ -7,7 +7,9 @@ from functools import wraps
 def run_transaction(func):
     """ Decorator to run a function in transaction. All instances
             of subclasses of FirestoreObject will default to this transaction
-            for reading and writing to Firestore.
+            for reading and writing to Firestore. The function runs again
+            when the transaction conflicts, as decided by
+            CTX.db.transactional.
 
     :return:
     """
@@ -16,13 +18,16 @@ def run_transaction(func):
         # Set transaction context variable
         transaction = CTX.db.transaction()
         token = CTX.transaction_var.set(transaction)
-        from google.cloud import firestore
-        @firestore.transactional
-        def new_func(transaction: firestore.Transaction):
-            return func(*args, **kwargs, transaction=transaction)
-        res = new_func(transaction)
-        # Reverse transaction context variable
-        CTX.transaction_var.reset(token)
-        return res
+        from onto.database.identity_map import IdentityMap
+        @CTX.db.transactional
+        def new_func(transaction):
+            # Each attempt reads documents again
+            with IdentityMap.scope():
+                return func(*args, **kwargs, transaction=transaction)
+        try:
+            return new_func(transaction)
+        finally:
+            # Reverse transaction context variable
+            CTX.transaction_var.reset(token)
     return wrapper
 
@@ -12,12 +12,16 @@ class ModelRegistry(type):
     _REGISTRY: dict
         key: name of the class
         value: class
+    _version: int
+        incremented whenever a class is registered; caches derived
+        from the registry compare against it to detect staleness
 
     """
 
     _REGISTRY = {}
     _tree = defaultdict(set)
     _tree_r = defaultdict(set)
+    _version = 0
 
     def __new__(mcs, name, bases, attrs):
         new_cls = type.__new__(mcs, name, bases, attrs)
@@ -33,8 +37,18 @@ class ModelRegistry(type):
                 mcs._tree[base.__name__].add(new_cls.__name__)
                 mcs._tree_r[new_cls.__name__].add(base.__name__)
 
+        # Set on ModelRegistry explicitly: mcs may be a sub-metaclass,
+        #   and assigning to it would shadow the shared counter
+        ModelRegistry._version += 1
+
         return new_cls
 
+    @classmethod
+    def get_version(mcs):
+        """ Returns a counter that changes whenever the registry changes
+        """
+        return ModelRegistry._version
+
     @classmethod
     def get_registry(mcs):
         return dict(mcs._REGISTRY)
@@ -10,6 +10,7 @@ from onto.source.protocol import Protocol
 from onto.view_model import ViewModel
 
 from onto.sink.base import Sink
+from onto.database.identity_map import IdentityMap
 
 
 from collections import namedtuple
@@ -209,6 +210,9 @@ class GraphQLSink(Sink):
         )
 
     def start(self):
+        from onto.models.utils import compile_graphql_types
+        # Builds the types of the view model before the first request
+        compile_graphql_types([self.view_model_cls])
         subscription_schema = self._as_graphql_schema()
         return subscription_schema
 
@@ -289,7 +293,8 @@ class GraphQLQuerySink(GraphQLSink):
                 import logging
                 logging.error('未能解析user，可能是没有装载 AuthMiddleware；程序将继续执行以兼容不需要用户的测试代码')
 
-            res = await self._invoke_mediator(func_name='query', **kwargs)
+            with IdentityMap.scope():
+                res = await self._invoke_mediator(func_name='query', **kwargs)
             return res
 
         name = self.sink_name
@@ -313,7 +318,7 @@ class GraphQLMutationSink(GraphQLSink):
                 'info': info,
                 **kwargs
             }
-            with graphql_context(info):
+            with graphql_context(info), IdentityMap.scope():
                 res = await self._invoke_mediator(func_name='mutate', **kwargs)
             return res
 
@@ -15,16 +15,28 @@ class DomainModelSource(FirestoreSource):
     TODO: limit maxsize
     """
 
-    def __init__(self, domain_model_cls: Type[DomainModel], *args, **kwargs):
+    def __init__(self, domain_model_cls: Type[DomainModel], *args,
+                 lazy=False, **kwargs):
+        """
+
+        :param domain_model_cls:
+        :param lazy: If set to True, fields of objects passed to the
+            mediator are decoded on first access
+        :param args: Positional arguments to be forwarded to where
+        :param kwargs: Keyword arguments to be forwarded to where
+        """
         self.domain_model_cls = domain_model_cls
+        self.lazy = lazy
         query = self.domain_model_cls.get_query().where(*args, **kwargs)
         super().__init__(query=query)
 
     def _call(self, container):
         with container.lock:
-            for func_name, ref, snapshot in self.delta(container):
-                obj = self.domain_model_cls.from_snapshot(
-                    ref=ref, snapshot=snapshot)
+            changes = list(self.delta(container))
+            objs = self.domain_model_cls.from_snapshots(
+                ((ref, snapshot) for _, ref, snapshot in changes),
+                lazy=self.lazy)
+            for (func_name, _, _), obj in zip(changes, objs):
                 self._invoke_mediator(func_name=func_name, obj=obj)
 
 
@@ -58,5 +70,5 @@ class DomainModelPathSource(DomainModelSource):
         doc_ref = self.domain_model_cls.ref_from_id(doc_id=doc_id)
         snapshot = CTX.db.get(ref=doc_ref)
         return self.domain_model_cls.from_snapshot(
-            ref=doc_ref, snapshot=snapshot)
+            ref=doc_ref, snapshot=snapshot, lazy=self.lazy)
 
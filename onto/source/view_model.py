@@ -14,13 +14,15 @@ from onto.source.firestore import FirestoreSource
 
 class ViewModelSource(FirestoreSource):
 
-    def __init__(self, view_model_cls: Type[ViewModel], query: QueryBase):
+    def __init__(self, view_model_cls: Type[ViewModel], query: QueryBase,
+                 lazy=False):
         self.view_model_cls = view_model_cls
+        self.lazy = lazy
         super().__init__(query=query)
 
     def _call(self, container):
         for change_type_str, ref, snapshot in self.delta(container):
             obj = self.view_model_cls.from_snapshot(
-                ref=ref, snapshot=snapshot)
+                ref=ref, snapshot=snapshot, lazy=self.lazy)
             self._invoke_mediator(func_name=change_type_str, obj=obj)
 
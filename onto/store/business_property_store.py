@@ -82,8 +82,9 @@ class BusinessPropertyStore:
             return self.objs[self._g[item]]
 
     def propagate_back(self):
-        for _, obj in self.objs.items():
-            obj.save()
+        with CTX.db.batch():
+            for _, obj in self.objs.items():
+                obj.save()
 
     @staticmethod
     def _get_manifests(struct, schema_obj) -> Tuple:
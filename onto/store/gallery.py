@@ -1,6 +1,7 @@
 from typing import List
 from onto.database import Reference, Snapshot, Database
 from onto.store.snapshot_container import SnapshotContainer
+from onto.database.identity_map import IdentityMap
 from onto.context import Context as CTX
 
 
@@ -41,10 +42,12 @@ class Gallery:
             pass
 
     def save(self):
-        for _, (obj, kwargs) in self.save_tasks.items():
-            d = obj._export_as_dict(**kwargs)
-            snapshot = Snapshot(d)
-            self._datastore().set(snapshot=snapshot, ref=obj.doc_ref, transaction=kwargs['transaction'])
+        with self._datastore().batch():
+            for _, (obj, kwargs) in self.save_tasks.items():
+                d = obj._export_as_dict(**kwargs)
+                snapshot = Snapshot.view(d)
+                writer = self._datastore().writer(kwargs['transaction'])
+                writer.set(snapshot=snapshot, ref=obj.doc_ref, transaction=kwargs['transaction'])
 
     @staticmethod
     def _get_snapshots_with_listener(refs: List[Reference]):
@@ -65,6 +68,10 @@ class Gallery:
         :param kwargs:
         :return:
         """
+        identity_map = IdentityMap.current()
+        if identity_map is not None:
+            return identity_map.get_many(
+                database, transaction=transaction, **kwargs)
         return database.get_many(transaction=transaction, **kwargs)
 
     def refresh(self, transaction, get_snapshots=None):
@@ -79,14 +86,17 @@ class Gallery:
                 refs.append(doc_ref)
 
             res = get_snapshots(database=self._datastore(), refs=refs, transaction=transaction)
+            items_of = dict()
             for ref, doc in res:
                 self.container.set(key=ref, val=doc)
 
                 # for doc in res:
                 obj_type = self.tasks[ref]
                 del self.tasks[ref]
-                instance = obj_type.from_snapshot(
-                    ref=ref, snapshot=doc, _store=self)
+                items_of.setdefault(obj_type, list()).append((ref, doc))
+
+            for obj_type, items in items_of.items():
+                instances = obj_type.from_snapshots(items, _store=self)
 
                 # d = doc.to_dict()
                 # obj_cls = resolve_obj_cls(cls=obj_type, d=d)
@@ -98,7 +108,8 @@ class Gallery:
                 #
                 # instance = obj_cls.new(
                 #     **d, transaction=transaction)
-                self.object_container[ref] = instance
+                for (ref, _), instance in zip(items, instances):
+                    self.object_container[ref] = instance
 
     def retrieve(self, *, doc_ref, obj_type):
         if doc_ref not in self.object_container:
@@ -12,7 +12,7 @@ from inflection import camelize, underscore
 
 from onto.common import _NA
 from onto.context import Context as CTX
-from onto.database import Reference
+from onto.database import Reference, Snapshot
 from onto.registry import ModelRegistry
 
 
@@ -73,7 +73,10 @@ def snapshot_to_obj(
     # if not snapshot.exists:
     #     return None
 
-    d = snapshot.to_dict()
+    if isinstance(snapshot, Snapshot):
+        d = snapshot.as_mapping()
+    else:
+        d = snapshot.to_dict()
     obj_cls = super_cls
 
     if "obj_type" in d:
@@ -13,8 +13,31 @@ from onto.models.base import Serializable
 class ParamsParams(Serializable):
     page_size = attrs.int
     current = attrs.int
+    # nextPageToken in the extra of the previous page; current is still
+    #   used for total
+    page_token = attrs.string
+
+    def _offset(self):
+        current = getattr(self, 'current', None) or 1
+        return (current - 1) * self.page_size
 
     def append_conditions(self, q):
+        """ Limits q to page_size results after page_token, or else to
+                page current (from 1). One more result than page_size is
+                read so that ListGetView can tell whether there is a
+                next page. With page_token, the results of earlier pages
+                are not read again.
+        """
+        page_size = getattr(self, 'page_size', None)
+        if not page_size:
+            return q
+        q = q.limit(page_size + 1)
+        page_token = getattr(self, 'page_token', None)
+        if page_token:
+            return q.start_after_token(page_token)
+        offset = self._offset()
+        if offset:
+            q = q.offset(offset)
         return q
 
 class Sort(Serializable):
@@ -34,6 +57,12 @@ class Params(Serializable):
     sort = attrs.embed(Sort)
     filter = attrs.embed(Filter)
 
+    def append_conditions(self, q):
+        """ Applies filter, sort and the page of params to q """
+        q = self.filter.append_conditions(q)
+        q = self.sort.append_conditions(q)
+        return self.params.append_conditions(q)
+
 
 PaginatedResponse = namedtuple('PaginatedResponse', ['success', 'data', 'total', 'extra'], defaults=[True, None, None, None])
 
@@ -544,18 +573,43 @@ class ViewMediator(ViewMediatorBase):
                     'filter': filter_d,
                 })
 
+                # get_many returns a PaginatedResponse, a query of
+                #   get_query that the page of params is applied to, or
+                #   a list: the page, or all of the results when there
+                #   are more than page_size + 1
                 res = _self.view_model_cls.get_many(params=params)
-                from collections import namedtuple
+                from onto.query.query import QueryBase
                 if isinstance(res, PaginatedResponse):
                     data = res.data
                     total = res.total
                     success = res.success
                     extra = res.extra
                 else:
-                    data = list(res)
-                    total = 0
                     success = True
                     extra = None
+                    page = params.params
+                    page_size = getattr(page, 'page_size', None)
+                    if isinstance(res, QueryBase):
+                        q = params.append_conditions(res)
+                        data = list(res.parent.from_query(q))
+                        if page_size and len(data) > page_size:
+                            extra = dict(nextPageToken=q.page_token_of(
+                                data[page_size - 1]))
+                    else:
+                        data = list(res)
+                    if page_size and len(data) > page_size + 1:
+                        # All of the results
+                        total = len(data)
+                        start = page._offset()
+                        data = data[start:start + page_size]
+                    elif page_size:
+                        # The page has page_size + 1 results when there
+                        #   are more; total then counts one result of
+                        #   the next page
+                        total = page._offset() + len(data)
+                        data = data[:page_size]
+                    else:
+                        total = len(data)
                 paginated = _self.paginated_query_cls.new(
                     data=data,
                     total=total,
@@ -0,0 +1,43 @@
+import asyncio
+
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_asave_and_aget(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database import Database, Snapshot
+    from onto.database.mock import MockDatabase
+
+    class AsyncModel(DomainModel):
+        name = attrs.string
+        count = attrs.integer
+
+    async def main():
+        obj = AsyncModel.new(doc_id='a', name='foo', count=1)
+        await obj.asave()
+        obj.count = 2
+        await obj.asave()
+
+        read = await AsyncModel.aget(doc_id='a')
+        assert read.to_dict() == obj.to_dict()
+
+        refs = [obj.doc_ref]
+        (ref, snapshot), = await MockDatabase.aget_many(refs=refs)
+        assert ref == obj.doc_ref
+        assert snapshot['count'] == 2
+
+        results = [item async for item in MockDatabase.aquery(
+            AsyncModel.get_query())]
+        assert len(results) == 1
+
+        # The default implementation runs MockDatabase.get in a thread
+        snapshot = await Database.aget.__func__(MockDatabase, ref=ref)
+        assert isinstance(snapshot, Snapshot)
+        assert snapshot['name'] == 'foo'
+
+        await MockDatabase.adelete(ref=ref)
+        assert str(ref) not in MockDatabase.d
+
+    asyncio.run(main())
@@ -237,3 +237,87 @@ def test_graphql_custom_scalar_type():
 #     attendance = attrs.bproperty(type_cls=bool)
 #
 #     meetings = attrs.relation(import_required=False, dm_cls='Meeting', collection=list, nested=False)
+
+
+def test_freeze():
+    from onto.attrs.unit import MonadContext
+
+    a = attrs.attrs.string.data_key('someKey')
+    decor = a.properties.freeze()
+
+    assert '_owners' in vars(decor)
+    assert decor.data_key == 'someKey'
+    assert decor.type_cls is str
+
+    # Names not defined in the chain are still read from the context
+    for initialize in (False, True):
+        with MonadContext.context().init_options(
+                initialize=initialize, initializer=None):
+            assert decor.initialize is initialize
+
+
+def test_compose_graphql_type():
+    import graphql
+    from onto.attrs.unit import compose_graphql_type, whichever_order
+
+    def op(typ):
+        base = typ[0]
+        for elem in typ[1:]:
+            base = elem(base)
+        return base
+
+    cases = [
+        [graphql.GraphQLString],
+        [graphql.GraphQLNonNull, graphql.GraphQLInt],
+        [graphql.GraphQLNonNull, graphql.GraphQLList(graphql.GraphQLInt)],
+        [graphql.GraphQLNonNull, graphql.GraphQLList, graphql.GraphQLFloat],
+    ]
+    for typ in cases:
+        assert str(compose_graphql_type(typ)) == str(whichever_order(typ, op))
+
+
+def test_compile_graphql_types():
+    from onto.attrs import attrs
+    from onto.domain_model import DomainModel
+    from onto.models.utils import compile_graphql_types
+
+    class CompiledInner(DomainModel):
+        x = attrs.integer
+
+    class CompiledOuter(DomainModel):
+        name = attrs.string
+        tags = attrs.list(value=attrs.string)
+        inner = attrs.embed(CompiledInner)
+
+    classes = [CompiledInner, CompiledOuter]
+
+    def type_map():
+        return {
+            str(ot): {key: str(field.type) for key, field in ot.fields.items()}
+            for klass in classes for is_input in (False, True)
+            for ot in [klass.get_graphql_object_type(is_input=is_input)]
+        }
+
+    timings = compile_graphql_types(classes)
+    assert set(timings) == {'CompiledInner', 'CompiledOuter'}
+    expected = {
+        'CompiledInner': {'x': 'Int'},
+        'CompiledInnerInput': {'x': 'Int'},
+        'CompiledOuter': {
+            'name': 'String', 'tags': '[String]', 'inner': 'CompiledInner'},
+        'CompiledOuterInput': {
+            'name': 'String', 'tags': '[String]',
+            'inner': 'CompiledInnerInput'},
+    }
+    assert type_map() == expected
+    # Fields are in the order of declaration
+    assert [list(fields) for fields in type_map().values()] == \
+           [list(fields) for fields in expected.values()]
+
+    # Compiling again keeps the cached types
+    types = [klass.get_graphql_object_type(is_input=is_input)
+             for klass in classes for is_input in (False, True)]
+    compile_graphql_types(classes)
+    assert [klass.get_graphql_object_type(is_input=is_input)
+            for klass in classes for is_input in (False, True)] == types
+    assert type_map() == expected
@@ -0,0 +1,72 @@
+import pytest
+
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_save_all(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database.mock import MockDatabase
+
+    class BatchModel(DomainModel):
+        count = attrs.integer
+
+    commits = list()
+
+    class RecordingDatabase(MockDatabase):
+
+        @classmethod
+        def _commit_batch(cls, ops):
+            commits.append([(name, str(ref)) for name, ref, _ in ops])
+            super()._commit_batch(ops)
+
+    BatchModel._datastore = classmethod(lambda cls: RecordingDatabase)
+
+    objs = [BatchModel.new(doc_id=doc_id, count=0) for doc_id in 'abc']
+    BatchModel.save_all(objs)
+    assert len(commits) == 1
+    assert [name for name, _ in commits[0]] == ['set', 'set', 'set']
+    assert BatchModel.get(doc_id='b').count == 0
+
+    # Nested batches join the outer one
+    with RecordingDatabase.batch():
+        for obj in objs:
+            obj.count = 1
+        BatchModel.save_all(objs[:2])
+        objs[2].save()
+        objs[0].delete()
+        assert len(commits) == 1
+    assert [name for name, _ in commits[1]] == \
+           ['update', 'update', 'update', 'delete']
+    assert BatchModel.get(doc_id='c').count == 1
+    assert str(objs[0].doc_ref) not in RecordingDatabase.d
+
+    # Writes are discarded when the block raises
+    with pytest.raises(ValueError):
+        with RecordingDatabase.batch():
+            objs[1].delete()
+            raise ValueError
+    assert len(commits) == 2
+    assert BatchModel.get(doc_id='b').count == 1
+
+
+def test_batch_max_size(CTX):
+    from onto.database import Snapshot
+    from onto.database.mock import MockDatabase, MockReference
+
+    sizes = list()
+
+    class SmallBatchDatabase(MockDatabase):
+        batch_max_size = 2
+
+        @classmethod
+        def _commit_batch(cls, ops):
+            sizes.append(len(ops))
+            super()._commit_batch(ops)
+
+    with SmallBatchDatabase.batch() as batch:
+        for doc_id in 'abcde':
+            ref = MockReference.from_str(f'batch_max_size/{doc_id}')
+            batch.set(ref=ref, snapshot=Snapshot({'x': 1}))
+    assert sizes == [2, 2, 1]
@@ -0,0 +1,123 @@
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_cached_database(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database import Snapshot
+    from onto.database.cached import CachedDatabase
+    from onto.database.mock import MockDatabase
+
+    reads = list()
+
+    class CountingDatabase(MockDatabase):
+
+        @classmethod
+        def get(cls, ref, transaction=None):
+            reads.append(str(ref))
+            return super().get(ref=ref, transaction=transaction)
+
+    db = CachedDatabase.of(CountingDatabase, max_size=2)
+
+    class CachedModel(DomainModel):
+        name = attrs.string
+
+    CachedModel._datastore = classmethod(lambda cls: db)
+
+    obj = CachedModel.new(doc_id='a', name='foo')
+    obj.save()
+    assert CachedModel.get(doc_id='a').name == 'foo'
+    assert CachedModel.get(doc_id='a').name == 'foo'
+    assert len(reads) == 1
+    assert db.stats() == dict(hits=1, misses=1, size=1)
+
+    # Changing a snapshot that is read does not change the cached one
+    snapshot = db.get(ref=obj.doc_ref)
+    snapshot['name'] = 'changed'
+    assert db.get(ref=obj.doc_ref)['name'] == 'foo'
+
+    # Writes drop the cached document
+    obj.name = 'bar'
+    obj.save()
+    assert CachedModel.get(doc_id='a').name == 'bar'
+    assert len(reads) == 2
+
+    # Change events refresh the cached document
+    CountingDatabase.listener()._pub(
+        reference=obj.doc_ref, snapshot=Snapshot({'name': 'baz'}))
+    assert db.get(ref=obj.doc_ref)['name'] == 'baz'
+    assert len(reads) == 2
+
+    # Least recently used documents are evicted
+    for doc_id in 'bc':
+        CachedModel.new(doc_id=doc_id, name=doc_id).save()
+        CachedModel.get(doc_id=doc_id)
+    assert db.stats()['size'] == 2
+    CachedModel.get(doc_id='a')
+    assert reads[-1] == str(obj.doc_ref)
+
+
+def test_cached_database_ttl(CTX):
+    from onto.database import Snapshot
+    from onto.database.cached import CachedDatabase
+    from onto.database.mock import MockDatabase, MockReference
+
+    db = CachedDatabase.of(MockDatabase, ttl=0)
+    ref = MockReference.from_str('cached_ttl/a')
+    db.set(ref=ref, snapshot=Snapshot({'x': 1}))
+    db.get(ref=ref)
+    db.get(ref=ref)
+    assert db.stats()['hits'] == 0
+
+
+def test_cached_database_invalidation(CTX):
+    from onto.database import Listener, Snapshot
+    from onto.database.cached import CachedDatabase
+    from onto.database.mock import MockDatabase, MockReference
+
+    writes_during_read = list()
+
+    class RacingDatabase(MockDatabase):
+
+        @classmethod
+        def get(cls, ref, transaction=None):
+            snapshot = super().get(ref=ref, transaction=transaction)
+            # A write that lands after the read, before it is cached
+            while writes_during_read:
+                writes_during_read.pop()()
+            return snapshot
+
+    n_callbacks = len(Listener._change_callbacks)
+    db = CachedDatabase.of(RacingDatabase)
+    CachedDatabase.of(RacingDatabase)
+    # One Listener callback for each wrapped database
+    assert len(Listener._change_callbacks) == n_callbacks + 1
+
+    ref = MockReference.from_str('cached_race/a')
+    db.set(ref=ref, snapshot=Snapshot({'x': 1}))
+    writes_during_read.append(
+        lambda: db.set(ref=ref, snapshot=Snapshot({'x': 2})))
+    assert db.get(ref=ref)['x'] == 1
+    # The value read before the write is not cached
+    assert db.get(ref=ref)['x'] == 2
+    assert db.get(ref=ref)['x'] == 2
+    assert db.stats()['hits'] == 1
+
+    writes_during_read.append(
+        lambda: db.set(ref=ref, snapshot=Snapshot({'x': 3})))
+    db.clear_cache()
+    assert [s['x'] for _, s in db.get_many(refs=[ref])] == [2]
+    assert db.get(ref=ref)['x'] == 3
+
+    # Writes in a transaction drop the entry when it is committed
+    @db.transactional
+    def write(transaction):
+        db.set(ref=ref, snapshot=Snapshot({'x': 4}), transaction=transaction)
+        # Read outside of the transaction, before it commits
+        assert db.get(ref=ref, transaction=None)['x'] == 3
+
+    write(db.transaction())
+    assert db.get(ref=ref)['x'] == 4
+    # Generations are only kept while reads are in flight
+    assert db._generations == dict()
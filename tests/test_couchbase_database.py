@@ -0,0 +1,136 @@
+import pytest
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+class _Result:
+
+    def __init__(self, value):
+        self.content_as = {dict: value}
+
+
+class _FakeCollection:
+
+    def __init__(self, docs, calls):
+        self.docs = docs
+        self.calls = calls
+
+    def upsert(self, key, value):
+        self.calls.append('upsert')
+        self.docs[key] = value
+
+    def get(self, key):
+        self.calls.append('get')
+        return _Result(self.docs[key])
+
+    def get_multi(self, keys):
+        self.calls.append('get_multi')
+        return {key: _Result(self.docs[key]) for key in keys}
+
+    def upsert_multi(self, values):
+        self.calls.append('upsert_multi')
+        self.docs.update(values)
+
+    def remove(self, key):
+        self.calls.append('remove')
+        del self.docs[key]
+
+    def remove_multi(self, keys):
+        self.calls.append('remove_multi')
+        for key in keys:
+            del self.docs[key]
+
+
+class _FakeBucket:
+    """ In-process bucket with the key-value calls of CouchbaseDatabase
+    """
+
+    name = 'fake'
+
+    def __init__(self):
+        self.collections = dict()
+        self.calls = list()
+
+    def collection(self, collection_name):
+        docs = self.collections.setdefault(collection_name, dict())
+        return _FakeCollection(docs, self.calls)
+
+
+class _FakeCluster:
+    """ Records N1QL statements, and returns the documents of the bucket
+            that have the obj_type in the first parameter
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.queries = list()
+
+    def query(self, statement, options=None):
+        self.queries.append((statement, options))
+        obj_types = options['positional_parameters'][0]
+        rows = [dict(id=key, doc=doc) for collection in
+                self.bucket.collections.values()
+                for key, doc in collection.items()
+                if doc.get('obj_type') in obj_types]
+
+        class Result:
+            @staticmethod
+            def rows():
+                return iter(rows)
+        return Result
+
+
+def test_couchbase_database(CTX):
+    pytest.importorskip('couchbase')
+    from onto.domain_model import DomainModel
+    from onto.database.couchbase import CouchbaseDatabase
+
+    bucket = _FakeBucket()
+    cluster = _FakeCluster(bucket)
+    db = CouchbaseDatabase.of(bucket=bucket, cluster=cluster)
+
+    class CouchModel(DomainModel):
+        first_name = attrs.string
+        rank = attrs.integer
+
+    CouchModel._datastore = classmethod(lambda cls: db)
+
+    with db.batch():
+        for i in range(3):
+            CouchModel.new(doc_id=f'd{i}', first_name='a', rank=i).save()
+    assert bucket.calls == ['upsert_multi']
+    assert CouchModel.get(doc_id='d1').rank == 1
+
+    refs = [CouchModel.get(doc_id=f'd{i}').doc_ref for i in (2, 0)]
+    bucket.calls.clear()
+    assert [snapshot['rank'] for _, snapshot in db.get_many(refs)] == [2, 0]
+    assert bucket.calls == ['get_multi']
+
+    q = CouchModel.get_query().where(
+        'first_name', db.Comparators.eq, 'a', 'rank', db.Comparators.lt, 2)
+    statement, params = db._to_n1ql(q)
+    assert statement == (
+        'SELECT META(d).id AS id, d AS doc '
+        'FROM `fake`.`_default`.`CouchModel` AS d '
+        'USE INDEX (`onto_CouchModel_obj_type` USING GSI, '
+        '`onto_CouchModel_firstName` USING GSI, '
+        '`onto_CouchModel_rank` USING GSI) '
+        'WHERE d.`obj_type` IN $1 AND d.`firstName` = $2 AND d.`rank` < $3')
+    assert params == [['CouchModel'], 'a', 2]
+
+    # A page token is a keyset condition on the order key, then the id
+    q = CouchModel.get_query().order_by('rank').limit(2)
+    statement, params = db._to_n1ql(q.start_after(1, 'CouchModel/d1'))
+    assert statement == (
+        'SELECT META(d).id AS id, d AS doc '
+        'FROM `fake`.`_default`.`CouchModel` AS d '
+        'USE INDEX (`onto_CouchModel_obj_type` USING GSI) '
+        'WHERE d.`obj_type` IN $1 AND d.`rank` IS NOT MISSING '
+        'AND ((d.`rank` > $2) OR (d.`rank` = $3 AND META(d).id > $4)) '
+        'ORDER BY d.`rank` ASC, META(d).id ASC LIMIT $5')
+    assert params == [['CouchModel'], 1, 1, 'd1', 2]
+    assert sorted(obj.doc_id for obj in CouchModel.all()) == \
+           ['d0', 'd1', 'd2']
+
+    CouchModel.get(doc_id='d0').delete()
+    assert 'd0' not in bucket.collections['CouchModel']
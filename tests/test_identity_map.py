@@ -0,0 +1,82 @@
+import asyncio
+
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_identity_map(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database.identity_map import IdentityMap
+    from onto.database.mock import MockDatabase
+
+    calls = list()
+
+    class CountingDatabase(MockDatabase):
+
+        @classmethod
+        def get(cls, ref, transaction=None):
+            calls.append(('get', str(ref)))
+            return super().get(ref=ref, transaction=transaction)
+
+        @classmethod
+        async def aget_many(cls, refs, transaction=None):
+            calls.append(('aget_many', sorted(str(ref) for ref in refs)))
+            return await super().aget_many(refs=refs, transaction=transaction)
+
+    class IdentityModel(DomainModel):
+        name = attrs.string
+
+    IdentityModel._datastore = classmethod(lambda cls: CountingDatabase)
+
+    for doc_id in 'abc':
+        IdentityModel.new(doc_id=doc_id, name=doc_id).save()
+
+    with IdentityMap.scope():
+        obj = IdentityModel.get(doc_id='a')
+        assert IdentityModel.get(doc_id='a') is obj
+        assert len(calls) == 1
+
+        obj.name = 'changed'
+        obj.save()
+        assert IdentityModel.get(doc_id='a') is obj
+
+        obj.delete()
+        assert not IdentityMap.current().objects
+
+    assert IdentityModel.get(doc_id='b') is not IdentityModel.get(doc_id='b')
+
+    async def main():
+        with IdentityMap.scope():
+            objs = await asyncio.gather(*(
+                IdentityModel.aget(doc_id=doc_id) for doc_id in 'bcb'))
+        assert objs[0] is objs[2]
+        assert [obj.name for obj in objs] == ['b', 'c', 'b']
+
+    calls.clear()
+    asyncio.run(main())
+    assert [call for call in calls if call[0] == 'aget_many'] == [
+        ('aget_many', ['IdentityModel/b', 'IdentityModel/c'])]
+
+
+def test_identity_map_cancelled_reader(CTX):
+    from onto.database import Snapshot
+    from onto.database.identity_map import IdentityMap
+    from onto.database.mock import MockDatabase, MockReference
+
+    ref = MockReference.from_str('identity_cancel/a')
+    MockDatabase.set(ref=ref, snapshot=Snapshot({'x': 1}))
+    identity_map = IdentityMap()
+
+    async def main():
+        first = asyncio.ensure_future(
+            identity_map.aget(MockDatabase, ref=ref, transaction=None))
+        second = asyncio.ensure_future(
+            identity_map.aget(MockDatabase, ref=ref, transaction=None))
+        await asyncio.sleep(0)
+        first.cancel()
+        # The other reader of the same ref is not cancelled
+        assert (await second)['x'] == 1
+
+    asyncio.run(main())
+    MockDatabase.delete(ref=ref)
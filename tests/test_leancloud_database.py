@@ -0,0 +1,257 @@
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+
+def _matches(obj, where):
+    """ Returns True when obj matches where, with the operators that
+            LeancloudDatabase sends
+    """
+    for key, cond in where.items():
+        if key == '$or':
+            if not any(_matches(obj, sub) for sub in cond):
+                return False
+        elif key == '$and':
+            if not all(_matches(obj, sub) for sub in cond):
+                return False
+        elif isinstance(cond, dict):
+            if key not in obj:
+                return False
+            val = obj[key]
+            for op, arg in cond.items():
+                if not {'$in': lambda: val in arg,
+                        '$gt': lambda: val > arg,
+                        '$lt': lambda: val < arg}[op]():
+                    return False
+        elif obj.get(key) != cond:
+            return False
+    return True
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """ Serves the part of the Leancloud REST API that LeancloudDatabase
+            uses, from the objects of the server.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _save(self, class_name, object_id, body):
+        objects = self.server.objects.setdefault(class_name, dict())
+        if object_id is None:
+            object_id = str(next(self.server.ids))
+            objects[object_id] = dict(
+                objectId=object_id, createdAt='2020-01-01T00:00:00.000Z')
+        for key, val in body.items():
+            if isinstance(val, dict) and val.get('__op') == 'Delete':
+                objects[object_id].pop(key, None)
+            else:
+                objects[object_id][key] = val
+        objects[object_id]['updatedAt'] = '2020-01-01T00:00:00.000Z'
+        return dict(objectId=object_id,
+                    createdAt=objects[object_id]['createdAt'])
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.calls.append(('GET', url.path))
+        class_name = url.path.split('/')[-1]
+        params = parse_qs(url.query)
+        where = json.loads(params.get('where', ['{}'])[0])
+        limit = int(params.get('limit', ['100'])[0])
+        skip = int(params.get('skip', ['0'])[0])
+        results = [obj for obj in
+                   self.server.objects.get(class_name, dict()).values()
+                   if _matches(obj, where)]
+        orders = params.get('order', [''])[0]
+        for order in reversed([o for o in orders.split(',') if o]):
+            key = order.lstrip('-')
+            results.sort(key=lambda obj: obj[key],
+                         reverse=order.startswith('-'))
+        self._reply(dict(results=results[skip:skip + limit]))
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        self.server.calls.append(('PUT', url.path))
+        segments = url.path.split('/')
+        self._reply(self._save(segments[-2], segments[-1], self._body()))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self.server.calls.append(('POST', url.path))
+        body = self._body()
+        if url.path.endswith('/batch'):
+            res = list()
+            for request in body['requests']:
+                segments = request['path'].split('/')
+                if segments[-2] == 'classes':
+                    class_name, object_id = segments[-1], None
+                else:
+                    class_name, object_id = segments[-2], segments[-1]
+                if request['method'] == 'DELETE':
+                    del self.server.objects[class_name][object_id]
+                    res.append(dict(success=dict()))
+                else:
+                    res.append(dict(success=self._save(
+                        class_name, object_id, request.get('body', dict()))))
+            self._reply(res)
+        else:
+            self._reply(self._save(url.path.split('/')[-1], None, body))
+
+
+@pytest.fixture
+def leancloud_stand_in(monkeypatch):
+    leancloud = pytest.importorskip('leancloud')
+    server = HTTPServer(('127.0.0.1', 0), _StandInHandler)
+    server.objects = dict()
+    server.calls = list()
+    server.ids = itertools.count(1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    monkeypatch.setenv('LEANCLOUD_API_SERVER', url)
+    monkeypatch.setenv('LC_API_SERVER', url)
+    leancloud.init('app_id', 'app_key')
+    yield server
+    server.shutdown()
+
+
+def test_leancloud_database(leancloud_stand_in):
+    from onto.database import Snapshot
+    from onto.database.leancloud import LeancloudDatabase
+
+    server = leancloud_stand_in
+    refs = [LeancloudDatabase.ref/'TODO'/f't{i}' for i in range(5)]
+    with LeancloudDatabase.batch() as batch:
+        for i, ref in enumerate(refs):
+            batch.set(
+                ref=ref, snapshot=Snapshot(title=f'title{i}'))
+    # One query for existing objects of the _doc_ids, one batch write
+    assert server.calls == [('GET', '/1.1/classes/TODO'),
+                            ('POST', '/1.1/batch')]
+    assert len(server.objects['TODO']) == 5
+
+    # One query reads all documents, in the order of refs
+    server.calls.clear()
+    res = list(LeancloudDatabase.get_many(refs=refs[::-1]))
+    assert [ref for ref, _ in res] == refs[::-1]
+    assert [snapshot['title'] for _, snapshot in res] == \
+           [f'title{i}' for i in range(5)][::-1]
+    assert res[0][1]['doc_id'] == 't4'
+    assert server.calls == [('GET', '/1.1/classes/TODO')]
+
+    # Reads are chunked by query_max_size
+    server.calls.clear()
+    query_max_size = LeancloudDatabase.query_max_size
+    LeancloudDatabase.query_max_size = 2
+    try:
+        assert len(list(LeancloudDatabase.get_many(refs=refs))) == 5
+    finally:
+        LeancloudDatabase.query_max_size = query_max_size
+    assert len(server.calls) == 3
+
+    assert LeancloudDatabase._get_cla('TODO') is \
+           LeancloudDatabase._get_cla('TODO')
+
+    # An update of a missing document fails before anything is written
+    import leancloud
+    server.calls.clear()
+    with pytest.raises(leancloud.LeanCloudError) as e:
+        with LeancloudDatabase.batch() as batch:
+            batch.set(ref=LeancloudDatabase.ref/'Other'/'o',
+                      snapshot=Snapshot(title='o'))
+            batch.update(ref=LeancloudDatabase.ref/'TODO'/'missing',
+                         snapshot=Snapshot(title='m'))
+    assert e.value.code == 101
+    assert 'Other' not in server.objects
+    assert [method for method, _ in server.calls] == ['GET']
+
+    # A document set earlier in the batch can be updated
+    with LeancloudDatabase.batch() as batch:
+        batch.set(ref=LeancloudDatabase.ref/'TODO'/'new',
+                  snapshot=Snapshot(title='n'))
+        batch.update(ref=LeancloudDatabase.ref/'TODO'/'new',
+                     snapshot=Snapshot(rank=1))
+    assert LeancloudDatabase.get(LeancloudDatabase.ref/'TODO'/'new')['rank'] == 1
+
+    with LeancloudDatabase.batch() as batch:
+        for ref in refs + [LeancloudDatabase.ref/'TODO'/'new']:
+            batch.delete(ref=ref)
+    assert server.objects['TODO'] == dict()
+
+
+def test_leancloud_save(leancloud_stand_in):
+    from onto.attrs import attrs
+    from onto.database import Snapshot
+    from onto.database.leancloud import LeancloudDatabase
+    from onto.domain_model import DomainModel
+
+    class LcModel(DomainModel):
+        title = attrs.string
+        rank = attrs.integer
+
+    LcModel._datastore = classmethod(lambda cls: LeancloudDatabase)
+    server = leancloud_stand_in
+
+    LcModel.new(doc_id='a', title='t', rank=1).save()
+    assert len(server.objects['LcModel']) == 1
+
+    # Only the changed field is sent, to the same object
+    obj = LcModel.get(doc_id='a')
+    server.calls.clear()
+    obj.rank = 2
+    obj.save()
+    assert [method for method, _ in server.calls] == ['GET', 'PUT']
+    assert len(server.objects['LcModel']) == 1
+    assert LcModel.get(doc_id='a').rank == 2
+
+    # set replaces the object with the same _doc_id
+    LeancloudDatabase.set(
+        ref=LeancloudDatabase.ref/'LcModel'/'a', snapshot=Snapshot(title='u'))
+    stored, = server.objects['LcModel'].values()
+    assert stored['title'] == 'u'
+    assert 'rank' not in stored
+
+
+def test_leancloud_page_tokens(leancloud_stand_in):
+    from onto.attrs import attrs
+    from onto.database.leancloud import LeancloudDatabase
+    from onto.domain_model import DomainModel
+    from onto.query.query import QueryBase
+
+    class LcPagedModel(DomainModel):
+        rank = attrs.integer
+
+    LcPagedModel._datastore = classmethod(lambda cls: LeancloudDatabase)
+    with LeancloudDatabase.batch():
+        for i in range(7):
+            LcPagedModel.new(doc_id=f'd{i}', rank=i % 3).save()
+
+    # Documents with equal values are ordered by _doc_id, and a page
+    #   token continues between them
+    for direction, expected in (
+            (QueryBase.ASCENDING, ['d0', 'd3', 'd6', 'd1', 'd4', 'd2', 'd5']),
+            (QueryBase.DESCENDING, ['d5', 'd2', 'd4', 'd1', 'd6', 'd3', 'd0'])):
+        by_rank = LcPagedModel.get_query().order_by('rank', direction)
+        doc_ids = list()
+        page_q = by_rank.limit(2)
+        while page := list(LcPagedModel.from_query(page_q)):
+            doc_ids.extend(obj.doc_id for obj in page)
+            page_q = by_rank.limit(2).start_after_token(
+                by_rank.page_token_of(page[-1]))
+        assert doc_ids == expected
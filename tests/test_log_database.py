@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_log_database(CTX, tmp_path):
+
+    from onto.domain_model import DomainModel
+    from onto.database.log import LogDatabase
+
+    directory = str(tmp_path)
+    db = LogDatabase.of(directory, compact_every=8)
+
+    class LoggedModel(DomainModel):
+        name = attrs.string
+        rank = attrs.integer
+
+    LoggedModel._datastore = classmethod(lambda cls: db)
+
+    for i in range(20):
+        LoggedModel.new(doc_id=f'd{i:02d}', name=f'n{i % 2}', rank=i).save()
+    obj = LoggedModel.get(doc_id='d03')
+    obj.name = 'changed'
+    obj.save()
+    LoggedModel.get(doc_id='d04').delete()
+
+    def doc_ids(*args):
+        return [obj.doc_id for obj in LoggedModel.where(*args)]
+
+    Comparators = LogDatabase.Comparators
+    assert doc_ids('rank', Comparators.lt, 6) == \
+           ['d00', 'd01', 'd02', 'd03', 'd05']
+    assert doc_ids('name', Comparators.eq, 'changed') == ['d03']
+
+    # A reopened store reads the compacted index and replays the rest
+    db._log_store.close()
+    db = LogDatabase.of(directory, compact_every=8)
+    assert db._log_store._gen > 0
+    assert LoggedModel.get(doc_id='d03').name == 'changed'
+    assert LoggedModel.get(doc_id='d19').rank == 19
+    assert len(doc_ids()) == 19
+
+    # A record cut short by a crash is dropped
+    store = db._log_store
+    LoggedModel.new(doc_id='d20', name='n0', rank=20).save()
+    store.close()
+    log_path = tmp_path / f'{store._gen}.log'
+    with open(log_path, 'ab') as f:
+        f.write(b'\xff\x00\x00\x00partial')
+    db = LogDatabase.of(directory)
+    assert LoggedModel.get(doc_id='d20').rank == 20
+    assert len(doc_ids()) == 20
+
+
+def test_log_store_compaction(CTX, tmp_path):
+    from onto.database import Snapshot
+    from onto.database.log import LogDatabase
+    from onto.database.mock import MockReference
+
+    db = LogDatabase.of(str(tmp_path), compact_every=8)
+    ref = MockReference.from_str('logged/a')
+    # Rewrites of one document count towards compaction
+    for i in range(20):
+        db.set(ref=ref, snapshot=Snapshot({'x': i}))
+    store = db._log_store
+    assert store._gen == 2
+    assert store._writes == 4
+    assert os.path.getsize(tmp_path / f'{store._gen}.log') < 200
+    assert db.get(ref=ref)['x'] == 19
+
+    # An update after a delete in the same batch fails like an update
+    #   of a missing document
+    with pytest.raises(KeyError):
+        with db.batch() as batch:
+            batch.delete(ref=ref)
+            batch.update(ref=ref, snapshot=Snapshot({'x': 0}))
+    assert db.get(ref=ref)['x'] == 19
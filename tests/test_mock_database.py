@@ -0,0 +1,278 @@
+import pytest
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_indexed_query(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database import Snapshot
+    from onto.database.mock import MockDatabase
+
+    class IndexedModel(DomainModel):
+        name = attrs.string
+        rank = attrs.integer
+        tags = attrs.list(value=attrs.string)
+
+    class OtherIndexedModel(DomainModel):
+        name = attrs.string
+
+    for i in range(20):
+        IndexedModel.new(
+            doc_id=f'd{i}', name=f'n{i % 4}', rank=i,
+            tags=['even' if i % 2 == 0 else 'odd']).save()
+    OtherIndexedModel.new(doc_id='o', name='n0').save()
+
+    def doc_ids(*args):
+        return [obj.doc_id for obj in IndexedModel.where(*args)]
+
+    Comparators = MockDatabase.Comparators
+    assert doc_ids('name', Comparators.eq, 'n0') == \
+           ['d0', 'd4', 'd8', 'd12', 'd16']
+    assert doc_ids('rank', Comparators.ge, 17) == ['d17', 'd18', 'd19']
+    assert doc_ids('rank', Comparators.lt, 2) == ['d0', 'd1']
+    assert doc_ids('name', Comparators._in, ['n1', 'n2'],
+                   'rank', Comparators.le, 5) == ['d1', 'd2', 'd5']
+    assert doc_ids('tags', Comparators.contains, 'odd',
+                   'rank', Comparators.gt, 14) == ['d15', 'd17', 'd19']
+
+    # Indexes follow writes
+    obj = IndexedModel.get(doc_id='d0')
+    obj.name = 'n1'
+    obj.save()
+    IndexedModel.get(doc_id='d4').delete()
+    assert doc_ids('name', Comparators.eq, 'n0') == ['d8', 'd12', 'd16']
+    assert doc_ids('name', Comparators.eq, 'n1')[0] == 'd0'
+    assert doc_ids('rank', Comparators.le, 4) == ['d0', 'd1', 'd2', 'd3']
+
+    # As on Firestore, a document without the field does not match
+    CTX.db.set(IndexedModel._get_collection().child('none'), Snapshot(
+        {'obj_type': 'IndexedModel', 'doc_id': 'none', 'name': 'n0'}))
+    assert doc_ids('rank', Comparators.le, 1) == ['d0', 'd1']
+    assert 'none' not in doc_ids('rank', Comparators.ge, 0)
+    assert doc_ids('name', Comparators.eq, 'n0')[-1] == 'none'
+
+    # A query reads a view of the partition that later writes copy
+    #   rather than change
+    partition = MockDatabase._partitions['IndexedModel']
+    docs, seq = partition.view()
+    IndexedModel.new(doc_id='d20', name='n0', rank=20).save()
+    assert 'IndexedModel/d20' not in docs and len(seq) == len(docs)
+    assert 'IndexedModel/d20' in partition.docs
+
+
+def test_transaction(CTX):
+
+    import threading
+    from onto.domain_model import DomainModel
+    from onto.database import Snapshot
+    from onto.database.mock import MockDatabase, MockReference
+    from onto.errors import TransactionConflictError
+    from onto.query import run_transaction
+
+    class Counter(DomainModel):
+        count = attrs.integer
+
+    Counter.new(doc_id='c', count=0).save()
+
+    # Reads see the documents as of the begin of the transaction
+    transaction = MockDatabase.transaction()
+    transaction._begin()
+    doc_ref = Counter.get(doc_id='c').doc_ref
+    Counter.new(doc_id='c', count=10).save()
+    assert MockDatabase.get(doc_ref, transaction=transaction)['count'] == 0
+    MockDatabase.set(doc_ref, MockDatabase.get(doc_ref), transaction=transaction)
+    with pytest.raises(TransactionConflictError):
+        transaction._commit()
+    assert Counter.get(doc_id='c').count == 10
+
+    # Conflicting increments are retried
+    @run_transaction
+    def increment(transaction):
+        obj = Counter.get(doc_id='c', transaction=transaction)
+        obj.count += 1
+        obj.save(transaction=transaction)
+
+    max_attempts, MockDatabase.max_attempts = MockDatabase.max_attempts, 100
+    try:
+        threads = [threading.Thread(target=increment) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        MockDatabase.max_attempts = max_attempts
+    assert Counter.get(doc_id='c').count == 18
+    assert not MockDatabase._versions.history
+
+    # Without transactional, the transaction begins at its first read
+    transaction = MockDatabase.transaction()
+    assert MockDatabase.get(doc_ref, transaction=transaction)['count'] == 18
+    Counter.new(doc_id='c', count=20).save()
+    assert MockDatabase.get(doc_ref, transaction=transaction)['count'] == 18
+    MockDatabase.update(doc_ref, {'count': 19}, transaction=transaction)
+    with pytest.raises(TransactionConflictError):
+        transaction._commit()
+    transaction = MockDatabase.transaction()
+    MockDatabase.update(doc_ref, {'count': 21}, transaction=transaction)
+    transaction._commit()
+    assert Counter.get(doc_id='c').count == 21
+    assert not MockDatabase._versions.active
+
+    # A commit writes all of its ops or none
+    @run_transaction
+    def set_and_update_missing(transaction):
+        MockDatabase.set(doc_ref, Snapshot({'count': 30}),
+                         transaction=transaction)
+        MockDatabase.update(MockReference.from_str('Counter/missing'),
+                            Snapshot({'count': 1}), transaction=transaction)
+
+    with pytest.raises(KeyError):
+        set_and_update_missing()
+    assert Counter.get(doc_id='c').count == 21
+    with pytest.raises(KeyError):
+        with MockDatabase.batch() as batch:
+            batch.set(MockReference.from_str('Counter/a'), Snapshot({'count': 1}))
+            batch.update(MockReference.from_str('Counter/b'), Snapshot({'count': 1}))
+    assert str(MockReference.from_str('Counter/a')) not in MockDatabase.d
+
+
+def test_pagination(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.query.query import QueryBase
+    from onto.view.rest_api import Params
+
+    class PagedModel(DomainModel):
+        name = attrs.string
+        rank = attrs.integer
+
+    for i in range(10):
+        PagedModel.new(doc_id=f'd{i}', name=f'n{i % 3}', rank=i % 5).save()
+
+    def doc_ids(q):
+        return [obj.doc_id for obj in PagedModel.from_query(q)]
+
+    q = PagedModel.get_query()
+    assert doc_ids(q.limit(3)) == ['d0', 'd1', 'd2']
+    assert doc_ids(q.offset(8)) == ['d8', 'd9']
+    assert doc_ids(q.order_by('rank', QueryBase.DESCENDING).limit(4)) == \
+           ['d4', 'd9', 'd3', 'd8']
+    by_rank = q.order_by('rank')
+    assert doc_ids(by_rank.start_after(3)) == ['d4', 'd9']
+    assert doc_ids(by_rank.end_before(1)) == ['d0', 'd5']
+
+    # Page tokens continue after the last result, including between
+    #   documents with equal values
+    pages = list()
+    page_q = by_rank.limit(3)
+    while True:
+        page = list(PagedModel.from_query(page_q))
+        if not page:
+            break
+        pages.append([obj.doc_id for obj in page])
+        page_q = by_rank.limit(3).start_after_token(
+            by_rank.page_token_of(page[-1]))
+    assert pages == [['d0', 'd5', 'd1'], ['d6', 'd2', 'd7'],
+                     ['d3', 'd8', 'd4'], ['d9']]
+
+    # REST params read one more result than page_size
+    params = Params.from_dict(
+        {'params': {'pageSize': 4, 'current': 2}, 'sort': {}, 'filter': {}})
+    assert doc_ids(params.append_conditions(q)) == \
+           ['d4', 'd5', 'd6', 'd7', 'd8']
+
+
+def test_pagination_typed_values(CTX):
+
+    import datetime
+    from onto.database import Reference, Snapshot
+    from onto.database.mock import MockDatabase
+    from onto.domain_model import DomainModel
+
+    class TypedModel(DomainModel):
+        name = attrs.string
+
+    collection = TypedModel._get_collection()
+
+    def write(doc_id, **d):
+        MockDatabase.set(collection.child(doc_id), Snapshot(
+            {'obj_type': 'TypedModel', 'doc_id': doc_id, **d}))
+
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    for i in range(5):
+        write(f'd{i}', at=start + datetime.timedelta(days=(i * 3) % 5),
+              owner=Reference.from_str(f'users/u{i % 2}'))
+    # Values of different types order as in Firestore; a document
+    #   without the key is left out
+    write('n', at=None)
+    write('s', at='later')
+    write('m')
+
+    def paths(q):
+        return [str(ref).rpartition('/')[2]
+                for ref, _ in MockDatabase.query(q)]
+
+    by_at = TypedModel.get_query().order_by('at')
+    pages = list()
+    page_q = by_at.limit(2)
+    while True:
+        page = list(MockDatabase.query(page_q))
+        if not page:
+            break
+        pages.append([str(ref).rpartition('/')[2] for ref, _ in page])
+        page_q = by_at.limit(2).start_after_token(by_at.page_token(*page[-1]))
+    assert pages == [['n', 'd0'], ['d2', 'd4'], ['d1', 'd3'], ['s']]
+
+    by_owner = TypedModel.get_query().order_by('owner').limit(1)
+    ref, snapshot = next(iter(MockDatabase.query(by_owner)))
+    assert paths(by_owner.start_after_token(
+        by_owner.page_token(ref, snapshot))) == ['d2']
+
+
+def test_select(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.errors import PartialObjectError
+
+    class SelectedModel(DomainModel):
+        name = attrs.string
+        status = attrs.string
+        rank = attrs.integer.data_key('rankValue')
+
+    for i in range(5):
+        SelectedModel.new(
+            doc_id=f'd{i}', name=f'n{i}', status='new', rank=i).save()
+
+    q = SelectedModel.get_query().order_by('rank').select('status', 'rank')
+    assert q._projection() == ['obj_type', 'status', 'rankValue']
+    assert [d for _, d in CTX.db.query(q.limit(1))] == \
+           [{'obj_type': 'SelectedModel', 'status': 'new', 'rankValue': 0}]
+
+    objs = list(SelectedModel.where(
+        'rank', CTX.db.Comparators.ge, 3).select('status'))
+    assert [obj.doc_id for obj in objs] == ['d3', 'd4']
+    assert objs[0].status == 'new'
+    with pytest.raises(AttributeError):
+        _ = objs[0].name
+    assert [obj.rank for obj in SelectedModel.from_query(q)] == \
+           list(range(5))
+
+    # Only the fields that were read and changed are written
+    obj = objs[0]
+    obj.status = 'done'
+    obj.save()
+    obj = SelectedModel.get(doc_id='d3')
+    assert (obj.name, obj.status, obj.rank) == ('n3', 'done', 3)
+
+    obj = SelectedModel.get(doc_id='d4', fields=['name'])
+    assert obj.name == 'n4'
+    with pytest.raises(AttributeError):
+        _ = obj.status
+    obj.status = 'done'
+    with pytest.raises(PartialObjectError):
+        obj.save()
+    with pytest.raises(PartialObjectError):
+        SelectedModel.get(doc_id='d4', fields=['name']).save(
+            doc_ref=SelectedModel.ref_from_id('d5'))
+    assert SelectedModel.get(doc_id='d4').status == 'new'
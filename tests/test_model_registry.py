@@ -49,3 +49,21 @@ def test_register_subclass():
         pass
 
     assert CModelChild.__name__ == "CModelChild"
+
+
+def test_get_subclasses_cached():
+
+    class SModelParent(onto.models.base.BaseRegisteredModel):
+        pass
+
+    assert SModelParent._get_subclass_closure() is \
+           SModelParent._get_subclass_closure()
+    assert SModelParent._get_subclasses() == {SModelParent}
+
+    # Registering a subclass invalidates the cached result
+    class SModelChild(SModelParent):
+        pass
+
+    assert SModelParent._get_subclasses() == {SModelParent, SModelChild}
+    assert SModelParent._get_subclasses_str() == \
+           ["SModelChild", "SModelParent"]
@@ -60,3 +60,46 @@ def test__schema_cls_from_attributed_class():
     #        "null.', 'validator_failed': 'Invalid value.'})>)]) "
     # assert str(schema_obj.fields) == desc
 
+
+
+def test_schema_obj_cached():
+    from onto.attrs import attrs
+
+    class SchemaCachedModel(Serializable):
+        i = attrs.integer
+
+    schema_obj = SchemaCachedModel.get_schema_obj()
+    assert SchemaCachedModel.get_schema_obj() is schema_obj
+    assert SchemaCachedModel.get_schema_cls() is schema_obj.__class__
+
+    # Registering a new class invalidates the compiled schema
+    class SchemaCachedModelChild(SchemaCachedModel):
+        j = attrs.integer
+
+    assert SchemaCachedModel.get_schema_obj() is not schema_obj
+    assert 'j' not in SchemaCachedModel.get_schema_obj().fields
+    assert 'j' in SchemaCachedModelChild.get_schema_obj().fields
+
+    schema_obj = SchemaCachedModel.get_schema_obj()
+    SchemaCachedModel.invalidate_schema_cache()
+    assert SchemaCachedModel.get_schema_obj() is not schema_obj
+
+
+def test_slotted_store():
+    from onto.attrs import attrs
+
+    class SlottedModel(Serializable):
+        class Meta:
+            slotted_store = True
+
+        i = attrs.integer
+        s = attrs.string
+
+    obj = SlottedModel.new(i=1, s='a')
+    assert obj._attrs.__slots__ == ('i', 's')
+    assert obj._attrs.__dict__ == {}
+    assert (obj.i, obj.s) == (1, 'a')
+
+    obj.i = 2
+    assert obj.to_dict() == {'obj_type': 'SlottedModel', 'i': 2, 's': 'a'}
+    assert SlottedModel.from_dict(obj.to_dict()).i == 2
@@ -0,0 +1,255 @@
+import pytest
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_save_writes_changed_fields(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database.mock import MockDatabase
+
+    class PartialSaveInner(DomainModel):
+        x = attrs.integer
+
+    class PartialSaveModel(DomainModel):
+        name = attrs.string
+        count = attrs.integer
+        inner = attrs.embed(PartialSaveInner)
+
+    writes = list()
+
+    class RecordingDatabase(MockDatabase):
+
+        @classmethod
+        def set(cls, ref, snapshot, transaction=None):
+            writes.append(('set', dict(snapshot)))
+            super().set(ref=ref, snapshot=snapshot, transaction=transaction)
+
+        @classmethod
+        def update(cls, ref, snapshot, transaction=None):
+            writes.append(('update', dict(snapshot)))
+            super().update(ref=ref, snapshot=snapshot, transaction=transaction)
+
+    PartialSaveModel._datastore = classmethod(lambda cls: RecordingDatabase)
+
+    obj = PartialSaveModel.new(
+        doc_id='a', name='foo', count=1, inner=PartialSaveInner.new(x=1))
+    obj.save()
+    assert writes[-1][0] == 'set'
+
+    obj.count = 2
+    obj.save()
+    assert writes[-1] == ('update', {'count': 2})
+
+    # Nothing changed
+    n_writes = len(writes)
+    obj.save()
+    assert len(writes) == n_writes
+
+    obj = PartialSaveModel.get(doc_id='a')
+    obj.inner.x = 2
+    obj.save()
+    assert writes[-1][0] == 'update'
+    assert set(writes[-1][1]) == {'inner'}
+
+    assert PartialSaveModel.get(doc_id='a').to_dict() == obj.to_dict()
+
+
+def test_save_after_get_of_missing_document(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database import Snapshot
+    from onto.database.mock import MockDatabase
+
+    class MissingSaveModel(DomainModel):
+        name = attrs.string
+
+    writes = list()
+
+    class MissingDatabase(MockDatabase):
+        """ Returns an empty snapshot for a missing document, as
+                FirestoreDatabase does
+        """
+
+        @classmethod
+        def get(cls, ref, transaction=None):
+            try:
+                return super().get(ref=ref, transaction=transaction)
+            except KeyError:
+                return Snapshot.view(dict(), __onto_meta__=dict(exists=False))
+
+        @classmethod
+        def set(cls, ref, snapshot, transaction=None):
+            writes.append(('set', dict(snapshot)))
+            super().set(ref=ref, snapshot=snapshot, transaction=transaction)
+
+        @classmethod
+        def update(cls, ref, snapshot, transaction=None):
+            writes.append(('update', dict(snapshot)))
+            super().update(ref=ref, snapshot=snapshot, transaction=transaction)
+
+    MissingSaveModel._datastore = classmethod(lambda cls: MissingDatabase)
+
+    obj = MissingSaveModel.get(doc_id='missing')
+    obj.name = 'foo'
+    obj.save()
+    assert writes[-1][0] == 'set'
+    assert MissingSaveModel.get(doc_id='missing').name == 'foo'
+
+    # An empty record is written in full as well
+    obj = MissingSaveModel.new(doc_id='empty', name='bar')
+    obj._mark_clean(dict())
+    obj.save()
+    assert writes[-1][0] == 'set'
+
+
+def test_save_marks_clean_after_commit(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database.mock import MockDatabase
+
+    class CommitSaveModel(DomainModel):
+        name = attrs.string
+        count = attrs.integer
+
+    writes = list()
+
+    class CommitDatabase(MockDatabase):
+
+        @classmethod
+        def update(cls, ref, snapshot, transaction=None):
+            writes.append(('update', dict(snapshot)))
+            super().update(ref=ref, snapshot=snapshot, transaction=transaction)
+
+        @classmethod
+        def _commit_batch(cls, ops):
+            writes.extend((method_name, dict(snapshot))
+                          for method_name, _, snapshot in ops)
+            super()._commit_batch(ops)
+
+    CommitSaveModel._datastore = classmethod(lambda cls: CommitDatabase)
+
+    obj = CommitSaveModel.new(doc_id='a', name='foo', count=1)
+    obj.save()
+
+    # A batch that fails leaves the changes to be written again
+    obj.count = 2
+    with pytest.raises(ValueError):
+        with CommitDatabase.batch():
+            obj.save()
+            raise ValueError
+    obj.save()
+    assert writes[-1] == ('update', {'count': 2})
+
+    # A batch that commits leaves nothing to write
+    obj.count = 3
+    with CommitDatabase.batch():
+        obj.save()
+    assert writes[-1] == ('update', {'count': 3})
+    n_writes = len(writes)
+    obj.save()
+    assert len(writes) == n_writes
+
+    # So does a transaction that is rolled back
+    obj.count = 4
+
+    @CommitDatabase.transactional
+    def save_and_fail(transaction):
+        obj.save(transaction=transaction)
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        save_and_fail(CommitDatabase.transaction())
+    writes.clear()
+    obj.save()
+    assert writes == [('update', {'count': 4})]
+    assert CommitSaveModel.get(doc_id='a').count == 4
+
+
+def test_save_after_delete(CTX):
+
+    import asyncio
+    from onto.domain_model import DomainModel
+    from onto.database.mock import MockDatabase
+
+    class DeleteSaveModel(DomainModel):
+        name = attrs.string
+
+    DeleteSaveModel._datastore = classmethod(lambda cls: MockDatabase)
+
+    DeleteSaveModel.new(doc_id='x', name='foo').save()
+    obj = DeleteSaveModel.get(doc_id='x')
+    obj.delete()
+    obj.save()
+    assert DeleteSaveModel.get(doc_id='x').name == 'foo'
+
+    # Deleted in a batch after a save in the same batch
+    with MockDatabase.batch():
+        obj.name = 'bar'
+        obj.save()
+        obj.delete()
+    obj.save()
+    assert DeleteSaveModel.get(doc_id='x').name == 'bar'
+
+    # Deleted by another writer; the update falls back to a full write
+    obj.name = 'baz'
+    DeleteSaveModel.get(doc_id='x').delete()
+    obj.save()
+    assert DeleteSaveModel.get(doc_id='x').name == 'baz'
+    obj.name = 'qux'
+    DeleteSaveModel.get(doc_id='x').delete()
+    asyncio.run(obj.asave())
+    assert DeleteSaveModel.get(doc_id='x').name == 'qux'
+
+    # In a batch, the update fails as it does for a missing document
+    obj.name = 'quux'
+    DeleteSaveModel.get(doc_id='x').delete()
+    with pytest.raises(KeyError):
+        with MockDatabase.batch():
+            obj.save()
+
+
+def test_asave_in_batch(CTX):
+
+    import asyncio
+    from onto.domain_model import DomainModel
+    from onto.database.mock import MockDatabase
+
+    class BatchAsaveModel(DomainModel):
+        count = attrs.integer
+
+    BatchAsaveModel._datastore = classmethod(lambda cls: MockDatabase)
+
+    obj = BatchAsaveModel.new(doc_id='a', count=1)
+    obj.save()
+    obj.count = 2
+
+    async def save_in_batch():
+        with MockDatabase.batch():
+            await obj.asave()
+            # Written when the batch commits
+            assert BatchAsaveModel.get(doc_id='a').count == 1
+            assert obj._clean_d['count'] == 1
+
+    asyncio.run(save_in_batch())
+    assert BatchAsaveModel.get(doc_id='a').count == 2
+    assert obj._clean_d['count'] == 2
+
+
+def test_save_without_records(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.database.mock import MockDatabase
+
+    class UnrecordedModel(DomainModel):
+        _records_clean = False
+        name = attrs.string
+
+    UnrecordedModel._datastore = classmethod(lambda cls: MockDatabase)
+
+    UnrecordedModel.new(doc_id='a', name='foo').save()
+    obj = UnrecordedModel.get(doc_id='a')
+    assert '_clean_d' not in obj.__dict__
+    obj.name = 'bar'
+    obj.save()
+    assert UnrecordedModel.get(doc_id='a').name == 'bar'
@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_prefetch_iterator():
+    from onto.query.prefetch import PrefetchIterator
+
+    read = list()
+    consumed = threading.Event()
+
+    def pages():
+        for i in range(5):
+            read.append(i)
+            yield [i * 2, i * 2 + 1]
+
+    it = PrefetchIterator(pages(), max_buffered=4)
+    assert next(it) == 0
+    # The thread reads ahead, but holds at most max_buffered items,
+    #   counting the page of the consumer and the page that waits
+    it._thread.join(timeout=0.2)
+    assert it._size == 4
+    assert read == [0, 1, 2]
+    assert list(it) == list(range(1, 10))
+    assert read == list(range(5))
+
+    def failing_pages():
+        yield [1]
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        list(PrefetchIterator(failing_pages()))
+
+    it = PrefetchIterator(pages(), max_buffered=2)
+    it.close()
+    it._thread.join(timeout=1)
+    assert not it._thread.is_alive()
+
+
+def test_stream(CTX):
+    from onto.domain_model import DomainModel
+
+    class StreamedModel(DomainModel):
+        rank = attrs.integer
+
+    for i in range(25):
+        StreamedModel.new(doc_id=f'd{i}', rank=i).save()
+
+    assert [obj.rank for obj in StreamedModel.stream(page_size=4)] == \
+           list(range(25))
+    q = StreamedModel.get_query().where(
+        'rank', StreamedModel._datastore().Comparators.ge, 20)
+    assert [obj.doc_id for obj in StreamedModel.stream(q, page_size=2)] == \
+           ['d20', 'd21', 'd22', 'd23', 'd24']
@@ -0,0 +1,14 @@
+def test_reference_segments():
+
+    import pickle
+    from onto.database import Reference
+
+    r = Reference.from_str(s='a/b') / 'c'
+    assert r.path == ('a', 'b', 'c')
+    assert r.params == ['a', 'b', 'c']
+    assert (r.first, r.last, r.id) == ('a', 'c', 'c')
+    assert hash(r) == hash('a/b/c')
+
+    r_loaded = pickle.loads(pickle.dumps(r))
+    assert r_loaded == r and hash(r_loaded) == hash(r)
+    assert r_loaded.path == r.path
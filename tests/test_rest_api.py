@@ -0,0 +1,70 @@
+import json
+
+from flask import Flask
+
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_list_get_view(CTX):
+
+    from onto.domain_model import DomainModel
+    from onto.view.rest_api import ViewMediator
+
+    class ListedModel(DomainModel):
+        name = attrs.string
+
+    for i in range(5):
+        ListedModel.new(doc_id=f'd{i}', name=f'n{i}').save()
+
+    def pager_of(view_model_cls):
+        app = Flask(__name__)
+        ViewMediator(view_model_cls=view_model_cls, app=app) \
+            .add_list_get(rule='/listed')
+        client = app.test_client()
+
+        def page_of(page_size, current, **kwargs):
+            res = client.get('/listed', query_string={'params': json.dumps(
+                dict(pageSize=page_size, current=current, **kwargs))})
+            return [d['doc_id'] for d in res.json['data']], \
+                res.json['total'], res.json['extra']
+        return page_of
+
+    # All of the results are paged by the view
+    class AllListedView(ListedModel):
+        @classmethod
+        def get_many(cls, params):
+            return [ListedModel.get(doc_id=f'd{i}') for i in range(5)]
+
+    page_of = pager_of(AllListedView)
+    assert page_of(2, 2)[:2] == (['d2', 'd3'], 5)
+    assert page_of(2, 3)[:2] == (['d4'], 5)
+
+    # A page from get_many is kept, with one more result when there is
+    #   a next page
+    class PagedListedView(ListedModel):
+        @classmethod
+        def get_many(cls, params):
+            start = params.params._offset()
+            return [ListedModel.get(doc_id=f'd{i}')
+                    for i in range(start, min(start + 3, 5))]
+
+    page_of = pager_of(PagedListedView)
+    assert page_of(2, 2)[:2] == (['d2', 'd3'], 5)
+    assert page_of(2, 3)[:2] == (['d4'], 5)
+
+    # A query is read for the page only; later pages start after the
+    #   page token of the page before
+    class QueryListedView(ListedModel):
+        @classmethod
+        def get_many(cls, params):
+            return ListedModel.get_query().order_by('name')
+
+    page_of = pager_of(QueryListedView)
+    doc_ids, total, extra = page_of(2, 1)
+    assert (doc_ids, total) == (['d0', 'd1'], 3)
+    doc_ids, total, extra = page_of(2, 2, pageToken=extra['nextPageToken'])
+    assert (doc_ids, total) == (['d2', 'd3'], 5)
+    doc_ids, total, extra = page_of(2, 3, pageToken=extra['nextPageToken'])
+    assert (doc_ids, total) == (['d4'], 5)
+    assert extra is None
@@ -368,3 +368,99 @@ def test_embedded_many_with_dict():
     amur_leopard_deserialized = EndangeredSpecies.from_dict(d)
 
     assert amur_leopard_deserialized.to_dict() == d
+
+
+def test_compiled_codec():
+    from onto.attrs import attrs
+
+    class CodecInner(onto.models.base.Serializable):
+        class Meta:
+            compiled_codec = True
+
+        x = attrs.integer
+
+    class CodecOuter(onto.models.base.Serializable):
+        class Meta:
+            compiled_codec = True
+
+        name = attrs.string
+        ratio = attrs.float
+        inner = attrs.embed(CodecInner)
+
+    assert CodecOuter.get_codec() is not None
+
+    obj = CodecOuter.new(name='a', ratio=0.5, inner=CodecInner.new(x=1))
+    d = obj.to_dict()
+    assert d == {
+        'obj_type': 'CodecOuter',
+        'name': 'a',
+        'ratio': 0.5,
+        'inner': {'obj_type': 'CodecInner', 'x': 1}
+    }
+    assert d == obj._export_val(obj.schema_obj.dump(obj))
+
+    obj = CodecOuter.from_dict(d)
+    assert isinstance(obj.inner, CodecInner)
+    assert obj.to_dict() == d
+
+    # Values of another type go through marshmallow fields
+    obj = CodecOuter.from_dict({'name': 'b', 'ratio': 1})
+    assert obj.ratio == 1.0 and isinstance(obj.ratio, float)
+
+    from marshmallow import ValidationError
+    with pytest.raises(ValidationError) as excinfo:
+        CodecOuter.from_dict({'name': 'c', 'ratio': 'not a number'})
+    assert 'ratio' in excinfo.value.messages
+
+
+def test_from_dicts():
+    from onto.attrs import attrs
+
+    class ManyBase(onto.models.base.Serializable):
+        name = attrs.string
+
+    class ManySub(ManyBase):
+        pass
+
+    ds = [
+        ManyBase.new(name='a').to_dict(),
+        ManySub.new(name='b').to_dict(),
+        ManyBase.new(name='c').to_dict(),
+    ]
+    objs = ManyBase.from_dicts(ds)
+
+    assert [type(obj) for obj in objs] == [ManyBase, ManySub, ManyBase]
+    assert [obj.name for obj in objs] == ['a', 'b', 'c']
+    assert [obj.to_dict() for obj in objs] == ds
+
+
+def test_from_dict_lazy():
+    from onto.attrs import attrs
+
+    class LazyInner(onto.models.base.Serializable):
+        x = attrs.integer
+
+    class LazyOuter(onto.models.base.Serializable):
+        class Meta:
+            slotted_store = True
+
+        name = attrs.string
+        count = attrs.integer
+        inner = attrs.embed(LazyInner)
+
+    d = LazyOuter.new(name='a', count=1, inner=LazyInner.new(x=2)).to_dict()
+    obj = LazyOuter.from_dict(d, lazy=True)
+
+    assert obj.name == 'a'
+    assert set(obj._attrs.__dict__['_lazy_pending']) == {'count', 'inner'}
+
+    obj.count = 3
+    assert isinstance(obj.inner, LazyInner)
+    assert obj.to_dict() == {**d, 'count': 3}
+    assert LazyOuter.from_dict(d, lazy=True).to_dict() == d
+
+    from marshmallow import ValidationError
+    obj = LazyOuter.from_dict({**d, 'count': 'not a number'}, lazy=True)
+    assert obj.name == 'a'
+    with pytest.raises(ValidationError):
+        _ = obj.count
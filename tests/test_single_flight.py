@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+from .fixtures import CTX
+
+
+def test_single_flight_get(CTX):
+    from onto.database import Snapshot
+    from onto.database.mock import MockDatabase, MockReference
+    from onto.database.single_flight import SingleFlightDatabase
+
+    started, release = threading.Event(), threading.Event()
+    reads = list()
+
+    class SlowDatabase(MockDatabase):
+
+        @classmethod
+        def get(cls, ref, transaction=None):
+            reads.append(str(ref))
+            started.set()
+            release.wait()
+            return super().get(ref=ref, transaction=transaction)
+
+    db = SingleFlightDatabase.of(SlowDatabase)
+    ref = MockReference.from_str('single_flight/a')
+    MockDatabase.set(ref=ref, snapshot=Snapshot({'x': 1}))
+
+    results = list()
+
+    def read():
+        results.append(db.get(ref=ref))
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 4
+    assert all(snapshot['x'] == 1 for snapshot in results)
+    assert len(reads) < 4
+    MockDatabase.delete(ref=ref)
+
+
+def test_single_flight_async(CTX):
+    from onto.attrs import attrs
+    from onto.domain_model import DomainModel
+    from onto.database.mock import MockDatabase
+    from onto.database.single_flight import SingleFlightDatabase
+
+    queries = list()
+
+    class CountingDatabase(MockDatabase):
+
+        @classmethod
+        async def aquery(cls, q):
+            queries.append(q)
+            await asyncio.sleep(0)
+            async for item in super().aquery(q):
+                yield item
+
+    db = SingleFlightDatabase.of(CountingDatabase)
+
+    class SingleFlightModel(DomainModel):
+        name = attrs.string
+
+    SingleFlightModel._datastore = classmethod(lambda cls: db)
+    SingleFlightModel.new(doc_id='a', name='a').save()
+
+    async def run_query():
+        q = SingleFlightModel.get_query()
+        return [item async for item in db.aquery(q)]
+
+    async def main():
+        return await asyncio.gather(*(run_query() for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(queries) == 1
+    refs = [[str(ref) for ref, _ in items] for items in results]
+    assert 'SingleFlightModel/a' in refs[0]
+    assert refs[0] == refs[1] == refs[2]
+    assert results[0][0][1] is not results[1][0][1]
+
+
+def test_single_flight_cancelled_leader():
+    from onto.database.single_flight import AsyncSingleFlight
+
+    flight = AsyncSingleFlight()
+    calls = list()
+
+    async def read():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        return 'x'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('a', read))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do('a', read))
+        await asyncio.sleep(0)
+        leader.cancel()
+        # The waiter was not cancelled, and gets the result of the call
+        assert await waiter == 'x'
+        assert leader.cancelled()
+        assert flight._tasks == dict()
+
+    asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_single_flight_read_your_writes(CTX):
+    from onto.database import Snapshot
+    from onto.database.mock import MockDatabase, MockReference
+    from onto.database.single_flight import SingleFlightDatabase
+
+    started, release = threading.Event(), threading.Event()
+
+    class SlowDatabase(MockDatabase):
+
+        @classmethod
+        def get(cls, ref, transaction=None):
+            snapshot = super().get(ref=ref, transaction=transaction)
+            if not started.is_set():
+                started.set()
+                release.wait()
+            return snapshot
+
+    db = SingleFlightDatabase.of(SlowDatabase)
+    ref = MockReference.from_str('single_flight/b')
+    db.set(ref=ref, snapshot=Snapshot({'x': 1}))
+
+    results = list()
+    thread = threading.Thread(target=lambda: results.append(db.get(ref=ref)))
+    thread.start()
+    started.wait()
+    # A read after a write does not join the read in flight (which
+    #   the timer ends, should it join)
+    timer = threading.Timer(5, release.set)
+    timer.start()
+    db.set(ref=ref, snapshot=Snapshot({'x': 2}))
+    assert db.get(ref=ref)['x'] == 2
+    release.set()
+    timer.cancel()
+    thread.join()
+    assert results[0]['x'] == 1
+    MockDatabase.delete(ref=ref)
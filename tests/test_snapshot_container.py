@@ -35,3 +35,36 @@ def test_get_with_range():
         key='k',
         hi_incl=(2, 0)
     )) == ['v1', 'v2']
+
+
+def test_snapshot_view():
+    from onto.database import Snapshot
+    d = {'a': 1}
+    snapshot = Snapshot.view(d)
+    container = SnapshotContainer()
+    container.set_with_timestamp('k', snapshot, (1, 0))
+    assert container.get('k', (1, 0)) is snapshot
+    assert snapshot.as_mapping()['a'] == 1
+
+    # Copies on the first change, and leaves d unchanged
+    snapshot['a'] = 2
+    assert snapshot['a'] == 2
+    assert d == {'a': 1}
+
+    shared = snapshot.share()
+    del snapshot['a']
+    assert shared == {'a': 2}
+    assert 'a' not in snapshot
+
+
+def test_mock_database_shares_snapshot():
+    from onto.database import Snapshot
+    from onto.database.mock import MockDatabase, MockReference
+    ref = MockReference.from_str('snapshot_view/a')
+    snapshot = Snapshot({'a': 1})
+    MockDatabase.set(ref=ref, snapshot=snapshot)
+    snapshot['a'] = 2
+    read = MockDatabase.get(ref=ref)
+    assert read.as_mapping() == {'a': 1}
+    assert read.share() is MockDatabase.get(ref=ref).share()
+    MockDatabase.delete(ref=ref)
@@ -0,0 +1,96 @@
+from onto.attrs import attrs
+from .fixtures import CTX
+
+
+def test_sqlite_database(CTX, tmp_path):
+
+    from onto.domain_model import DomainModel
+    from onto.database.sqlite import SqliteDatabase
+
+    path = str(tmp_path / 'onto.sqlite')
+    db = SqliteDatabase.of(path)
+
+    class SqlModel(DomainModel):
+        first_name = attrs.string
+        rank = attrs.integer
+        tags = attrs.list(value=attrs.string)
+
+    class SqlSubModel(SqlModel):
+        class Meta:
+            collection_name = 'SqlModel'
+
+    SqlModel._datastore = classmethod(lambda cls: db)
+
+    for i in range(10):
+        klass = SqlSubModel if i % 3 == 0 else SqlModel
+        klass.new(doc_id=f'd{i}', first_name=f'n{i % 2}', rank=i,
+                  tags=['even' if i % 2 == 0 else 'odd']).save()
+    obj = SqlModel.get(doc_id='d1')
+    obj.rank = 100
+    obj.save()
+    SqlModel.get(doc_id='d2').delete()
+
+    def doc_ids(klass, *args):
+        return [obj.doc_id for obj in klass.where(*args)]
+
+    Comparators = SqliteDatabase.Comparators
+    assert doc_ids(SqlModel, 'first_name', Comparators.eq, 'n0') == \
+           ['d0', 'd4', 'd6', 'd8']
+    assert doc_ids(SqlModel, 'rank', Comparators.ge, 8) == ['d1', 'd8', 'd9']
+    assert doc_ids(SqlModel, 'tags', Comparators.contains, 'odd',
+                   'rank', Comparators.lt, 6) == ['d3', 'd5']
+    assert doc_ids(SqlSubModel) == ['d0', 'd3', 'd6', 'd9']
+
+    # Filtered scalar fields and obj_type are indexed columns
+    indexes = {name for name, in db._connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND tbl_name = 'SqlModel' AND sql IS NOT NULL")}
+    assert indexes == {
+        'SqlModel:obj_type', 'SqlModel:firstName', 'SqlModel:rank'}
+    assert db._tables['SqlModel'] == {'obj_type', 'firstName', 'rank'}
+
+    # Without order_by, the limit is part of the statement
+    statements = list()
+    db._connection.set_trace_callback(statements.append)
+    q = SqlModel.get_query().where('first_name', Comparators.eq, 'n1')
+    assert [obj.doc_id for obj in SqlModel.from_query(
+        q.offset(1).limit(2))] == ['d3', 'd5']
+    db._connection.set_trace_callback(None)
+    statement, = [s for s in statements if s.startswith('SELECT path')]
+    assert statement.endswith('ORDER BY +rowid LIMIT 3')
+
+    # Documents and promoted columns persist in the file
+    db = SqliteDatabase.of(path)
+    assert SqlModel.get(doc_id='d1').rank == 100
+    assert db._tables['SqlModel'] == {'obj_type', 'firstName', 'rank'}
+
+
+def test_sqlite_quoted_keys(CTX, tmp_path):
+
+    from onto.domain_model import DomainModel
+    from onto.database import Snapshot
+    from onto.database.sqlite import SqliteDatabase
+
+    db = SqliteDatabase.of(str(tmp_path / 'onto.sqlite'))
+
+    class QuotedModel(DomainModel):
+        owner = attrs.string.data_key("owner's")
+        tags = attrs.list(value=attrs.string).data_key("tag's")
+
+    QuotedModel._datastore = classmethod(lambda cls: db)
+
+    QuotedModel.new(doc_id='a', owner='x', tags=['t']).save()
+    QuotedModel.new(doc_id='b', owner='y', tags=['u']).save()
+    # Written without the list field
+    db.set(ref=QuotedModel._get_collection().child('c'), snapshot=Snapshot(
+        {'obj_type': 'QuotedModel', 'doc_id': 'c', "owner's": 'x'}))
+
+    def doc_ids(*args):
+        return [obj.doc_id for obj in QuotedModel.where(*args)]
+
+    Comparators = SqliteDatabase.Comparators
+    assert doc_ids('owner', Comparators.eq, 'x') == ['a', 'c']
+    assert doc_ids('tags', Comparators.contains, 'u') == ['b']
+    # Filtered outside of SQL; a document without the field does not match
+    assert doc_ids('tags', Comparators.eq, ['t']) == ['a']
+    assert "owner's" in db._tables['QuotedModel']